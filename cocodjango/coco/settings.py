@@ -242,6 +242,67 @@ MEDIA_URL = '/media/'
 LOGS_ROOT=os.path.join(BASE_DIR, 'logs')
 
 
+# Recommendation embeddings
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'mixedbread-ai/mxbai-embed-large-v1')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
+EMBEDDING_TORCH_THREADS = int(os.getenv('EMBEDDING_TORCH_THREADS', 0))  # 0 keeps the torch default
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(BASE_DIR, 'chromadb_data', 'embedding_cache.sqlite3'))  # empty disables the cache
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200000))  # least recently used vectors evicted beyond this (~4 KB each at 1024 dimensions)
+EMBEDDING_SERVER_SOCKET = os.getenv('EMBEDDING_SERVER_SOCKET', '')  # Unix socket of run_embedding_server; empty embeds in-process
+EMBEDDING_SERVER_BATCH_WINDOW_MS = int(os.getenv('EMBEDDING_SERVER_BATCH_WINDOW_MS', 5))  # how long the server waits to merge concurrent requests
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv('EMBEDDING_SERVER_MAX_BATCH', 256))  # texts merged into one forward pass
+EMBEDDING_SERVER_TIMEOUT_SECONDS = int(os.getenv('EMBEDDING_SERVER_TIMEOUT_SECONDS', 120))
+EMBEDDING_CHUNK_TOKENS = int(os.getenv('EMBEDDING_CHUNK_TOKENS', 400))  # tiktoken tokens per passage, below the model's 512 limit
+EMBEDDING_CHUNK_OVERLAP = int(os.getenv('EMBEDDING_CHUNK_OVERLAP', 50))
+EMBEDDING_MAX_CHUNKS = int(os.getenv('EMBEDDING_MAX_CHUNKS', 32))  # passages embedded per document
+EMBEDDING_CHUNK_AGGREGATION = os.getenv('EMBEDDING_CHUNK_AGGREGATION', 'max')  # 'max' (closest passage) or 'mean'
+EMBEDDING_CHUNK_OVERSAMPLE = int(os.getenv('EMBEDDING_CHUNK_OVERSAMPLE', 4))  # passages fetched per requested parent
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 0))  # Matryoshka truncation, e.g. 512 or 256; 0 keeps all 1024. Changing it requires a full re-ingest
+VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none')  # 'none', 'int8' or 'binary' codes of new numpy-backend collections
+VECTOR_QUANTIZED_STORES = os.getenv('VECTOR_QUANTIZED_STORES', 'program').split(',')
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', 4))  # quantized candidates re-scored with float vectors per result
+# store:backend pairs, e.g. 'program:numpy,student:numpy'; 'chroma' (HNSW, default) or 'numpy' (exact search, up to ~200k vectors)
+VECTOR_STORE_BACKENDS = dict(item.split(':', 1) for item in os.getenv('VECTOR_STORE_BACKENDS', '').split(',') if item)
+# HNSW index parameters of new collections per store, applied on the next build (defaults are ChromaDB's)
+VECTOR_HNSW_PARAMS = {
+    store: {
+        'construction_ef': int(os.getenv(f'VECTOR_HNSW_{store.upper()}_CONSTRUCTION_EF', 100)),
+        'M': int(os.getenv(f'VECTOR_HNSW_{store.upper()}_M', 16)),
+        'search_ef': int(os.getenv(f'VECTOR_HNSW_{store.upper()}_SEARCH_EF', 10)),
+    }
+    for store in ('researcher', 'student', 'program')
+}
+VECTOR_INGEST_BATCH_SIZE = int(os.getenv('VECTOR_INGEST_BATCH_SIZE', 128))  # documents per encode + upsert
+TEXT_EXTRACTION_WORKERS = int(os.getenv('TEXT_EXTRACTION_WORKERS', 0))  # resume/SOP extraction processes; 0 uses one per CPU core
+TEXT_EXTRACTION_TIMEOUT_SECONDS = int(os.getenv('TEXT_EXTRACTION_TIMEOUT_SECONDS', 120))  # per file, OCR included
+VECTOR_INGEST_MAX_ERROR_RATE = float(os.getenv('VECTOR_INGEST_MAX_ERROR_RATE', 0.1))  # share of skipped rows that fails a build
+VECTOR_INGEST_WATERMARK_OVERLAP_SECONDS = int(os.getenv('VECTOR_INGEST_WATERMARK_OVERLAP_SECONDS', 60))  # re-read window for rows committed late
+VECTOR_INDEX_DEBOUNCE_SECONDS = int(os.getenv('VECTOR_INDEX_DEBOUNCE_SECONDS', 30))  # quiet period before a changed object is re-indexed
+VECTOR_INDEX_RETRY_SECONDS = int(os.getenv('VECTOR_INDEX_RETRY_SECONDS', 10 * 60))  # back-off before an object whose record failed to build is retried
+VECTOR_ALIAS_REFRESH_SECONDS = int(os.getenv('VECTOR_ALIAS_REFRESH_SECONDS', 5))  # how often workers re-read blue/green aliases
+VECTOR_COLLECTION_KEEP_VERSIONS = int(os.getenv('VECTOR_COLLECTION_KEEP_VERSIONS', 1))  # previous versions kept for rollback
+VECTOR_BUILD_TIMEOUT_SECONDS = int(os.getenv('VECTOR_BUILD_TIMEOUT_SECONDS', 6 * 60 * 60))  # a build older than this is considered dead
+INGESTION_JOB_HEARTBEAT_SECONDS = int(os.getenv('INGESTION_JOB_HEARTBEAT_SECONDS', 30))  # how often a running job proves its worker is alive
+INGESTION_JOB_STALE_SECONDS = int(os.getenv('INGESTION_JOB_STALE_SECONDS', 5 * 60))  # a running job without a heartbeat for this long is reclaimed
+CRITERIA_EXTRACTION_BACKEND = os.getenv('CRITERIA_EXTRACTION_BACKEND', 'openai')  # 'openai' or 'stub' (regex only, no network)
+CRITERIA_LLM_MODEL = os.getenv('CRITERIA_LLM_MODEL', 'gpt-4o')
+CRITERIA_LLM_CONCURRENCY = int(os.getenv('CRITERIA_LLM_CONCURRENCY', 4))  # concurrent LLM requests during program ingest
+CRITERIA_LLM_MAX_RETRIES = int(os.getenv('CRITERIA_LLM_MAX_RETRIES', 3))
+CRITERIA_CACHE_PATH = os.getenv('CRITERIA_CACHE_PATH', os.path.join(BASE_DIR, 'chromadb_data', 'criteria_cache.sqlite3'))  # empty disables the cache
+RECOMMENDATION_CACHE_TTL_SECONDS = int(os.getenv('RECOMMENDATION_CACHE_TTL_SECONDS', 10 * 60))
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.getenv('RECOMMENDATION_CACHE_MAX_ENTRIES', 2048))  # per worker process, least recently used evicted first
+RECOMMENDATION_EXACT_SEARCH_MAX_CANDIDATES = int(os.getenv('RECOMMENDATION_EXACT_SEARCH_MAX_CANDIDATES', 2000))  # larger candidate sets use ANN search
+RECOMMENDATION_BATCH_MAX_USERS = int(os.getenv('RECOMMENDATION_BATCH_MAX_USERS', 200))  # students per batch recommendation request
+RECOMMENDATION_BATCH_MAX_TOP_N = int(os.getenv('RECOMMENDATION_BATCH_MAX_TOP_N', 50))  # results per student in a batch request
+PROGRAM_MATCHES_TOP_K = int(os.getenv('PROGRAM_MATCHES_TOP_K', 200))  # unfiltered program matches materialized per student
+PROGRAM_MATCHES_MAX_AGE_SECONDS = int(os.getenv('PROGRAM_MATCHES_MAX_AGE_SECONDS', 24 * 60 * 60))  # served until the next scheduled run, at most this old
+STUDENT_MATCHES_TOP_K = int(os.getenv('STUDENT_MATCHES_TOP_K', 100))  # student matches materialized per researcher
+STUDENT_MATCHES_MAX_AGE_SECONDS = int(os.getenv('STUDENT_MATCHES_MAX_AGE_SECONDS', 24 * 60 * 60))  # older matches are refreshed in the background
+STUDENT_MATCHES_REFRESH_WORKERS = int(os.getenv('STUDENT_MATCHES_REFRESH_WORKERS', 2))  # background refreshes running at once per process
+PROGRAM_SEARCH_CANDIDATES = int(os.getenv('PROGRAM_SEARCH_CANDIDATES', 100))  # results taken from each ranking before fusion
+PROGRAM_SEARCH_RRF_K = int(os.getenv('PROGRAM_SEARCH_RRF_K', 60))  # reciprocal rank fusion constant
+
+
 # settings.py
 
 CSP_DEFAULT_SRC = ("'self'",)
@@ -2,16 +2,38 @@
 from django.contrib.auth.models import Permission
 from django.contrib.auth.models import Group as DjangoGroup
 from django.db import models
+from django.dispatch import Signal
 from django.utils import timezone
 from simple_history.models import HistoricalRecords
 from simple_history import register
 from django.contrib.auth.models import User
 
 
+# Sent with the model as sender and `pks` of the rows after SoftDeleteQuerySet.update() and
+# delete(), which bypass save() and post_save
+queryset_updated = Signal()
+
+
 class SoftDeleteQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Update the rows and send `queryset_updated`; like any update(), updated_at is only set when passed."""
+        if not queryset_updated.has_listeners(self.model):
+            return super().update(**kwargs)
+        # Collected first: a soft delete removes the rows from this queryset
+        pks = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        if pks:
+            queryset_updated.send(sender=self.model, pks=pks)
+        return updated
+
     def delete(self):
         """Override delete method to perform a soft delete."""
-        return super().update(deleted_at=timezone.now())
+        now = timezone.now()
+        fields = {'deleted_at': now}
+        # Delta ingests find soft-deleted rows by updated_at (auto_now only applies in save())
+        if any(field.name == 'updated_at' for field in self.model._meta.concrete_fields):
+            fields['updated_at'] = now
+        return self.update(**fields)
 
     def hard_delete(self):
         """Actually delete the objects from the database."""
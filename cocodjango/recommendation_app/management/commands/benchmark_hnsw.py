@@ -0,0 +1,121 @@
+import itertools
+import random
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.chromadb_registry import VECTOR_STORES
+from recommendation_app.utils.vector_benchmark import load_vectors
+
+
+class Command(BaseCommand):
+    help = 'Report recall@k against exact search and query latency of HNSW parameter combinations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', default='program', choices=list(VECTOR_STORES), help='Store whose vectors form the corpus')
+        parser.add_argument('--query-store', default='student', choices=list(VECTOR_STORES), help='Store whose vectors are used as queries')
+        parser.add_argument('--synthetic', type=int, default=0, help='Benchmark a synthetic clustered corpus of this size instead of --store')
+        parser.add_argument('--dimensions', type=int, default=1024, help='Dimensions of the synthetic corpus')
+        parser.add_argument('--sample', type=int, default=200, help='Number of query vectors')
+        parser.add_argument('--k', type=int, default=10, help='Recall is measured at k')
+        parser.add_argument('--construction-ef', default='100,200', help='Comma-separated hnsw:construction_ef values')
+        parser.add_argument('--m', default='16,32', help='Comma-separated hnsw:M values')
+        parser.add_argument('--search-ef', default='10,50,100', help='Comma-separated hnsw:search_ef values')
+        parser.add_argument('--target-recall', type=float, default=0.95, help='Recall the recommended settings must reach')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic corpus and query sample')
+
+    @staticmethod
+    def normalize(vectors):
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def synthetic_corpus(self, size, dimensions, rng):
+        # Clustered rather than uniform, like real embeddings, so the graph has neighbourhoods to get wrong
+        centers = rng.standard_normal((max(size // 100, 1), dimensions))
+        assignment = rng.integers(0, len(centers), size)
+        return self.normalize((centers[assignment] + 0.5 * rng.standard_normal((size, dimensions))).astype(np.float32))
+
+    def load_corpus(self, options, rng):
+        if options['synthetic']:
+            corpus = self.synthetic_corpus(options['synthetic'], options['dimensions'], rng)
+            queries = np.zeros((0, corpus.shape[1]), dtype=np.float32)
+        else:
+            corpus = load_vectors(options['store'])
+            queries = load_vectors(options['query_store'])
+        if len(corpus) == 0:
+            raise CommandError(f"{options['store']} holds no vectors")
+        if len(queries) == 0 or queries.shape[1] != corpus.shape[1]:
+            # Perturbed corpus vectors stand in for queries
+            rows = rng.integers(0, len(corpus), options['sample'])
+            queries = corpus[rows] + 0.1 * rng.standard_normal((len(rows), corpus.shape[1])).astype(np.float32)
+        rows = random.Random(options['seed']).sample(range(len(queries)), min(options['sample'], len(queries)))
+        return self.normalize(corpus), self.normalize(queries[rows])
+
+    def run_combination(self, client, corpus, queries, truth, k, params):
+        collection = client.create_collection(
+            name=f"benchmark_{'_'.join(str(value) for value in params.values())}",
+            metadata={"hnsw:space": "cosine", **{f"hnsw:{name}": value for name, value in params.items()}}
+        )
+        try:
+            started = time.perf_counter()
+            for start in range(0, len(corpus), 1000):
+                batch = corpus[start:start + 1000]
+                collection.add(ids=[str(i) for i in range(start, start + len(batch))], embeddings=batch.tolist())
+            build_seconds = time.perf_counter() - started
+
+            latencies, recalls = [], []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                results = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+                latencies.append((time.perf_counter() - started) * 1000)
+                found = {int(result_id) for result_id in results['ids'][0]}
+                recalls.append(len(found & set(expected.tolist())) / k)
+        finally:
+            client.delete_collection(name=collection.name)
+        return float(np.mean(recalls)), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95)), build_seconds
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        try:
+            corpus, queries = self.load_corpus(options, rng)
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError(f'Failed to load vectors with error: {str(e)}')
+
+        k = min(options['k'], len(corpus))
+        truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+        grid = list(itertools.product(
+            [int(value) for value in options['construction_ef'].split(',')],
+            [int(value) for value in options['m'].split(',')],
+            [int(value) for value in options['search_ef'].split(',')],
+        ))
+
+        self.stdout.write(f'{len(corpus)} vectors of {corpus.shape[1]} dimensions, {len(queries)} queries, recall@{k}')
+        self.stdout.write(f"{'construction_ef':>15} {'M':>4} {'search_ef':>9} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} {'build s':>8}")
+        path = tempfile.mkdtemp(prefix='hnsw_benchmark_')
+        rows = []
+        try:
+            client = chromadb.PersistentClient(path=path)
+            for construction_ef, m, search_ef in grid:
+                params = {'construction_ef': construction_ef, 'M': m, 'search_ef': search_ef}
+                recall, p50, p95, build_seconds = self.run_combination(client, corpus, queries, truth, k, params)
+                rows.append((params, recall, p95))
+                self.stdout.write(f'{construction_ef:>15} {m:>4} {search_ef:>9} {recall:>7.3f} {p50:>7.2f} {p95:>7.2f} {build_seconds:>8.1f}')
+        except Exception as e:
+            raise CommandError(f'Failed to benchmark HNSW parameters with error: {str(e)}')
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+        passing = [row for row in rows if row[1] >= options['target_recall']]
+        if not passing:
+            self.stdout.write(self.style.WARNING(f"No combination reached recall {options['target_recall']}"))
+            return
+        params, recall, p95 = min(passing, key=lambda row: (row[2], row[0]['M'], row[0]['construction_ef']))
+        prefix = f"VECTOR_HNSW_{options['store'].upper()}"
+        self.stdout.write(self.style.SUCCESS(
+            f"Fastest combination with recall >= {options['target_recall']}: recall {recall:.3f}, p95 {p95:.2f} ms; "
+            f"{prefix}_CONSTRUCTION_EF={params['construction_ef']} {prefix}_M={params['M']} {prefix}_SEARCH_EF={params['search_ef']}"
+        ))
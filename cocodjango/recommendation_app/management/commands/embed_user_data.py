@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.chromadb_ingest_user_data import run_full_ingest
+from recommendation_app.utils.embedding_service import EmbeddingService
+
+
+class Command(BaseCommand):
+    help = 'Embed researcher, student and program data into ChromaDB using the shared embedding model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Sentences per forward pass')
+        parser.add_argument('--torch-threads', type=int, default=None, help='Number of torch intra-op threads')
+
+    def handle(self, *args, **options):
+        service = EmbeddingService.get_instance()
+        if options['batch_size']:
+            service.batch_size = options['batch_size']
+        if options['torch_threads'] is not None:
+            service.torch_threads = options['torch_threads']
+
+        self.stdout.write(f'Loading embedding model "{service.model_name}"')
+        service.warm_up()
+        try:
+            run_full_ingest(service)
+        except Exception as e:
+            raise CommandError(f'Failed to embed user data with error: {str(e)}')
+        self.stdout.write(self.style.SUCCESS('User data embedding done.'))
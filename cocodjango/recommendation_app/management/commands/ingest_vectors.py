@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from recommendation_app.utils.delta_ingest import DeltaIngest, FULL_INGEST_METHODS
+
+
+class Command(BaseCommand):
+    help = 'Re-embed the programs and users changed since the last successful run of each collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', nargs='+', choices=list(FULL_INGEST_METHODS), default=None,
+                            help='Collections to ingest (default: all)')
+        parser.add_argument('--since', default=None,
+                            help='Ingest rows updated after this ISO date or datetime instead of the stored watermark')
+        parser.add_argument('--workers', type=int, default=1, help='Batches embedded concurrently')
+        parser.add_argument('--batch-size', type=int, default=None, help='Objects per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be ingested')
+
+    def handle(self, *args, **options):
+        since = self.parse_since(options['since']) if options['since'] else None
+        try:
+            results = DeltaIngest(
+                collections=options['collections'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                stdout=self.stdout
+            ).run(since)
+        except Exception as e:
+            raise CommandError(f'Failed to ingest vectors with error: {str(e)}')
+
+        summary = ', '.join(
+            f"{collection}: {'full build' if changed is None else f'{changed} changed'}"
+            for collection, changed in results.items()
+        )
+        verb = 'Would ingest' if options['dry_run'] else 'Ingested'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {summary or "nothing"}'))
+
+    @staticmethod
+    def parse_since(value):
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = datetime(date.year, date.month, date.day)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
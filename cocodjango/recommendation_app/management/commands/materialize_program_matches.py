@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.program_matches import ProgramMatchStore
+from recommendation_app.utils.recommendation_service import get_user_embeddings
+
+
+class Command(BaseCommand):
+    help = "Precompute every student's unfiltered top-K program matches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help='Matches stored per student')
+        parser.add_argument('--batch-size', type=int, default=64, help='Students per multi-vector query')
+        parser.add_argument('--force', action='store_true', help='Recompute students whose matches are still current')
+
+    def handle(self, *args, **options):
+        try:
+            student_ids = list(User.objects.filter(groups__name='Student').order_by('id').values_list('id', flat=True))
+            updated = 0
+            for start in range(0, len(student_ids), options['batch_size']):
+                embeddings = get_user_embeddings(student_ids[start:start + options['batch_size']])
+                updated += ProgramMatchStore.materialize(embeddings, top_k=options['top_k'], force=options['force'])
+        except Exception as e:
+            raise CommandError(f'Failed to materialize program matches with error: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Updated program matches of {updated} of {len(student_ids)} students'))
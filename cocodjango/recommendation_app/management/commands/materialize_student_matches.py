@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.chromadb_ingest_user_data import RESEARCH_ROLES
+from recommendation_app.utils.student_matches import StudentMatchStore, get_researcher_embeddings
+
+
+class Command(BaseCommand):
+    help = "Precompute every researcher's top-K student matches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help='Matches stored per researcher')
+        parser.add_argument('--batch-size', type=int, default=64, help='Researchers per multi-vector query')
+        parser.add_argument('--force', action='store_true', help='Recompute researchers whose matches are still current')
+
+    def handle(self, *args, **options):
+        try:
+            researcher_ids = list(
+                User.objects.filter(userdetails__user_type__in=RESEARCH_ROLES).distinct().order_by('id').values_list('id', flat=True)
+            )
+            updated = 0
+            for start in range(0, len(researcher_ids), options['batch_size']):
+                embeddings = get_researcher_embeddings(researcher_ids[start:start + options['batch_size']])
+                updated += StudentMatchStore.materialize(embeddings, top_k=options['top_k'], force=options['force'])
+        except Exception as e:
+            raise CommandError(f'Failed to materialize student matches with error: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Updated student matches of {updated} of {len(researcher_ids)} researchers'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.vector_index_updater import VectorIndexUpdater
+
+
+class Command(BaseCommand):
+    help = 'Re-embed or remove the programs and users marked dirty since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new updates')
+        parser.add_argument('--interval', type=int, default=10, help='Seconds between polls when looping')
+        parser.add_argument('--debounce', type=int, default=None, help='Seconds an object must be unchanged before it is processed')
+        parser.add_argument('--limit', type=int, default=500, help='Maximum number of updates per poll')
+
+    def handle(self, *args, **options):
+        updater = VectorIndexUpdater(debounce_seconds=options['debounce'])
+        while True:
+            try:
+                counts = updater.process_pending(limit=options['limit'])
+            except Exception as e:
+                if not options['loop']:
+                    raise CommandError(f'Failed to process vector index updates with error: {str(e)}')
+                self.stderr.write(f'Failed to process vector index updates with error: {str(e)}')
+                counts = {}
+
+            if counts.get('failed'):
+                self.stderr.write(f"{counts['failed']} updates failed and will be retried")
+            if counts.get('processed'):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {counts['processed']} updates: {counts['upserted']} upserted, {counts['deleted']} deleted"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
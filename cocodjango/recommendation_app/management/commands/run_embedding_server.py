@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.embedding_server import EmbeddingServer
+from recommendation_app.utils.embedding_service import EmbeddingService
+
+
+class Command(BaseCommand):
+    help = 'Serve the embedding model on a Unix socket, batching concurrent requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help='Socket path (default: EMBEDDING_SERVER_SOCKET)')
+        parser.add_argument('--batch-window-ms', type=int, default=None, help='Milliseconds to wait for more requests to batch')
+        parser.add_argument('--max-batch', type=int, default=None, help='Texts merged into one forward pass')
+        parser.add_argument('--torch-threads', type=int, default=None, help='Number of torch intra-op threads')
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or settings.EMBEDDING_SERVER_SOCKET
+        if not socket_path:
+            raise CommandError('Set EMBEDDING_SERVER_SOCKET or pass --socket')
+
+        service = EmbeddingService.get_instance()
+        if options['torch_threads'] is not None:
+            service.torch_threads = options['torch_threads']
+        self.stdout.write(f'Loading embedding model "{service.model_name}"')
+        service.warm_up()
+
+        server = EmbeddingServer(socket_path, service, options['batch_window_ms'], options['max_batch'])
+        self.stdout.write(self.style.SUCCESS(f'Embedding server listening on {socket_path}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            raise CommandError(f'Failed to run the embedding server with error: {str(e)}')
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.embedding_service import get_embedding_service
+from recommendation_app.utils.ingestion_jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued vector ingestion jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run at most one job and exit')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds between polls for queued jobs')
+
+    def handle(self, *args, **options):
+        get_embedding_service().warm_up()
+        while True:
+            job = claim_next_job()
+            if job is not None:
+                self.stdout.write(f'Running ingestion job {job.id} ({", ".join(job.stages)})')
+                try:
+                    run_job(job)
+                    self.stdout.write(self.style.SUCCESS(f'Ingestion job {job.id} finished: {job.progress}'))
+                except Exception as e:
+                    if options['once']:
+                        raise CommandError(f'Failed to run ingestion job {job.id} with error: {str(e)}')
+                    self.stderr.write(f'Failed to run ingestion job {job.id} with error: {str(e)}')
+            if options['once']:
+                break
+            if job is None:
+                time.sleep(options['interval'])
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.chromadb_registry import VECTOR_STORES
+from recommendation_app.utils.vector_benchmark import load_vectors
+from recommendation_app.utils.vector_quantization import (
+    QUANTIZATION_MODES,
+    approximate_scores,
+    code_bytes,
+    quantize,
+    truncate,
+)
+
+
+class Command(BaseCommand):
+    help = 'Report recall and memory per vector of truncated and quantized storage modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', default='program', choices=list(VECTOR_STORES), help='Store to evaluate')
+        parser.add_argument('--query-store', default='student', choices=list(VECTOR_STORES), help='Store whose vectors are used as queries')
+        parser.add_argument('--sample', type=int, default=200, help='Number of query vectors')
+        parser.add_argument('--k', type=int, default=10, help='Recall is measured at k')
+        parser.add_argument('--dimensions', default='0,512,256', help='Comma-separated dimensions to evaluate; 0 is the stored size')
+        parser.add_argument('--rescore-factor', type=int, default=4, help='Candidates re-scored with float vectors per result')
+
+    def handle(self, *args, **options):
+        try:
+            corpus = load_vectors(options['store'])
+            queries = load_vectors(options['query_store'])
+        except Exception as e:
+            raise CommandError(f'Failed to load vectors with error: {str(e)}')
+        if len(corpus) == 0 or len(queries) == 0:
+            raise CommandError('Both stores must hold vectors')
+
+        rows = random.sample(range(len(queries)), min(options['sample'], len(queries)))
+        queries = queries[rows]
+        k = min(options['k'], len(corpus))
+        stored_dimensions = corpus.shape[1]
+        truth = np.argsort(-(truncate(queries, 0) @ truncate(corpus, 0).T), axis=1)[:, :k]
+
+        self.stdout.write(f'{len(corpus)} vectors of {stored_dimensions} dimensions, {len(queries)} queries, recall@{k}')
+        self.stdout.write(f"{'dimensions':>10} {'mode':>7} {'bytes/vector':>13} {'MB total':>9} {'recall':>7}")
+        for dimensions in [int(value) for value in options['dimensions'].split(',')]:
+            dimensions = dimensions or stored_dimensions
+            if dimensions > stored_dimensions:
+                continue
+            corpus_dims, queries_dims = truncate(corpus, dimensions), truncate(queries, dimensions)
+            float_scores = queries_dims @ corpus_dims.T
+            for mode in QUANTIZATION_MODES:
+                if mode == 'none':
+                    found = np.argsort(-float_scores, axis=1)[:, :k]
+                else:
+                    codes, scales = quantize(corpus_dims, mode)
+                    approximate = approximate_scores(codes, scales, queries_dims, mode)
+                    n_candidates = min(k * options['rescore_factor'], len(corpus))
+                    candidates = np.argpartition(-approximate, n_candidates - 1, axis=1)[:, :n_candidates]
+                    rescored = np.take_along_axis(float_scores, candidates, axis=1)
+                    found = np.take_along_axis(candidates, np.argsort(-rescored, axis=1)[:, :k], axis=1)
+                recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+                size = code_bytes(dimensions, mode)
+                self.stdout.write(f'{dimensions:>10} {mode:>7} {size:>13} {size * len(corpus) / 2 ** 20:>9.2f} {recall:>7.3f}')
@@ -1,4 +1,6 @@
 from django.db import models
+from django.utils import timezone
+from django.contrib.auth.models import User
 
 class Funding(models.Model):
     university = models.CharField(max_length=200)
@@ -9,4 +11,146 @@ class Funding(models.Model):
     funding_document_path = models.TextField()
 
     def __str__(self):
-        return f"{self.university} -- {self.department}"
\ No newline at end of file
+        return f"{self.university} -- {self.department}"
+
+
+class VectorIndexUpdate(models.Model):
+    """An object whose vectors are out of date and must be re-embedded or removed."""
+    PROGRAM = 'program'
+    USER = 'user'
+    TARGET_CHOICES = [
+        (PROGRAM, 'Program'),
+        (USER, 'User'),
+    ]
+
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    object_id = models.IntegerField()
+    # Pushed forward on every change so a burst of edits is processed once
+    marked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = ('target', 'object_id')
+
+    def __str__(self):
+        return f"{self.target} {self.object_id} marked at {self.marked_at}"
+
+
+class VectorCollectionAlias(models.Model):
+    """Points a logical collection name at the physical collection queries should use."""
+    alias = models.CharField(max_length=63, unique=True)
+    collection_name = models.CharField(max_length=63)
+    # Set while a shadow collection is being built for this alias
+    build_started_at = models.DateTimeField(null=True, blank=True)
+    # Bumped whenever the contents change, so cached query results can be keyed by it
+    generation = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.collection_name}"
+
+
+class IngestionJob(models.Model):
+    """A background rebuild of one or more vector collections."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    STAGES = ['researcher', 'student', 'program']
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    # Stages to run, in order; a subset of STAGES
+    stages = models.JSONField(default=list)
+    # {stage: {"rows_fetched": n, "texts_extracted": n, "extraction_errors": n, "vectors_written": n, "errors": n}}
+    progress = models.JSONField(default=dict)
+    # {stage: {"collection_name": shadow, "last_id": n, "written": n, "done": bool}}
+    checkpoint = models.JSONField(default=dict)
+    error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, related_name='ingestion_jobs', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Ingestion job {self.id} ({self.status})"
+
+
+class ProgramSearchDocument(models.Model):
+    """A program in the lexical (BM25) search index."""
+    program_id = models.IntegerField(unique=True)
+    # Number of indexed tokens, used for BM25 length normalization
+    length = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"program {self.program_id} ({self.length} tokens)"
+
+
+class ProgramSearchPosting(models.Model):
+    """Occurrences of one term in one program's searchable text."""
+    term = models.CharField(max_length=64, db_index=True)
+    program_id = models.IntegerField(db_index=True)
+    frequency = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('term', 'program_id')
+
+    def __str__(self):
+        return f"{self.term} in program {self.program_id} x{self.frequency}"
+
+
+class StudentProgramMatch(models.Model):
+    """One of a student's precomputed, unfiltered top-K program matches."""
+    user = models.ForeignKey(User, related_name='program_matches', on_delete=models.CASCADE)
+    program_id = models.IntegerField()
+    rank = models.PositiveIntegerField()
+    distance = models.FloatField()
+    # Student vector and program collection version the match was computed from
+    version = models.CharField(max_length=128)
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'rank')
+        ordering = ['user', 'rank']
+        permissions = [
+            ('view_student_recommendations', 'Can view recommendations of students in their organization'),
+        ]
+
+    def __str__(self):
+        return f"user {self.user_id} #{self.rank}: program {self.program_id}"
+
+
+class VectorIngestWatermark(models.Model):
+    """High-water mark of the last successful delta ingest of one vector collection."""
+    collection = models.CharField(max_length=20, unique=True)
+    # Rows with `updated_at` after this were not ingested yet
+    watermark = models.DateTimeField()
+    rows_processed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.collection} ingested up to {self.watermark}"
+
+
+class ResearcherStudentMatch(models.Model):
+    """One of a researcher's precomputed top-K student matches."""
+    researcher = models.ForeignKey(User, related_name='student_matches', on_delete=models.CASCADE)
+    student_id = models.IntegerField()
+    rank = models.PositiveIntegerField()
+    distance = models.FloatField()
+    # Researcher vector and student collection version the match was computed from
+    version = models.CharField(max_length=128)
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('researcher', 'rank')
+        ordering = ['researcher', 'rank']
+
+    def __str__(self):
+        return f"researcher {self.researcher_id} -> student {self.student_id} #{self.rank}"
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+from .models import IngestionJob
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    stages = serializers.ListField(
+        child=serializers.ChoiceField(choices=IngestionJob.STAGES),
+        required=False
+    )
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id', 'status', 'stages', 'progress', 'checkpoint', 'error',
+            'created_by', 'created_at', 'updated_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'status', 'progress', 'checkpoint', 'error',
+            'created_by', 'created_at', 'updated_at', 'started_at', 'finished_at'
+        ]
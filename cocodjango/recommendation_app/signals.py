@@ -0,0 +1,91 @@
+# recommendation_app/signals.py
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from program_app.models import Program
+from funding_app.models import Funding
+from profile_app.models import UserDetails, Publication
+from common.models import UserDocument, queryset_updated
+from .utils.vector_index_updates import mark_programs_dirty, mark_users_dirty
+
+
+# Saving a model instance, including instance.delete() (a soft delete via
+# save()), fires post_save; post_delete covers hard deletes. Queryset
+# update() and delete() (a bulk soft delete) fire neither and are covered by
+# `queryset_updated` below.
+
+@receiver(post_save, sender=Program)
+@receiver(post_delete, sender=Program)
+def program_changed(sender, instance, **kwargs):
+    # The debounced updater re-indexes the vectors and the keyword index together
+    mark_programs_dirty([instance.id])
+
+
+@receiver(pre_save, sender=Funding)
+def funding_before_save(sender, instance, **kwargs):
+    # Remember the previous targets so the programs and researcher that lose
+    # this funding are re-indexed as well
+    previous = Funding.all_objects.filter(pk=instance.pk).values('funding_for_dept_id', 'funding_for_faculty_member_id').first()
+    instance._vector_index_previous = previous or {}
+
+
+@receiver(post_save, sender=Funding)
+@receiver(post_delete, sender=Funding)
+def funding_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_vector_index_previous', {})
+    department_ids = {instance.funding_for_dept_id, previous.get('funding_for_dept_id')} - {None}
+    if department_ids:
+        mark_programs_dirty(Program.all_objects.filter(department_id__in=department_ids).values_list('id', flat=True))
+    mark_users_dirty([instance.funding_for_faculty_member_id, previous.get('funding_for_faculty_member_id')])
+
+
+@receiver(post_save, sender=UserDetails)
+@receiver(post_delete, sender=UserDetails)
+def user_details_changed(sender, instance, **kwargs):
+    mark_users_dirty([instance.user_id])
+
+
+@receiver(post_save, sender=Publication)
+@receiver(post_delete, sender=Publication)
+def publication_changed(sender, instance, **kwargs):
+    user_id = UserDetails.all_objects.filter(id=instance.user_details_id).values_list('user_id', flat=True).first()
+    mark_users_dirty([user_id])
+
+
+@receiver(post_save, sender=UserDocument)
+@receiver(post_delete, sender=UserDocument)
+def user_document_changed(sender, instance, **kwargs):
+    if instance.use in (UserDocument.RESUME, UserDocument.SOP):
+        mark_users_dirty([instance.user_id])
+
+
+@receiver(queryset_updated, sender=Program)
+def programs_bulk_changed(sender, pks, **kwargs):
+    mark_programs_dirty(pks)
+
+
+@receiver(queryset_updated, sender=Funding)
+def fundings_bulk_changed(sender, pks, **kwargs):
+    fundings = Funding.all_objects.filter(pk__in=pks).values_list('funding_for_dept_id', 'funding_for_faculty_member_id')
+    department_ids = {department_id for department_id, _ in fundings} - {None}
+    if department_ids:
+        mark_programs_dirty(Program.all_objects.filter(department_id__in=department_ids).values_list('id', flat=True))
+    mark_users_dirty([user_id for _, user_id in fundings])
+
+
+@receiver(queryset_updated, sender=UserDetails)
+def user_details_bulk_changed(sender, pks, **kwargs):
+    mark_users_dirty(UserDetails.all_objects.filter(pk__in=pks).values_list('user_id', flat=True))
+
+
+@receiver(queryset_updated, sender=Publication)
+def publications_bulk_changed(sender, pks, **kwargs):
+    mark_users_dirty(Publication.all_objects.filter(pk__in=pks).values_list('user_details__user_id', flat=True))
+
+
+@receiver(queryset_updated, sender=UserDocument)
+def user_documents_bulk_changed(sender, pks, **kwargs):
+    mark_users_dirty(
+        UserDocument.all_objects.filter(pk__in=pks, use__in=[UserDocument.RESUME, UserDocument.SOP])
+        .values_list('user_id', flat=True)
+    )
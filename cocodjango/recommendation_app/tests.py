@@ -1,3 +1,161 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .utils.metadata_filters import matches_where
+from .utils.vector_store import NumpyVectorStoreClient
+
+
+class NumpyVectorStoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.client = NumpyVectorStoreClient(self.path)
+        self.rng = np.random.default_rng(0)
+
+    def vectors(self, count, dimensions=32):
+        return self.rng.standard_normal((count, dimensions)).astype(np.float32)
+
+    def test_upsert_get_query_delete(self):
+        collection = self.client.create_collection('programs')
+        vectors = self.vectors(3)
+        collection.upsert(
+            ids=['a', 'b', 'c'],
+            embeddings=vectors.tolist(),
+            documents=['doc a', 'doc b', 'doc c'],
+            metadatas=[{'org': 'x', 'rank': 1}, {'org': 'y', 'rank': 2}, {'org': 'x', 'rank': 3}]
+        )
+        self.assertEqual(collection.count(), 3)
+
+        records = collection.get(ids=['c', 'a'], include=['documents', 'metadatas'])
+        self.assertEqual(sorted(records['ids']), ['a', 'c'])
+        self.assertEqual(dict(zip(records['ids'], records['documents'])), {'a': 'doc a', 'c': 'doc c'})
+
+        results = collection.query(query_embeddings=[vectors[1].tolist()], n_results=2)
+        self.assertEqual(results['ids'][0][0], 'b')
+        self.assertAlmostEqual(results['distances'][0][0], 0.0, places=5)
+
+        filtered = collection.query(query_embeddings=[vectors[1].tolist()], n_results=3, where={'org': 'x'})
+        self.assertEqual(sorted(filtered['ids'][0]), ['a', 'c'])
+
+        # An upsert replaces the vector; add leaves existing ids unchanged
+        collection.upsert(ids=['a'], embeddings=[vectors[1].tolist()], documents=['doc a2'], metadatas=[{'org': 'x', 'rank': 1}])
+        collection.add(ids=['a'], embeddings=[vectors[2].tolist()], documents=['ignored'], metadatas=[{'org': 'z'}])
+        records = collection.get(ids=['a'], include=['documents', 'embeddings'])
+        self.assertEqual(records['documents'], ['doc a2'])
+        np.testing.assert_allclose(records['embeddings'][0], vectors[1] / np.linalg.norm(vectors[1]), rtol=1e-5)
+        self.assertEqual(collection.count(), 3)
+
+        collection.delete(ids=['b'])
+        collection.delete(where={'rank': {'$gte': 3}})
+        self.assertEqual(collection.get()['ids'], ['a'])
+
+    def test_other_process_writes_are_visible(self):
+        self.client.create_collection('programs')
+        writer = self.client.get_collection('programs')
+        reader = self.client.get_collection('programs')
+        self.assertEqual(reader.count(), 0)
+        writer.upsert(ids=['a'], embeddings=self.vectors(1).tolist(), metadatas=[{'org': 'x'}])
+        self.assertEqual(reader.count(), 1)
+
+    def test_segments_are_merged(self):
+        collection = self.client.create_collection('programs')
+        vectors = self.vectors(7)
+        for index, vector in enumerate(vectors[:5]):
+            collection.upsert(ids=[str(index)], embeddings=[vector.tolist()], metadatas=[{'index': index}])
+        collection.delete(ids=['1'])
+        collection.upsert(ids=['5', '6'], embeddings=vectors[5:].tolist(), metadatas=[{'index': 5}, {'index': 6}])
+
+        with open(os.path.join(collection.directory, 'state.json')) as state_file:
+            state = json.load(state_file)
+        # Equal-sized writes collapse into one segment, dropping deleted rows on the way
+        self.assertEqual(len(state['segments']), 1)
+        self.assertEqual(state['deleted'], {})
+        self.assertEqual(state['sizes'][state['segments'][0]], 6)
+        segment_files = [name for name in os.listdir(collection.directory) if name.startswith('segment_') and name.endswith('.json')
+                         and not name.endswith('.documents.json')]
+        self.assertEqual(segment_files, [f"{state['segments'][0]}.json"])
+
+        self.assertEqual(sorted(collection.get()['ids']), ['0', '2', '3', '4', '5', '6'])
+        results = collection.query(query_embeddings=[vectors[3].tolist()], n_results=1, include=['metadatas'])
+        self.assertEqual(results['metadatas'][0][0], {'index': 3})
+
+    @override_settings(VECTOR_RESCORE_FACTOR=4)
+    def test_quantized_ranking_agrees_with_float(self):
+        vectors = self.vectors(500, dimensions=64)
+        ids = [str(index) for index in range(len(vectors))]
+        exact = self.client.create_collection('exact')
+        exact.upsert(ids=ids, embeddings=vectors.tolist())
+        queries = self.vectors(20, dimensions=64).tolist()
+        expected = exact.query(query_embeddings=queries, n_results=10, include=['distances'])
+
+        for mode, min_recall in (('int8', 0.95), ('binary', 0.5)):
+            quantized = self.client.create_collection(f'quantized_{mode}', metadata={'numpy:quantization': mode})
+            quantized.upsert(ids=ids, embeddings=vectors.tolist())
+            self.assertTrue(any(name.endswith('.codes.npy') for name in os.listdir(quantized.directory)))
+
+            results = quantized.query(query_embeddings=queries, n_results=10, include=['distances'])
+            recall = np.mean([
+                len(set(found) & set(truth)) / 10
+                for found, truth in zip(results['ids'], expected['ids'])
+            ])
+            self.assertGreaterEqual(recall, min_recall, mode)
+
+            # Returned distances are re-scored with the float vectors
+            exact_distances = dict(zip(expected['ids'][0], expected['distances'][0]))
+            for result_id, distance in zip(results['ids'][0], results['distances'][0]):
+                if result_id in exact_distances:
+                    self.assertAlmostEqual(distance, exact_distances[result_id], places=5)
+
+            # A stored vector always finds itself first
+            own = quantized.query(query_embeddings=[vectors[7].tolist()], n_results=1)
+            self.assertEqual(own['ids'][0], ['7'])
+
+
+class MatchesWhereTestCase(SimpleTestCase):
+    metadata = {'country': 'Canada', 'ielts': 6.5, 'funded': True}
+
+    def test_equality_and_operators(self):
+        self.assertTrue(matches_where(self.metadata, None))
+        self.assertTrue(matches_where(self.metadata, {'country': 'Canada'}))
+        self.assertFalse(matches_where(self.metadata, {'country': {'$ne': 'Canada'}}))
+        self.assertTrue(matches_where(self.metadata, {'ielts': {'$gte': 6.5, '$lt': 7}}))
+        self.assertTrue(matches_where(self.metadata, {'country': {'$in': ['Canada', 'Japan']}}))
+        self.assertTrue(matches_where(self.metadata, {'country': {'$nin': ['Japan']}}))
+
+    def test_boolean_clauses(self):
+        self.assertTrue(matches_where(self.metadata, {'$and': [{'country': 'Canada'}, {'funded': True}]}))
+        self.assertFalse(matches_where(self.metadata, {'$and': [{'country': 'Canada'}, {'funded': False}]}))
+        self.assertTrue(matches_where(self.metadata, {'$or': [{'country': 'Japan'}, {'ielts': {'$gt': 6}}]}))
+        self.assertFalse(matches_where(self.metadata, {'$or': [{'country': 'Japan'}, {'ielts': {'$gt': 7}}]}))
+
+    def test_missing_and_mismatched_values_never_match(self):
+        self.assertFalse(matches_where(self.metadata, {'gre': {'$gt': 300}}))
+        self.assertFalse(matches_where(self.metadata, {'country': {'$gt': 5}}))
+
+    def test_numpy_backend_filters_like_matches_where(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        collection = NumpyVectorStoreClient(path).create_collection('programs')
+        metadatas = [
+            {'country': 'Canada', 'ielts': 6.5},
+            {'country': 'Japan', 'ielts': 7.0},
+            {'country': 'Canada'},
+            {'country': 'Germany', 'ielts': 5.5},
+        ]
+        ids = [str(index) for index in range(len(metadatas))]
+        collection.upsert(ids=ids, embeddings=np.eye(len(metadatas), dtype=np.float32).tolist(), metadatas=metadatas)
+        clauses = [
+            {'country': 'Canada'},
+            {'ielts': {'$lte': 6.5}},
+            {'country': {'$nin': ['Japan', 'Germany']}},
+            {'$or': [{'ielts': {'$gt': 6.9}}, {'country': 'Germany'}]},
+            {'$and': [{'country': 'Canada'}, {'ielts': {'$gte': 6}}]},
+        ]
+        for where in clauses:
+            expected = [record_id for record_id, metadata in zip(ids, metadatas) if matches_where(metadata, where)]
+            self.assertEqual(sorted(collection.get(where=where)['ids']), expected, where)
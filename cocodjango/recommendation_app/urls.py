@@ -1,10 +1,18 @@
 from django.urls import path
 from .views import EmbedUserDataView
 from .views import RecommendUniversitiesView
+from .views import IngestionJobView, IngestionJobResumeView
+from .views import ProgramSearchView, BatchRecommendationView, ResearcherStudentMatchesView
 
 urlpatterns = [
     path('embed_user_data/', EmbedUserDataView.as_view(), name='embed_user_data'),
      path('recommend/', RecommendUniversitiesView.as_view(), name='recommend_view'),
+    path('ingestion_jobs/', IngestionJobView.as_view(), name='ingestion_job_list'),
+    path('ingestion_jobs/<int:pk>/', IngestionJobView.as_view(), name='ingestion_job_detail'),
+    path('ingestion_jobs/<int:pk>/resume/', IngestionJobResumeView.as_view(), name='ingestion_job_resume'),
+    path('search/programs/', ProgramSearchView.as_view(), name='program_search'),
+    path('recommend/batch/', BatchRecommendationView.as_view(), name='recommend_batch'),
+    path('recommend/students/', ResearcherStudentMatchesView.as_view(), name='recommend_students'),
     # other paths...
 ]
  
\ No newline at end of file
@@ -1,5 +1,4 @@
 from django.core.management.base import BaseCommand
-from sentence_transformers import SentenceTransformer
 import chromadb
 import os
 import copy
@@ -8,9 +7,20 @@ import re
 from datetime import datetime
 from bs4 import BeautifulSoup
 from .text_loader_from_file import TextLoader
+from .text_extraction import TextExtractionPool
+from .criteria_extraction import CriteriaExtractionService, regex_criteria
+from .chromadb_registry import ChromaDBRegistry, VECTOR_STORES, collection_metadata
+from .collection_versions import CollectionVersions
+from .ingestion_jobs import NullJobProgress
+from .embedding_service import SharedEmbeddingFunction, get_embedding_service
+from .embedding_cache import EmbeddingCache
+from .metadata_filters import ProgramMetadataSchema
+from .program_search import ProgramLexicalIndex
+from .chunking import is_chunked, expand_records, delete_parents
 from django.conf import settings
 # from ..utils import UserDataService
-from common.models import SoftDeleteModel
+from common.models import SoftDeleteModel, UserDocument
+from django.core.files.storage import default_storage
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from profile_app.models import UserDetails
 from faculty_members_app.models import FacultyMembers
@@ -25,291 +35,96 @@ from department_app.models import Department
 from educational_organizations_app.models import EducationalOrganizations
 from campus_app.models import Campus
 from program_app.models import Program
-from openai import OpenAI
+from django.contrib.auth.models import User
 import json
 
 
 
+# User types whose profiles are embedded into the researcher collection
+RESEARCH_ROLES = [
+    'Professor', 'Researcher', 'Lecturer', 'Assistant Professor',
+    'Associate Professor',
+    'Postdoctoral Researcher', 'Visiting Scholar',  'Clinical Faculty',
+    'Adjunct Faculty', 'Faculty Emeritus']
+
+# Related object kind -> (model, name field) of the names stored in researcher metadata
+RELATED_NAME_FIELDS = {
+    'department': (Department, 'name'),
+    'college': (College, 'name'),
+    'campus': (Campus, 'campus_name'),
+    'organization': (EducationalOrganizations, 'name'),
+}
+
 
 class DjangoToChromaDBIngest:
-    def __init__(self, embedding_function, output_path=None):
-        self.embedding_function = embedding_function
+    def __init__(self, embedding_function=None, output_path=None, batch_size=None, job=None):
+        # Defaults to the shared model (or embedding server) so ingestors never load their own copy
+        self.embedding_function = embedding_function or get_embedding_service()
+        self.batch_size = batch_size or settings.VECTOR_INGEST_BATCH_SIZE
+        self.embedding_cache = EmbeddingCache.get_instance()
+        # Progress and checkpoints of the ingestion job this ingestor runs for, if any
+        self.job = job or NullJobProgress()
+        self.stage = None
+        # id -> name maps preloaded by `load_related_names`
+        self.related_names = {}
+        # Process pool extracting resumes and SOPs ahead of embedding during full builds
+        self.text_extraction = None
         if output_path:
+            output_path = ChromaDBRegistry.resolve_path(output_path)
             if not os.path.exists(output_path):
                 os.makedirs(output_path)
         self.output_path = output_path
 
     def get_embedding(self, text):
-        return self.embedding_function.encode(text).tolist()
+        return self.embedding_function.encode([text])[0]
 
     def ingest_researcher_user_documents(self):
         # users = UserDetails.objects.all()
-        
-        client = chromadb.PersistentClient(path=self.output_path)
-        try:
-            client.delete_collection(name="researcher_user_documents")
-        except Exception as e:
-            print("Collection doesn't exist or failed to delete:", e)
-        
-        collection = client.create_collection(name="researcher_user_documents", metadata={"hnsw:space": "cosine"})
-
-        # user_list = UserDataService.get_all_flat_users_data(group_name='Student')
-        research_roles = [
-        'Professor', 'Researcher', 'Lecturer', 'Assistant Professor',
-        'Associate Professor',
-        'Postdoctoral Researcher', 'Visiting Scholar',  'Clinical Faculty',
-        'Adjunct Faculty', 'Faculty Emeritus']
-
-        user_list = ResearcherDataService.get_all_flat_users_data(user_types=research_roles)
- 
-        # print("user_list:", user_list)
-
-        for user_data in user_list:
-            user_info =  user_data['user_main'][0]
-            user_details = user_data['user_details']
-            del user_data['user_details']
-            del user_data['user_main']
-            user_data.update(user_details)
-            user_data.update(user_info) 
-        
-            user_id = user_info['user_id']
-            # sop_path = user['sop'][0]['url']
-            # resume_path = user['resume'][0]['url']
-
-            # print("user_info:", user_info)
-            # print("user_sop path:", sop_path)
-
-            embedding_id = f"{user_id}"
-            metadata = user_data
-            # for k, v in metadata.items():
-            #     if v is None:
-                    # print("None type:")
-                    # print(k)
-
-            resume_text = "" 
-            if len(user_data['resume']) > 0:
-                if "url" in user_data['resume'][0]:
-                    resume_file_path = str(settings.MEDIA_ROOT )+ "/" +os.path.basename(user_data['resume'][0]['url'])
-                    resume_text = TextLoader.get_text_from_file(resume_file_path)
-            sop_text = ""
-            if len(user_data['sop']) > 0:
-                if "url"  in user_data['sop'][0]:
-                    
-            
-                    sop_file_path = str(settings.MEDIA_ROOT ) + "/" +os.path.basename(user_data['sop'][0]['url'])
-                    sop_text = TextLoader.get_text_from_file(sop_file_path)
-            
-            if user_data['department'] is not None:
-                department_name = Department.objects.get(id=user_data['department'] ).name
-                user_data['department_name']  = department_name
-            
-            if user_data['college'] is not None:
-                college_name = College.objects.get(id=user_data['college'] ).name
-                user_data['college_name']  = college_name
-
-            if user_data['campus'] is not None:
-                campus_name = Campus.objects.get(id=user_data['campus'] ).campus_name
-                user_data['campus_name'] = campus_name
-
-            if user_data['organization'] is not None:
-                organization_name = EducationalOrganizations.objects.get(id=user_data['organization'] ).name
-                user_data['organization_name'] = organization_name
-
+        self.stage = 'researcher'
+        users = User.objects.filter(userdetails__user_type__in=RESEARCH_ROLES).distinct().order_by('id')
+        self.load_related_names()
 
-            # print(flat_data["resume_0_url"])
-            # print(os.path.realpath(os.path.join(os.getcwd(), "../..", flat_data["resume_0_url"])))
-           
-            # resume_text = TextLoader.get_text_from_file(flat_data["resume_0_url"])
-            
-            # sop_text = TextLoader.get_text_from_file( flat_data["sop_0_url"])
-            # print(sop_text[:100]) 
-            # print("resume text:")
-            # print(resume_text[:100])
-                
-            # Extract funding details
-            funding_metadata = self.extract_funding_data(user_data)
-            # print("funding_metadata:", funding_metadata) 
-
-            # Initialize an empty list to store formatted strings
-            publication_strings = []
-
-            # Iterate over the data keys
-            i = 0
-            while f"publication_{i}_title" in user_data and f"publication_{i}_abstract" in user_data:
-                title = user_data[f"publication_{i}_title"]
-                abstract = user_data[f"publication_{i}_abstract"]
-                publication_strings.append(f'publication title: "{title}", publication abstract: "{abstract}"')
-                i += 1
-
-            funding_text_to_embed = ""
-            for i, desc in enumerate(funding_metadata['description']):
-                funding_text_to_embed= "Funding Details: \nTitle: " +  funding_metadata['title_of_funding'][i] + " \n Description " + desc + "\n"
+        # Profiles of each batch are loaded together, see ResearcherDataService.for_users
+        services = {}
 
-            del funding_metadata['description']
-            del funding_metadata['title_of_funding']
-
-            # Join all publication strings into one string
-            result_string = ", ".join(publication_strings)
-
-            total_text = ""
-
-            if resume_text != "":
-                total_text += "Resume: " + resume_text
-            if sop_text != "":
-                total_text += "Statement of purpose: " + sop_text
-            
-            total_text =funding_text_to_embed +  total_text + result_string
-            # print(total_text)
+        def prefetch(batch_users):
+            user_ids = [user.id for user in batch_users]
+            services.update(ResearcherDataService.for_users(user_ids, RESEARCH_ROLES))
+            self.submit_user_documents(user_ids)
 
+        # user_list = UserDataService.get_all_flat_users_data(group_name='Student')
+        def build_record(user):
+            service = services.pop(user.id, None)
+            if service is None:
+                return None
+            user_data = service.get_flat_user_data()
+            return self.build_researcher_record(user_data) if user_data['user_main'] else None
 
-            del metadata['sop']
-            del metadata['resume']
-            # filtered_metadata = self.metadata_filtering(metadata)
-
-        
-
-            vector_metadata = {
-                "user_id": metadata['user_id'],
-                "name": metadata['first_name'] + " " + metadata['last_name'],
-                "type": metadata['user_type'],
-                "college_id": "" if metadata['college'] is None else metadata['college'],
-                # "college_web_address": metadata['college_web_address'],
-                "college_name": "" if "college_name" not in  metadata else metadata['college_name'],
-                "campus_id": "" if metadata['campus'] is None else metadata['campus'],
-                "campus_name":"" if "campus_name" not in  metadata else metadata['campus_name'],
-                "organization_id": metadata['organization'],
-                "department_name":""  if "department_name" not in  metadata else metadata['department_name'],
-                "department_id": "" if metadata['department'] is None else metadata['department'], 
-                # "organization_web_address": metadata['organization_web_address'],
-                # "under_category_name": metadata['under_category_name'],
-                "organization_name": metadata['organization_name'],
-                # "country_name": metadata['country_name'],
-                # "country_code": metadata['country_code'],
-                # "state_province_name": metadata['state_province_name'],
-                "city": "" if metadata['current_city'] is None else metadata['current_city'],
-                "funding_available": "True" if len(funding_metadata['funding_id']) > 0 else "False",
-                "funding_for": "|".join(funding_metadata['funding_for']),  # 'International|International'
-                "funding_type": "|".join(funding_metadata['funding_type']),  # 'RA|TA'
-                "funding_opportunity_for": "|".join(funding_metadata['funding_opportunity_for']),# 'International|International'
-              
-            }
-            print("vector_metadata:", vector_metadata)
-            
-            collection.add(
-                documents=[total_text],
-                metadatas=[vector_metadata],
-                ids=[embedding_id]
-            )
+        # Build into a shadow collection; queries keep using the active version
+        self.build_collection("researcher_user_documents", users, build_record, prefetch=prefetch)
         print("researcher injesting done")
         
        
     def ingest_student_user_documents(self):
             # users = UserDetails.objects.all()
-            
-            client = chromadb.PersistentClient(path=self.output_path)
-            try:
-                client.delete_collection(name="student_user_documents")
-            except Exception as e:
-                print("Collection doesn't exist or failed to delete:", e)
-            
-            collection = client.create_collection(name="student_user_documents", metadata={"hnsw:space": "cosine"})
-
-            user_list = UserDataService.get_all_flat_users_data(group_name='Student')
-        
-    
-            # print("user_list:", user_list)
-
-            for user in user_list:
-                user_info =  user['user_main'][0]
-                user_details = user['user_details']
-                del user['user_details']
-                del user['user_main']
-                user.update(user_details)
-                user.update(user_info)
-             
-                user_id = user_info['user_id']
-                # sop_path = user['sop'][0]['url']
-                # resume_path = user['resume'][0]['url']
-
-                print("user_info:", user_info)
-                # print("user_sop path:", sop_path)
-
-                embedding_id = f"{user_id}"
-                metadata = user
-                # for k, v in metadata.items():
-                #     if v is None:
-                #         print("None type:")
-                #         print(k)
-
-                resume_text = "" 
-                if len(user['resume']) > 0:
-                    if "url" in user['resume'][0]:
-                        resume_file_path = str(settings.MEDIA_ROOT )+ "/" +os.path.basename(user['resume'][0]['url'])
-                        resume_text = TextLoader.get_text_from_file(resume_file_path)
-                sop_text = ""
-                if len(user['sop']) > 0:
-                    if "url"  in user['sop'][0]:
-                        
-                
-                        sop_file_path = str(settings.MEDIA_ROOT ) + "/" +os.path.basename(user['sop'][0]['url'])
-                        sop_text = TextLoader.get_text_from_file(sop_file_path)
-                
-
-                # print(flat_data["resume_0_url"])
-                # print(os.path.realpath(os.path.join(os.getcwd(), "../..", flat_data["resume_0_url"])))
-            
-                # resume_text = TextLoader.get_text_from_file(flat_data["resume_0_url"])
-                
-                # sop_text = TextLoader.get_text_from_file( flat_data["sop_0_url"])
-                print(sop_text[:100]) 
-                print("resume text:")
-                print(resume_text[:100])
-
-                # Initialize an empty list to store formatted strings
-                publication_strings = []
-
-                # Iterate over the data keys
-                i = 0
-                while f"publication_{i}_title" in user and f"publication_{i}_abstract" in user:
-                    title = user[f"publication_{i}_title"]
-                    abstract = user[f"publication_{i}_abstract"]
-                    publication_strings.append(f'publication title: "{title}", publication abstract: "{abstract}"')
-                    i += 1
-    
-
-                # Join all publication strings into one string
-                result_string = ", ".join(publication_strings)
-
-                total_text = ""
+            self.stage = 'student'
+            users = User.objects.filter(groups__name='Student').order_by('id')
 
-                if resume_text != "":
-                    total_text += "Resume: " + resume_text
-                if sop_text != "":
-                    total_text += "Statement of purpose: " + sop_text
-                
-                total_text = total_text + result_string
-                print(total_text)
-
-
-                del metadata['sop']
-                del metadata['resume']
-                filtered_metadata = self.metadata_filtering(metadata)
+            def prefetch(batch_users):
+                self.submit_user_documents([user.id for user in batch_users])
 
-                print("metadata:")
-                print(filtered_metadata)
+            def build_record(user):
+                user_data = UserDataService(user.id).get_flat_user_data()
+                return self.build_student_record(user_data) if user_data['user_main'] else None
 
-                
-                collection.add(
-                    documents=[total_text],
-                    metadatas=[filtered_metadata],
-                    ids=[embedding_id]
-                )
+            # Build into a shadow collection; queries keep using the active version
+            self.build_collection("student_user_documents", users, build_record, prefetch=prefetch)
             print("student ingesting done")
 
     # def ingest_faculty_documents(self):
     #     faculty_members = Funding.objects.all()
         
-    #     client = chromadb.PersistentClient(path=self.output_path)
+    #     client = ChromaDBRegistry.get_client(self.output_path)
     #     try:
     #         client.delete_collection(name="faculty_documents")
     #     except Exception as e:
@@ -351,18 +166,14 @@ class DjangoToChromaDBIngest:
     def ingest_college_documents(self):
         colleges = College.objects.all()
         
-        client = chromadb.PersistentClient(path=self.output_path)
-        try:
-            client.delete_collection(name="college_documents")
-        except Exception as e:
-            print("Collection doesn't exist or failed to delete:", e)
-        
-        collection = client.create_collection(name="college_documents", metadata={"hnsw:space": "cosine"})
+        # Build into a shadow collection; queries keep using the active version
+        collection, _, _ = self.begin_build("college_documents")
         
         # college_flat_data = CollegeDataService.get_all_flat_colleges_data()
         # print("college flat data: ")
         # print(college_flat_data)
         
+        records = []
         for college in colleges:
             college_id = college.id
             print("college_id: ", college_id)
@@ -404,12 +215,9 @@ class DjangoToChromaDBIngest:
             }
             
             
-            collection.add(
-                documents = [metadata['statement']],
-                metadatas = [vector_metadata],
-                ids = [embedding_id]
-            )
+            records.append((embedding_id, metadata['statement'], vector_metadata))
 
+        self.finish_build("college_documents", collection, self.write_batches(collection, records))
         print("college data ingest done")
 
         return 0
@@ -417,18 +225,14 @@ class DjangoToChromaDBIngest:
     def ingest_dept_documents(self):
             depts = Department.objects.all()
             
-            client = chromadb.PersistentClient(path=self.output_path)
-            try:
-                client.delete_collection(name="dept_documents")
-            except Exception as e:
-                print("Collection doesn't exist or failed to delete:", e)
-            
-            collection = client.create_collection(name="dept_documents", metadata={"hnsw:space": "cosine"})
+            # Build into a shadow collection; queries keep using the active version
+            collection, _, _ = self.begin_build("dept_documents")
             
             # college_flat_data = CollegeDataService.get_all_flat_colleges_data()
             # print("college flat data: ")
             # print(college_flat_data)
             
+            records = []
             for dept in depts:
                 dept_id = dept.id
                 print("dept_id: ", dept_id)
@@ -471,97 +275,509 @@ class DjangoToChromaDBIngest:
                 }
                 
                 
-                collection.add(
-                    documents = [metadata['statement']],
-                    metadatas = [vector_metadata],
-                    ids = [embedding_id]
-                )
+                records.append((embedding_id, metadata['statement'], vector_metadata))
 
+            self.finish_build("dept_documents", collection, self.write_batches(collection, records))
             print("dept data ingest done")
 
             return 0
     
     def ingest_program_documents(self):
-        programs = Program.objects.all()
-        
-        client = chromadb.PersistentClient(path=self.output_path)
+        self.stage = 'program'
+        programs = Program.objects.all().order_by('id')
+
+        def prefetch(batch_programs):
+            # Extract the criteria of the whole batch concurrently while the previous batch is embedded
+            criteria_extraction = CriteriaExtractionService.get_instance()
+            for program in batch_programs:
+                if program.eligibility_criteria:
+                    criteria_extraction.submit(self.extract_clean_text(program.eligibility_criteria))
+
+        # Build into a shadow collection; queries keep using the active version
+        self.build_collection("program_documents", programs, self.build_program_record, prefetch=prefetch)
+        ProgramLexicalIndex.rebuild()
+        print("program data ingest done")
+
+        return 0
+
+
+    @staticmethod
+    def media_file_path(url):
+        return str(settings.MEDIA_ROOT) + "/" + os.path.basename(url)
+
+    def submit_user_documents(self, user_ids):
+        """Start extracting the latest resume and SOP of `user_ids` in the extraction pool."""
+        if self.text_extraction is None:
+            return
+        documents = (
+            UserDocument.objects.filter(user_id__in=user_ids, use__in=[UserDocument.RESUME, UserDocument.SOP])
+            .select_related('document')
+            .order_by('created_at')
+        )
+        # Same choice as the data services: the latest document of each use
+        latest = {(user_document.user_id, user_document.use): user_document for user_document in documents}
+        for user_document in latest.values():
+            if user_document.document.file_name:
+                self.text_extraction.submit(self.media_file_path(default_storage.url(user_document.document.file_name_system)))
+
+    def document_text(self, file_path):
+        """
+        Text of a resume or SOP, or "" if it cannot be extracted.
+
+        During a full build the text usually comes from the extraction pool,
+        which started on it while the previous batch was embedded. A file
+        that fails or times out is skipped and counted, not the whole record.
+        """
         try:
-            client.delete_collection(name="program_documents")
+            if self.text_extraction is not None:
+                text = self.text_extraction.result(file_path)
+            else:
+                text = TextLoader.get_text_from_file(file_path) or ""
         except Exception as e:
-            print("Collection doesn't exist or failed to delete:", e)
-        
-        collection = client.create_collection(name="program_documents", metadata={"hnsw:space": "cosine"})
-        
-        for program in programs:
-            program_id = program.id
-            print("program_id:", program_id)
-            
-            # Initialize ProgramDataService to get flattened program data
-            program_data_service = ProgramDataService(program.id)
-            flat_data = program_data_service.get_flat_program_data()
-            print(flat_data)
-            
-            # Extract relevant metadata for the program
-            metadata = self.extract_metadata_program(flat_data)
+            print("Failed to extract text, skipping:", file_path, e)
+            self.job.add(self.stage, extraction_errors=1)
+            return ""
+        self.job.add(self.stage, texts_extracted=1)
+        return text
 
-            # Extract funding details
-            funding_metadata = self.extract_funding_data(flat_data)
-            print("extracted metadata:", metadata)
+    def load_related_names(self):
+        """Load the id -> name maps of departments, colleges, campuses and organizations, one query each."""
+        self.related_names = {
+            kind: dict(model.objects.values_list('id', field))
+            for kind, (model, field) in RELATED_NAME_FIELDS.items()
+        }
 
-            # Create unique embedding ID for each program
-            embedding_id = f"program_{metadata['program_id']}"
+    def related_name(self, kind, object_id):
+        names = self.related_names.get(kind, {})
+        if object_id in names:
+            return names[object_id]
+        # Not preloaded, or created after the maps were loaded
+        model, field = RELATED_NAME_FIELDS[kind]
+        return getattr(model.objects.get(id=object_id), field)
 
-            # construct text
-            program_text_to_embed = ""
-            if metadata['program_description'] != "":
-                program_text_to_embed ="Program Description: \n" +  metadata['program_description']
-            for i, desc in enumerate(funding_metadata['description']):
-                program_text_to_embed+= "Funding Details: \nTitle: " +  funding_metadata['title_of_funding'][i] + " \n Description " + desc + "\n"
+    def build_researcher_record(self, user_data):
+        """Build the (embedding id, text, metadata) record of one flat researcher."""
+        user_info =  user_data['user_main'][0]
+        user_details = user_data['user_details']
+        del user_data['user_details']
+        del user_data['user_main']
+        user_data.update(user_details)
+        user_data.update(user_info) 
+
+        user_id = user_info['user_id']
+        # sop_path = user['sop'][0]['url']
+        # resume_path = user['resume'][0]['url']
+
+        # print("user_info:", user_info)
+        # print("user_sop path:", sop_path)
+
+        embedding_id = f"{user_id}"
+        metadata = user_data
+        # for k, v in metadata.items():
+        #     if v is None:
+                # print("None type:")
+                # print(k)
+
+        resume_text = "" 
+        if len(user_data['resume']) > 0:
+            if "url" in user_data['resume'][0]:
+                resume_text = self.document_text(self.media_file_path(user_data['resume'][0]['url']))
+        sop_text = ""
+        if len(user_data['sop']) > 0:
+            if "url"  in user_data['sop'][0]:
+                sop_text = self.document_text(self.media_file_path(user_data['sop'][0]['url']))
+
+        if user_data['department'] is not None:
+            user_data['department_name'] = self.related_name('department', user_data['department'])
+
+        if user_data['college'] is not None:
+            user_data['college_name'] = self.related_name('college', user_data['college'])
+
+        if user_data['campus'] is not None:
+            user_data['campus_name'] = self.related_name('campus', user_data['campus'])
+
+        if user_data['organization'] is not None:
+            user_data['organization_name'] = self.related_name('organization', user_data['organization'])
+
+
+        # print(flat_data["resume_0_url"])
+        # print(os.path.realpath(os.path.join(os.getcwd(), "../..", flat_data["resume_0_url"])))
+
+        # resume_text = TextLoader.get_text_from_file(flat_data["resume_0_url"])
+
+        # sop_text = TextLoader.get_text_from_file( flat_data["sop_0_url"])
+        # print(sop_text[:100]) 
+        # print("resume text:")
+        # print(resume_text[:100])
+
+        # Extract funding details
+        funding_metadata = self.extract_funding_data(user_data)
+        # print("funding_metadata:", funding_metadata) 
+
+        # Initialize an empty list to store formatted strings
+        publication_strings = []
+
+        # Iterate over the data keys
+        i = 0
+        while f"publication_{i}_title" in user_data and f"publication_{i}_abstract" in user_data:
+            title = user_data[f"publication_{i}_title"]
+            abstract = user_data[f"publication_{i}_abstract"]
+            publication_strings.append(f'publication title: "{title}", publication abstract: "{abstract}"')
+            i += 1
+
+        funding_text_to_embed = ""
+        for i, desc in enumerate(funding_metadata['description']):
+            funding_text_to_embed= "Funding Details: \nTitle: " +  funding_metadata['title_of_funding'][i] + " \n Description " + desc + "\n"
+
+        del funding_metadata['description']
+        del funding_metadata['title_of_funding']
+
+        # Join all publication strings into one string
+        result_string = ", ".join(publication_strings)
+
+        total_text = ""
+
+        if resume_text != "":
+            total_text += "Resume: " + resume_text
+        if sop_text != "":
+            total_text += "Statement of purpose: " + sop_text
+
+        total_text =funding_text_to_embed +  total_text + result_string
+        # print(total_text)
+
+
+        del metadata['sop']
+        del metadata['resume']
+        # filtered_metadata = self.metadata_filtering(metadata)
+
+
+
+        vector_metadata = {
+            "user_id": metadata['user_id'],
+            "name": metadata['first_name'] + " " + metadata['last_name'],
+            "type": metadata['user_type'],
+            "college_id": "" if metadata['college'] is None else metadata['college'],
+            # "college_web_address": metadata['college_web_address'],
+            "college_name": "" if "college_name" not in  metadata else metadata['college_name'],
+            "campus_id": "" if metadata['campus'] is None else metadata['campus'],
+            "campus_name":"" if "campus_name" not in  metadata else metadata['campus_name'],
+            "organization_id": metadata['organization'],
+            "department_name":""  if "department_name" not in  metadata else metadata['department_name'],
+            "department_id": "" if metadata['department'] is None else metadata['department'], 
+            # "organization_web_address": metadata['organization_web_address'],
+            # "under_category_name": metadata['under_category_name'],
+            "organization_name": metadata['organization_name'],
+            # "country_name": metadata['country_name'],
+            # "country_code": metadata['country_code'],
+            # "state_province_name": metadata['state_province_name'],
+            "city": "" if metadata['current_city'] is None else metadata['current_city'],
+            "funding_available": "True" if len(funding_metadata['funding_id']) > 0 else "False",
+            "funding_for": "|".join(funding_metadata['funding_for']),  # 'International|International'
+            "funding_type": "|".join(funding_metadata['funding_type']),  # 'RA|TA'
+            "funding_opportunity_for": "|".join(funding_metadata['funding_opportunity_for']),# 'International|International'
 
-            del funding_metadata['description']
-            del funding_metadata['title_of_funding']
-            vector_metadata = {
-                "program_id": metadata['program_id'],
-                "program_title": metadata['program_title'],
-                # "program_description": metadata['program_description'],
-                "funding_available": "True" if len(funding_metadata['funding_id']) > 0 else "False",
-                "funding_for": "|".join(funding_metadata['funding_for']),  # 'International|International'
-                "funding_type": "|".join(funding_metadata['funding_type']),  # 'RA|TA'
-                "funding_opportunity_for": "|".join(funding_metadata['funding_opportunity_for']),# 'International|International'
-                "IELTS": metadata['IELTS'],
-                "TOEFL": metadata['TOEFL'], 
-                "GRE": metadata['GRE'],
-                "DUOLINGO": metadata['DUOLINGO'],
-                "CGPA": metadata['CGPA'],
-                "application_process": metadata['application_process'],
-                "application_fee": metadata['application_fee'],
-                "application_end_date": metadata['application_end_date'] ,
-                "department_name": metadata['department_name'],
-                "college_name": metadata['college_name'],
-                "campus_name": metadata['campus_name'],
-                "organization_name": metadata['organization_name'],
-                "country_code": metadata['country_code'],
-                "country_name": metadata['country_name'],
-                "state_province_name": metadata['state_province_name'],
-                "city": metadata['city'],
-            }
+        }
+        print("vector_metadata:", vector_metadata)
 
-            # vector_metadata.update(funding_metadata)
+        return embedding_id, total_text, vector_metadata
 
-            print("Metadata: ", vector_metadata)
-            # print("Text: ", program_text_to_embed)
-            
-            # Insert embedding into ChromaDB
-            collection.add( 
-                documents=[program_text_to_embed],
-                metadatas=[vector_metadata],
-                ids=[embedding_id]
-            )
+    def build_student_record(self, user):
+        """Build the (embedding id, text, metadata) record of one flat student."""
+        user_info =  user['user_main'][0]
+        user_details = user['user_details']
+        del user['user_details']
+        del user['user_main']
+        user.update(user_details)
+        user.update(user_info)
 
-        print("program data ingest done")
+        user_id = user_info['user_id']
+        # sop_path = user['sop'][0]['url']
+        # resume_path = user['resume'][0]['url']
+
+        print("user_info:", user_info)
+        # print("user_sop path:", sop_path)
+
+        embedding_id = f"{user_id}"
+        metadata = user
+        # for k, v in metadata.items():
+        #     if v is None:
+        #         print("None type:")
+        #         print(k)
+
+        resume_text = "" 
+        if len(user['resume']) > 0:
+            if "url" in user['resume'][0]:
+                resume_text = self.document_text(self.media_file_path(user['resume'][0]['url']))
+        sop_text = ""
+        if len(user['sop']) > 0:
+            if "url"  in user['sop'][0]:
+                sop_text = self.document_text(self.media_file_path(user['sop'][0]['url']))
+
+
+        # print(flat_data["resume_0_url"])
+        # print(os.path.realpath(os.path.join(os.getcwd(), "../..", flat_data["resume_0_url"])))
+
+        # resume_text = TextLoader.get_text_from_file(flat_data["resume_0_url"])
+
+        # sop_text = TextLoader.get_text_from_file( flat_data["sop_0_url"])
+        print(sop_text[:100]) 
+        print("resume text:")
+        print(resume_text[:100])
+
+        # Initialize an empty list to store formatted strings
+        publication_strings = []
+
+        # Iterate over the data keys
+        i = 0
+        while f"publication_{i}_title" in user and f"publication_{i}_abstract" in user:
+            title = user[f"publication_{i}_title"]
+            abstract = user[f"publication_{i}_abstract"]
+            publication_strings.append(f'publication title: "{title}", publication abstract: "{abstract}"')
+            i += 1
+
+
+        # Join all publication strings into one string
+        result_string = ", ".join(publication_strings)
+
+        total_text = ""
+
+        if resume_text != "":
+            total_text += "Resume: " + resume_text
+        if sop_text != "":
+            total_text += "Statement of purpose: " + sop_text
+
+        total_text = total_text + result_string
+        print(total_text)
+
+
+        del metadata['sop']
+        del metadata['resume']
+        filtered_metadata = self.metadata_filtering(metadata)
+
+        print("metadata:")
+        print(filtered_metadata)
+
+        return embedding_id, total_text, filtered_metadata
+
+    def build_program_record(self, program):
+        """Build the (embedding id, text, metadata) record of one program."""
+        program_id = program.id
+        print("program_id:", program_id)
+
+        # Initialize ProgramDataService to get flattened program data
+        program_data_service = ProgramDataService(program.id)
+        flat_data = program_data_service.get_flat_program_data()
+        print(flat_data)
+
+        # Extract relevant metadata for the program
+        metadata = self.extract_metadata_program(flat_data)
+
+        # Extract funding details
+        funding_metadata = self.extract_funding_data(flat_data)
+        print("extracted metadata:", metadata)
+
+        # Create unique embedding ID for each program
+        embedding_id = f"program_{metadata['program_id']}"
+
+        # construct text
+        program_text_to_embed = ""
+        if metadata['program_description'] != "":
+            program_text_to_embed ="Program Description: \n" +  metadata['program_description']
+        for i, desc in enumerate(funding_metadata['description']):
+            program_text_to_embed+= "Funding Details: \nTitle: " +  funding_metadata['title_of_funding'][i] + " \n Description " + desc + "\n"
+
+        del funding_metadata['description']
+        del funding_metadata['title_of_funding']
+        vector_metadata = {
+            "program_id": metadata['program_id'],
+            "program_title": metadata['program_title'],
+            # "program_description": metadata['program_description'],
+            "funding_available": "True" if len(funding_metadata['funding_id']) > 0 else "False",
+            "funding_for": "|".join(funding_metadata['funding_for']),  # 'International|International'
+            "funding_type": "|".join(funding_metadata['funding_type']),  # 'RA|TA'
+            "funding_opportunity_for": "|".join(funding_metadata['funding_opportunity_for']),# 'International|International'
+            "IELTS": metadata['IELTS'],
+            "TOEFL": metadata['TOEFL'], 
+            "GRE": metadata['GRE'],
+            "DUOLINGO": metadata['DUOLINGO'],
+            "CGPA": metadata['CGPA'],
+            "application_process": metadata['application_process'],
+            "application_fee": metadata['application_fee'],
+            "application_end_date": metadata['application_end_date'] ,
+            "department_name": metadata['department_name'],
+            "college_name": metadata['college_name'],
+            "campus_name": metadata['campus_name'],
+            "organization_name": metadata['organization_name'],
+            "country_code": metadata['country_code'],
+            "country_name": metadata['country_name'],
+            "state_province_name": metadata['state_province_name'],
+            "city": metadata['city'],
+        }
 
-        return 0
+        # vector_metadata.update(funding_metadata)
 
+        # Typed values with sentinels for missing requirements, see ProgramMetadataSchema
+        vector_metadata = ProgramMetadataSchema.normalize(vector_metadata)
+
+        print("Metadata: ", vector_metadata)
+        # print("Text: ", program_text_to_embed)
+
+        return embedding_id, program_text_to_embed, vector_metadata
+
+    def begin_build(self, alias):
+        """
+        Return (shadow collection, last processed id, vectors written) for a build of `alias`.
+
+        A resumed ingestion job continues in the shadow collection recorded in
+        its checkpoint; otherwise an empty, versioned collection is created.
+        """
+        client = ChromaDBRegistry.get_client(self.output_path)
+        CollectionVersions.mark_build_started(alias)
+        collection_name, last_id, written = self.job.resume_point(self.stage)
+        if collection_name:
+            try:
+                collection = client.get_collection(
+                    name=collection_name,
+                    embedding_function=SharedEmbeddingFunction(self.embedding_function)
+                )
+                return collection, last_id, written
+            except Exception as e:
+                print("Checkpointed collection is gone, starting over:", collection_name, e)
+
+        collection = client.create_collection(
+            name=CollectionVersions.versioned_name(alias),
+            metadata=collection_metadata(alias),
+            embedding_function=SharedEmbeddingFunction(self.embedding_function)
+        )
+        return collection, 0, 0
+
+    def build_collection(self, alias, queryset, build_record, prefetch=None):
+        """
+        Build a new version of `alias` from `queryset` ordered by id.
+
+        Rows are embedded batch_size at a time and a checkpoint is saved after
+        every batch, so a failed ingestion job resumes after the last written
+        batch instead of starting over. `prefetch`, if given, is called with
+        each batch of rows one batch ahead of building its records, to load
+        related data for the whole batch at once and start extracting its
+        files while the previous batch is embedded. Rows whose record cannot
+        be built are skipped and counted as errors.
+        """
+        client = ChromaDBRegistry.get_client(self.output_path)
+        collection, last_id, written = self.begin_build(alias)
+        self.text_extraction = TextExtractionPool.get_instance()
+        try:
+            # Batch N + 1 is prefetched (and its files extracted in the pool) before batch N is built and embedded
+            rows, ready = [], []
+            for obj in queryset.filter(id__gt=last_id).iterator():
+                rows.append(obj)
+                if len(rows) >= self.batch_size:
+                    if prefetch is not None:
+                        prefetch(rows)
+                    if ready:
+                        written += self.build_batch(alias, collection, ready, build_record, written)
+                    ready, rows = rows, []
+            if rows and prefetch is not None:
+                prefetch(rows)
+            for batch_rows in (ready, rows):
+                if batch_rows:
+                    written += self.build_batch(alias, collection, batch_rows, build_record, written)
+
+            counts = self.job.counts(self.stage)
+            if counts['rows_fetched'] and counts['errors'] > counts['rows_fetched'] * settings.VECTOR_INGEST_MAX_ERROR_RATE:
+                raise ValueError(f"{alias}: {counts['errors']} of {counts['rows_fetched']} rows failed")
+        except Exception:
+            CollectionVersions.mark_build_finished(alias)
+            if not self.job.resumable:
+                client.delete_collection(name=collection.name)
+            raise
+        finally:
+            self.text_extraction = None
+
+        return self.finish_build(alias, collection, written)
+
+    def build_batch(self, alias, collection, rows, build_record, written):
+        batch = []
+        for obj in rows:
+            try:
+                record = build_record(obj)
+            except Exception as e:
+                print(f"{alias}: skipping {obj.id}:", e)
+                self.job.add(self.stage, errors=1)
+                record = None
+            if record is not None:
+                batch.append(record)
+        return self.flush_checkpoint(collection, batch, len(rows), rows[-1].id, written)
+
+    def flush_checkpoint(self, collection, batch, rows, last_id, written):
+        self.job.add(self.stage, rows_fetched=rows)
+        batch_written = self.flush_batch(collection, batch) if batch else 0
+        self.job.add(self.stage, vectors_written=batch_written)
+        self.job.save_checkpoint(self.stage, collection.name, last_id, written + batch_written)
+        return batch_written
+
+    def finish_build(self, alias, collection, written):
+        """
+        Validate the shadow collection and flip `alias` to it.
+
+        A build that does not validate is dropped and the alias keeps pointing
+        at the previous version.
+        """
+        client = ChromaDBRegistry.get_client(self.output_path)
+        try:
+            CollectionVersions.validate(collection, written)
+        except Exception:
+            client.delete_collection(name=collection.name)
+            CollectionVersions.mark_build_finished(alias)
+            raise
+
+        CollectionVersions.flip(alias, collection.name)
+        CollectionVersions.garbage_collect(client, alias)
+        ChromaDBRegistry.invalidate_path(self.output_path)
+        return written
+
+    def write_batches(self, collection, records):
+        """
+        Embed and upsert `records` batch_size at a time.
+
+        Every batch costs one forward pass of the embedding model and one
+        write to ChromaDB instead of one of each per document.
+        """
+        written = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                written += self.flush_batch(collection, batch)
+                batch = []
+        if batch:
+            written += self.flush_batch(collection, batch)
+        return written
+
+    def embed_documents(self, documents):
+        # Texts embedded by an earlier build are read back instead of re-encoded
+        if self.embedding_cache is None:
+            return self.embedding_function.encode(documents, batch_size=self.batch_size)
+        return self.embedding_cache.encode(self.embedding_function, documents, batch_size=self.batch_size)
+
+    def flush_batch(self, collection, batch):
+        if is_chunked(collection):
+            # One vector per passage plus a profile vector; drop passages of an older, longer version first
+            delete_parents(collection, [embedding_id for embedding_id, _, _ in batch])
+            ids, embeddings, documents, metadatas = expand_records(batch, self.embed_documents)
+        else:
+            ids = [embedding_id for embedding_id, _, _ in batch]
+            documents = [text for _, text, _ in batch]
+            metadatas = [metadata for _, _, metadata in batch]
+            embeddings = self.embed_documents(documents)
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+        print(f"{collection.name}: wrote {len(ids)} vectors")
+        return len(ids)
 
     def metadata_filtering(self, metadata):
         print(metadata)
@@ -743,134 +959,11 @@ class DjangoToChromaDBIngest:
         return text
     
     def extract_criteria(self, eligibility_text):
-        # Initialize the result dictionary with None values
-        criteria = {
-            "IELTS": "",
-            "TOEFL": "",
-            "DUOLINGO": "",
-            "GRE": "",
-            "CGPA": ""
-        }
-        
-        # Patterns to extract each criterion
-        patterns = {
-            "IELTS": r"IELTS\s+(\d+(\.\d+)?)",
-            "TOEFL": r"TOEFL\s+(\d+)",
-            "DUOLINGO": r"DUOLINGO\s+(\d+)",
-            "GRE": r"GRE\s+(\d+)",
-            "CGPA": r"CGPA\s+(\d+(\.\d+)?)"
-        }
-        
-        # Search each pattern in the eligibility text and update criteria if found
-        for key, pattern in patterns.items():
-            match = re.search(pattern, eligibility_text, re.IGNORECASE)
-            if match:
-                criteria[key] = float(match.group(1))  # Extracted value
-        
-        return criteria
-    
-    def extract_criteria_with_llm(self, eligibility_text):
-
-        client = OpenAI(api_key= os.getenv("OPENAI_API_KEY")) 
-        # Initialize the result dictionary with None values
-        criteria = {
-            "IELTS": "",
-            "TOEFL": "",
-            "DUOLINGO": "",
-            "GRE": "",
-            "CGPA": ""
-        }
-        
-        system_message = """
-        You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score. If a score is not found, keep it None
-        """
-
+        return regex_criteria(eligibility_text)
 
-
-        custom_functions = [{
-            "type": "function",
-            "function": {
-            'name': 'extract_test_scores',
-            'strict': True,
-            'description':
-            'You are an expert data analyst. Based on an open-ended question, you will identify the relevant factors to investigate and generate fields of a dataset with descriptions and explanations for each field.',
-            'parameters': {
-                'type': 'object',
-                'properties': {
-                    'fields': {
-                        'type': 'array',
-                        'description': 'You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score',
-                        'items': {
-                            'type': 'object',
-
-                            "properties": {
-                                "IELTS": {
-                                        "type": "number",
-                                        "description": "English proficiency test often required by non-native speakers"
-                                    },
-                                    "TOEFL": {
-                                        "type": "number",
-                                        "description": "For non-native English speakers; assesses English proficiency"
-                                    },
-                                    "SAT": {
-                                        "type": "number",
-                                        "description": "Scholastic Assessment Test"
-                                    },
-                                "GRE": {
-                                        "type": "number",
-                                        "description": "Graduate Record Examination"
-                                    },
-                                    "GMAT": {
-                                        "type": "number",
-                                        "description": "Graduate Management Admission Test"
-                                    },
-                                    "MAT": {
-                                        "type": "number",
-                                        "description": "Miller Analogies Test"
-                                    },
-                                "CGPA": {
-                                        "type": "number",
-                                        "description": "Minimum CGPA required for the program "
-                                    },
-                                "DUOLINGO": {
-                                    "type": "number",
-                                    "description": "English proficiency test"
-                                },
-                                },
-                            "required": ["IELTS", "TOEFL", "SAT", "GRE", "GMAT", "MAT", "CGPA", "DUOLINGO"],
-                            "additionalProperties": False,
-                        },
-                    },
-                },
-                "required": ["fields"],
-                "additionalProperties": False,
-            }}
-        }] 
-
-        response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": eligibility_text}
-        ],
-        tools=custom_functions,
-        tool_choice={"type": "function", "function": {"name": "extract_test_scores"}})
-
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-
-        extracted_json = {}
-        for tool_call in tool_calls:
-            # print(f"Function: {tool_call.function.name}")
-            # print(f"Params:{tool_call.function.arguments}")
-
-            arguments = json.loads(tool_call.function.arguments)
-            # print(arguments['fields'][0])
-            # print(type(arguments['fields']))
-            extracted_json = arguments['fields'][0]
-        
-        return extracted_json
+    def extract_criteria_with_llm(self, eligibility_text):
+        # Regex first, then the criteria cache, then the LLM; see CriteriaExtractionService
+        return CriteriaExtractionService.get_instance().extract(eligibility_text)
 
     def extract_funding_data(self, data):
             # Initialize empty lists for each funding attribute
@@ -945,13 +1038,12 @@ class DjangoToChromaDBIngest:
             metadata['application_process'] = flat_data.get(application_process_key)
 
             application_fee_key = safe_get_key(f"program_{program_id}_", "_application_fee")
-            metadata['application_fee'] = float(flat_data.get(application_fee_key))
+            metadata['application_fee'] = ProgramMetadataSchema.to_number(flat_data.get(application_fee_key))
 
             application_end_date_key = safe_get_key(f"program_{program_id}_", "_application_end_date")
             date_string = flat_data.get(application_end_date_key)
             # convert in timestamp
-            timestamp = int(time.mktime(datetime.strptime(date_string, "%Y-%m-%d").timetuple()))
-            metadata['application_end_date'] =  timestamp
+            metadata['application_end_date'] = ProgramMetadataSchema.to_timestamp(date_string)
 
        
             
@@ -1011,6 +1103,18 @@ class DjangoToChromaDBIngest:
     
 
 
+def run_full_ingest(embedding_function=None):
+    """Rebuild the researcher, student and program collections with one shared model."""
+    embedding_function = embedding_function or get_embedding_service()
+    researcher_user_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=VECTOR_STORES['researcher']['path'])
+    student_user_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=VECTOR_STORES['student']['path'])
+    program_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=VECTOR_STORES['program']['path'])
+
+    researcher_user_ingestor.ingest_researcher_user_documents()
+    student_user_ingestor.ingest_student_user_documents()
+    program_ingestor.ingest_program_documents()
+
+
 # if __name__ == '__main__':
 #     model_name = "mixedbread-ai/mxbai-embed-large-v1"
 #     output_path = "chromadb_data/user_details_mxbai_embed_cosine"
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+from chromadb.errors import InvalidCollectionException
+from django.conf import settings
+
+from .embedding_service import SharedEmbeddingFunction
+from .collection_versions import CollectionVersions
+from .vector_store import VECTOR_STORE_CLIENTS
+
+
+# Persistent stores used by the recommendation views and the ingestor.
+# Paths are relative to BASE_DIR so the HTTP views, the ingestor and the
+# management commands all resolve to the same on-disk store.
+VECTOR_STORES = {
+    'researcher': {
+        'path': 'chromadb_data/researcher_users_details_mxbai_embed_cosine',
+        'collection': 'researcher_user_documents',
+    },
+    'student': {
+        'path': 'chromadb_data/student_users_details_mxbai_embed_cosine',
+        'collection': 'student_user_documents',
+    },
+    'program': {
+        'path': 'chromadb_data/program_details_mxbai_embed_cosine',
+        'collection': 'program_documents',
+    },
+}
+
+
+def is_missing_collection(error):
+    """True if `error` means the collection behind a cached handle no longer exists."""
+    # Older ChromaDB releases and the NumPy backend report it as a ValueError
+    return isinstance(error, InvalidCollectionException) or (
+        isinstance(error, ValueError) and 'does not exist' in str(error)
+    )
+
+
+def collection_metadata(alias):
+    """Metadata of a new collection of `alias` (or one of its versions): cosine space, its HNSW parameters and quantization."""
+    base_alias = alias.split('__')[0]
+    store = next((store for store, config in VECTOR_STORES.items() if config['collection'] == base_alias), None)
+    params = settings.VECTOR_HNSW_PARAMS.get(store, {})
+    metadata = {"hnsw:space": "cosine", **{f"hnsw:{name}": value for name, value in params.items()}}
+    # Only the NumPy backend stores quantized codes; ChromaDB's HNSW index is float32
+    if (settings.VECTOR_QUANTIZATION != 'none' and store in settings.VECTOR_QUANTIZED_STORES
+            and settings.VECTOR_STORE_BACKENDS.get(store) == 'numpy'):
+        metadata["numpy:quantization"] = settings.VECTOR_QUANTIZATION
+    return metadata
+
+
+class ChromaDBRegistry:
+    """
+    Process-wide registry of vector store clients and collection handles.
+
+    Each persistent store is opened once per worker process with the backend
+    VECTOR_STORE_BACKENDS selects for it (ChromaDB by default, see
+    `vector_store`), and the collection handles are shared between requests,
+    so the SQLite connection and the index are loaded once instead of on
+    every recommendation query. Each store
+    is read through its blue/green alias (see `CollectionVersions`); handles
+    are dropped with `invalidate` after a re-ingest, and `run` transparently
+    re-opens a collection that was replaced by another process.
+    """
+    _lock = threading.RLock()
+    _clients = {}
+    _collections = {}
+    _checked_at = {}
+    _generations = {}
+
+    @staticmethod
+    def resolve_path(path):
+        if not os.path.isabs(path):
+            path = os.path.join(settings.BASE_DIR, path)
+        return os.path.normpath(path)
+
+    @classmethod
+    def backend(cls, path):
+        """Return the backend name of the store living under `path`."""
+        for store, config in VECTOR_STORES.items():
+            if cls.resolve_path(config['path']) == path:
+                return settings.VECTOR_STORE_BACKENDS.get(store, 'chroma')
+        return 'chroma'
+
+    @classmethod
+    def get_client(cls, path):
+        path = cls.resolve_path(path)
+        client = cls._clients.get(path)
+        if client is None:
+            with cls._lock:
+                client = cls._clients.get(path)
+                if client is None:
+                    os.makedirs(path, exist_ok=True)
+                    client = VECTOR_STORE_CLIENTS[cls.backend(path)](path)
+                    cls._clients[path] = client
+        return client
+
+    @classmethod
+    def get_store_client(cls, store):
+        return cls.get_client(VECTOR_STORES[store]['path'])
+
+    @classmethod
+    def get_collection(cls, store, refresh=False):
+        """
+        Return the shared handle of the collection `store`'s alias points at.
+
+        The alias is re-read at most every VECTOR_ALIAS_REFRESH_SECONDS, so a
+        blue/green flip done by another process is picked up shortly after.
+        """
+        now = time.monotonic()
+        collection = cls._collections.get(store)
+        if (collection is not None and not refresh
+                and now - cls._checked_at.get(store, 0) < settings.VECTOR_ALIAS_REFRESH_SECONDS):
+            return collection
+
+        with cls._lock:
+            collection_name, generation = CollectionVersions.active_state(VECTOR_STORES[store]['collection'])
+            collection = cls._collections.get(store)
+            if refresh or collection is None or collection.name != collection_name:
+                client = cls.get_store_client(store)
+                collection = client.get_collection(
+                    name=collection_name,
+                    embedding_function=SharedEmbeddingFunction()
+                )
+                cls._collections[store] = collection
+            cls._generations[store] = generation
+            cls._checked_at[store] = now
+        return collection
+
+    @classmethod
+    def version(cls, store):
+        """Return (collection name, generation) identifying the current contents of `store`."""
+        collection = cls.get_collection(store)
+        return collection.name, cls._generations.get(store, 0)
+
+    @classmethod
+    def run(cls, store, func):
+        """
+        Call `func(collection)` with the shared handle of `store`.
+
+        If the collection was deleted and recreated since the handle was
+        cached (e.g. by a re-ingest in another worker) the handle is reloaded
+        and the call is retried once.
+        """
+        try:
+            return func(cls.get_collection(store))
+        except Exception as e:
+            if not is_missing_collection(e):
+                raise
+            return func(cls.get_collection(store, refresh=True))
+
+    @classmethod
+    def invalidate(cls, store=None):
+        with cls._lock:
+            if store is None:
+                cls._collections.clear()
+                cls._checked_at.clear()
+            else:
+                cls._collections.pop(store, None)
+                cls._checked_at.pop(store, None)
+
+    @classmethod
+    def invalidate_path(cls, path):
+        """Drop cached handles of every store living under `path`."""
+        path = cls.resolve_path(path)
+        with cls._lock:
+            for store, config in VECTOR_STORES.items():
+                if cls.resolve_path(config['path']) == path:
+                    cls._collections.pop(store, None)
+                    cls._checked_at.pop(store, None)
@@ -0,0 +1,189 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .metadata_filters import combine_conditions
+
+
+# Collections whose documents (resume, statement of purpose, publications,
+# funding) are stored as one vector per passage plus one profile vector
+CHUNKED_COLLECTIONS = {'researcher_user_documents', 'student_user_documents'}
+
+# chunk_index of the profile vector stored under the parent id itself
+PROFILE_CHUNK_INDEX = -1
+
+
+class TextChunker:
+    """
+    Token-aware splitting of long documents into passages the embedding model sees in full.
+
+    mxbai-embed-large-v1 truncates its input at 512 tokens, so a resume, SOP
+    and publication list concatenated into one string was mostly ignored.
+    Passages are cut on tiktoken token boundaries, slightly below the model
+    limit since its WordPiece tokenizer produces more tokens than tiktoken.
+    """
+    _encoding = None
+    _encoding_lock = threading.Lock()
+
+    @classmethod
+    def encoding(cls):
+        if cls._encoding is None:
+            with cls._encoding_lock:
+                if cls._encoding is None:
+                    import tiktoken
+                    cls._encoding = tiktoken.get_encoding("cl100k_base")
+        return cls._encoding
+
+    @classmethod
+    def split(cls, text, max_tokens=None, overlap=None, max_chunks=None):
+        max_tokens = max_tokens or settings.EMBEDDING_CHUNK_TOKENS
+        overlap = settings.EMBEDDING_CHUNK_OVERLAP if overlap is None else overlap
+        max_chunks = max_chunks or settings.EMBEDDING_MAX_CHUNKS
+        if not text or not text.strip():
+            return []
+
+        tokens = cls.encoding().encode(text)
+        if len(tokens) <= max_tokens:
+            return [text]
+
+        passages = []
+        step = max(max_tokens - overlap, 1)
+        for start in range(0, len(tokens), step):
+            passages.append(cls.encoding().decode(tokens[start:start + max_tokens]))
+            if start + max_tokens >= len(tokens) or len(passages) >= max_chunks:
+                break
+        return passages
+
+
+def is_chunked(collection):
+    # Versioned collections are named <alias>__v<timestamp>
+    return collection.name.split('__v')[0] in CHUNKED_COLLECTIONS
+
+
+def profile_vector(vectors):
+    """Normalized mean of a document's passage vectors, used as its whole-profile vector."""
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
+
+
+def expand_records(records, embed):
+    """
+    Turn (parent id, text, metadata) records into passage and profile rows.
+
+    `embed` is called once with every passage of every record. Returns
+    parallel lists of ids, embeddings, documents and metadatas: one row per
+    passage (`<parent id>#<n>`) and one profile row under the parent id
+    holding the full text and the mean of the passage vectors.
+    """
+    passages = [TextChunker.split(text) or [""] for _, text, _ in records]
+    vectors = embed([passage for record_passages in passages for passage in record_passages])
+
+    ids, embeddings, documents, metadatas = [], [], [], []
+    offset = 0
+    for (parent_id, text, metadata), record_passages in zip(records, passages):
+        record_vectors = vectors[offset:offset + len(record_passages)]
+        offset += len(record_passages)
+        for chunk_index, (passage, vector) in enumerate(zip(record_passages, record_vectors)):
+            ids.append(f"{parent_id}#{chunk_index}")
+            embeddings.append(vector)
+            documents.append(passage)
+            metadatas.append({**metadata, 'parent_id': parent_id, 'chunk_index': chunk_index})
+        ids.append(parent_id)
+        embeddings.append(profile_vector(record_vectors))
+        documents.append(text)
+        metadatas.append({**metadata, 'parent_id': parent_id, 'chunk_index': PROFILE_CHUNK_INDEX})
+    return ids, embeddings, documents, metadatas
+
+
+def delete_parents(collection, parent_ids):
+    """Remove the profile and passage rows of `parent_ids`."""
+    if not parent_ids:
+        return
+    collection.delete(ids=list(parent_ids))
+    if is_chunked(collection):
+        collection.delete(where={'parent_id': {'$in': list(parent_ids)}})
+
+
+def aggregate_parents(metadatas, distances, top_n, aggregation=None):
+    """Group passage hits by parent; return ranked (parent ids, metadatas, distances) of the best `top_n`."""
+    aggregation = aggregation or settings.EMBEDDING_CHUNK_AGGREGATION
+    parent_distances, parent_metadata = {}, {}
+    for metadata, distance in zip(metadatas, distances):
+        parent_id = metadata['parent_id']
+        parent_distances.setdefault(parent_id, []).append(distance)
+        parent_metadata.setdefault(parent_id, metadata)
+
+    if aggregation == 'mean':
+        scores = {parent_id: float(np.mean(values)) for parent_id, values in parent_distances.items()}
+    else:
+        scores = {parent_id: min(values) for parent_id, values in parent_distances.items()}
+    ranked = sorted(scores, key=scores.get)[:top_n]
+    return ranked, [parent_metadata[parent_id] for parent_id in ranked], [scores[parent_id] for parent_id in ranked]
+
+
+def passage_filter(where):
+    conditions = [where] if where else []
+    return combine_conditions(conditions + [{'chunk_index': {'$gte': 0}}])
+
+
+def query_parents(collection, query_embedding, top_n, where=None, aggregation=None):
+    """
+    Query passage vectors and return the best `top_n` parents in `collection.query` shape.
+
+    A parent's distance is its closest passage ('max' similarity, default)
+    or the mean distance of its retrieved passages ('mean'). The passage
+    pool is widened until `top_n` parents are found or the collection is
+    exhausted.
+    """
+    total = collection.count()
+    n_results = max(min(top_n * settings.EMBEDDING_CHUNK_OVERSAMPLE, total), 1)
+
+    while True:
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=passage_filter(where)
+        )
+        if not results['ids'][0]:
+            # Stores built before chunking hold one vector per parent and no chunk_index
+            return collection.query(query_embeddings=[query_embedding], n_results=top_n, where=where or None)
+
+        ranked, metadatas, distances = aggregate_parents(results['metadatas'][0], results['distances'][0], top_n, aggregation)
+        # Stop once there are enough parents or every matching passage was returned
+        if len(ranked) >= top_n or len(results['ids'][0]) < n_results or n_results >= total:
+            break
+        n_results = min(n_results * 2, total)
+
+    return {'ids': [ranked], 'metadatas': [metadatas], 'distances': [distances]}
+
+
+def query_parents_many(collection, query_embeddings, top_n, where=None, aggregation=None):
+    """
+    `query_parents` for several query vectors sharing one filter, in a single multi-query.
+
+    Only rows that come back with fewer than `top_n` parents while more
+    passages exist are re-queried individually with a wider pool.
+    """
+    total = collection.count()
+    n_results = max(min(top_n * settings.EMBEDDING_CHUNK_OVERSAMPLE, total), 1)
+    results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=n_results,
+        where=passage_filter(where)
+    )
+    if not any(results['ids']):
+        # Stores built before chunking hold one vector per parent and no chunk_index
+        return collection.query(query_embeddings=query_embeddings, n_results=top_n, where=where or None)
+
+    merged = {'ids': [], 'metadatas': [], 'distances': []}
+    for row, query_embedding in enumerate(query_embeddings):
+        ranked, metadatas, distances = aggregate_parents(results['metadatas'][row], results['distances'][row], top_n, aggregation)
+        if len(ranked) < top_n and len(results['ids'][row]) == n_results and n_results < total:
+            widened = query_parents(collection, query_embedding, top_n, where, aggregation)
+            ranked, metadatas, distances = widened['ids'][0], widened['metadatas'][0], widened['distances'][0]
+        merged['ids'].append(ranked)
+        merged['metadatas'].append(metadatas)
+        merged['distances'].append(distances)
+    return merged
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import VectorCollectionAlias
+
+
+class CollectionVersions:
+    """
+    Blue/green versions of a ChromaDB collection.
+
+    A rebuild writes into a new `<alias>__v<timestamp>` collection while
+    queries keep reading the collection the alias points at. Once the new
+    version is complete and validated the alias is flipped in one database
+    update and older versions are dropped, so readers never see a
+    half-built index.
+    """
+
+    @staticmethod
+    def versioned_name(alias):
+        return f"{alias}__v{timezone.now():%Y%m%d%H%M%S%f}"
+
+    @staticmethod
+    def active_name(alias):
+        collection_name = VectorCollectionAlias.objects.filter(alias=alias).values_list('collection_name', flat=True).first()
+        # Stores built before versioning was introduced use the plain name
+        return collection_name or alias
+
+    @staticmethod
+    def active_state(alias):
+        """Return (active collection name, generation) of `alias`."""
+        state = VectorCollectionAlias.objects.filter(alias=alias).values_list('collection_name', 'generation').first()
+        return state or (alias, 0)
+
+    @staticmethod
+    def bump_generation(alias):
+        alias_row, created = VectorCollectionAlias.objects.get_or_create(
+            alias=alias,
+            defaults={'collection_name': alias}
+        )
+        VectorCollectionAlias.objects.filter(pk=alias_row.pk).update(generation=F('generation') + 1)
+
+    @staticmethod
+    def is_building(alias):
+        cutoff = timezone.now() - timedelta(seconds=settings.VECTOR_BUILD_TIMEOUT_SECONDS)
+        return VectorCollectionAlias.objects.filter(alias=alias, build_started_at__gte=cutoff).exists()
+
+    @staticmethod
+    def mark_build_started(alias):
+        alias_row, created = VectorCollectionAlias.objects.get_or_create(
+            alias=alias,
+            defaults={'collection_name': alias}
+        )
+        alias_row.build_started_at = timezone.now()
+        alias_row.save(update_fields=['build_started_at', 'updated_at'])
+
+    @staticmethod
+    def mark_build_finished(alias):
+        VectorCollectionAlias.objects.filter(alias=alias).update(build_started_at=None)
+
+    @staticmethod
+    def validate(collection, expected_count):
+        """Check the shadow collection holds every record and answers a query."""
+        count = collection.count()
+        if count != expected_count:
+            raise ValueError(f"{collection.name} holds {count} vectors, expected {expected_count}")
+        if count == 0:
+            return
+        sample = collection.peek(limit=1)
+        results = collection.query(query_embeddings=[sample['embeddings'][0]], n_results=1)
+        if not results['ids'] or not results['ids'][0]:
+            raise ValueError(f"{collection.name} returned no results for a sample query")
+
+    @staticmethod
+    def flip(alias, collection_name):
+        with transaction.atomic():
+            VectorCollectionAlias.objects.update_or_create(
+                alias=alias,
+                defaults={'collection_name': collection_name, 'build_started_at': None}
+            )
+            VectorCollectionAlias.objects.filter(alias=alias).update(generation=F('generation') + 1)
+
+    @staticmethod
+    def garbage_collect(client, alias, keep=None):
+        """Drop old versions of `alias`, keeping the active one and `keep` previous ones."""
+        keep = settings.VECTOR_COLLECTION_KEEP_VERSIONS if keep is None else keep
+        active = CollectionVersions.active_name(alias)
+        versions = sorted(
+            (collection.name for collection in client.list_collections()
+             if collection.name == alias or collection.name.startswith(f"{alias}__v")),
+            # The unversioned legacy collection is always the oldest
+            key=lambda name: '' if name == alias else name,
+            reverse=True
+        )
+        previous = [name for name in versions if name != active]
+        for name in previous[keep:]:
+            try:
+                client.delete_collection(name=name)
+            except Exception as e:
+                print("Failed to delete old collection version:", name, e)
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+
+# Scores stored in the program metadata (see ProgramMetadataSchema)
+CRITERIA_FIELDS = ['IELTS', 'TOEFL', 'DUOLINGO', 'GRE', 'CGPA']
+
+CRITERIA_PATTERNS = {
+    "IELTS": r"IELTS\s+(\d+(\.\d+)?)",
+    "TOEFL": r"TOEFL\s+(\d+)",
+    "DUOLINGO": r"DUOLINGO\s+(\d+)",
+    "GRE": r"GRE\s+(\d+)",
+    "CGPA": r"CGPA\s+(\d+(\.\d+)?)"
+}
+
+
+def regex_criteria(eligibility_text):
+    """Scores written as "<TEST> <score>" in `eligibility_text`; missing scores are ""."""
+    criteria = dict.fromkeys(CRITERIA_FIELDS, "")
+    for key, pattern in CRITERIA_PATTERNS.items():
+        match = re.search(pattern, eligibility_text or "", re.IGNORECASE)
+        if match:
+            criteria[key] = float(match.group(1))
+    return criteria
+
+
+SYSTEM_MESSAGE = """
+You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score. If a score is not found, keep it None
+"""
+
+EXTRACT_TEST_SCORES_TOOL = {
+    "type": "function",
+    "function": {
+        'name': 'extract_test_scores',
+        'strict': True,
+        'description':
+        'You are an expert data analyst. Based on an open-ended question, you will identify the relevant factors to investigate and generate fields of a dataset with descriptions and explanations for each field.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'fields': {
+                    'type': 'array',
+                    'description': 'You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score',
+                    'items': {
+                        'type': 'object',
+                        "properties": {
+                            "IELTS": {"type": "number", "description": "English proficiency test often required by non-native speakers"},
+                            "TOEFL": {"type": "number", "description": "For non-native English speakers; assesses English proficiency"},
+                            "SAT": {"type": "number", "description": "Scholastic Assessment Test"},
+                            "GRE": {"type": "number", "description": "Graduate Record Examination"},
+                            "GMAT": {"type": "number", "description": "Graduate Management Admission Test"},
+                            "MAT": {"type": "number", "description": "Miller Analogies Test"},
+                            "CGPA": {"type": "number", "description": "Minimum CGPA required for the program "},
+                            "DUOLINGO": {"type": "number", "description": "English proficiency test"},
+                        },
+                        "required": ["IELTS", "TOEFL", "SAT", "GRE", "GMAT", "MAT", "CGPA", "DUOLINGO"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["fields"],
+            "additionalProperties": False,
+        }
+    }
+}
+
+
+class OpenAICriteriaBackend:
+    """Extracts test score requirements with an OpenAI chat model through a forced tool call."""
+    _client = None
+    _client_lock = threading.Lock()
+
+    def __init__(self, model=None):
+        self.model = model or settings.CRITERIA_LLM_MODEL
+        self.name = f"openai:{self.model}"
+
+    @classmethod
+    def client(cls):
+        # One client (and connection pool) per process instead of one per program
+        if cls._client is None:
+            with cls._client_lock:
+                if cls._client is None:
+                    from openai import OpenAI
+                    cls._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return cls._client
+
+    def extract(self, eligibility_text):
+        response = self.client().chat.completions.create(
+            model=self.model,
+            temperature=0,
+            messages=[
+                {"role": "system", "content": SYSTEM_MESSAGE},
+                {"role": "user", "content": eligibility_text}
+            ],
+            tools=[EXTRACT_TEST_SCORES_TOOL],
+            tool_choice={"type": "function", "function": {"name": "extract_test_scores"}}
+        )
+        extracted_json = {}
+        for tool_call in response.choices[0].message.tool_calls or []:
+            arguments = json.loads(tool_call.function.arguments)
+            if arguments['fields']:
+                extracted_json = arguments['fields'][0]
+        return extracted_json
+
+
+class StubCriteriaBackend:
+    """Offline backend for tests and ingests without network access: the regex pass only."""
+    name = 'stub'
+
+    def extract(self, eligibility_text):
+        return regex_criteria(eligibility_text)
+
+
+# CRITERIA_EXTRACTION_BACKEND -> backend class
+CRITERIA_BACKENDS = {
+    'openai': OpenAICriteriaBackend,
+    'stub': StubCriteriaBackend,
+}
+
+
+class CriteriaCache:
+    """
+    Persistent cache of extracted criteria keyed by (backend name, SHA-256 of the eligibility text).
+
+    Stored as JSON in a SQLite file shared by every ingest, so a program
+    whose eligibility text did not change is never sent to the LLM again.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS criteria ("
+                " backend TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " criteria TEXT NOT NULL,"
+                " PRIMARY KEY (backend, text_hash))"
+            )
+
+    @classmethod
+    def get_instance(cls, path=None):
+        """Return the shared cache of `path` (CRITERIA_CACHE_PATH by default), or None if caching is off."""
+        path = path or settings.CRITERIA_CACHE_PATH
+        if not path:
+            return None
+        with cls._instances_lock:
+            cache = cls._instances.get(path)
+            if cache is None:
+                cache = cls(path)
+                cls._instances[path] = cache
+        return cache
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, backend, text_hash):
+        row = self.connection().execute(
+            "SELECT criteria FROM criteria WHERE backend = ? AND text_hash = ?", [backend, text_hash]
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, backend, text_hash, criteria):
+        with self.connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO criteria (backend, text_hash, criteria) VALUES (?, ?, ?)",
+                [backend, text_hash, json.dumps(criteria)]
+            )
+
+
+def completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class CriteriaExtractionService:
+    """
+    Eligibility-criteria extraction for program ingest.
+
+    The regex pass runs first and the LLM is skipped when it finds every
+    score. Otherwise the result comes from the persistent `CriteriaCache`,
+    or from the backend (CRITERIA_EXTRACTION_BACKEND) called on a pool of
+    CRITERIA_LLM_CONCURRENCY threads with exponential backoff. `submit`
+    starts extraction without waiting, so ingest can submit a whole batch
+    before building its records. A text whose calls keep failing falls back
+    to the regex result, which is not cached. Finished extractions leave the
+    in-flight map as soon as they complete; the last few results are kept in
+    a bounded map so `extract` finds prefetched ones even without the cache.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, backend=None, cache=None, concurrency=None, max_retries=None):
+        self.backend = backend or CRITERIA_BACKENDS[settings.CRITERIA_EXTRACTION_BACKEND]()
+        self.cache = cache if cache is not None else CriteriaCache.get_instance()
+        self.max_retries = settings.CRITERIA_LLM_MAX_RETRIES if max_retries is None else max_retries
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency or settings.CRITERIA_LLM_CONCURRENCY,
+            thread_name_prefix='criteria-extraction'
+        )
+        self._futures = {}
+        self._recent = OrderedDict()
+        # Ingest prefetches one batch ahead, so two batches of results are enough
+        self._recent_size = 2 * settings.VECTOR_INGEST_BATCH_SIZE
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def submit(self, eligibility_text):
+        """Start extracting the criteria of `eligibility_text`; returns a future of the criteria dict."""
+        eligibility_text = eligibility_text or ""
+        criteria = regex_criteria(eligibility_text)
+        if not eligibility_text.strip() or all(criteria[field] != "" for field in CRITERIA_FIELDS):
+            return completed(criteria)
+
+        text_hash = self.text_hash(eligibility_text)
+        with self._lock:
+            if text_hash in self._recent:
+                return completed(self._recent[text_hash])
+            future = self._futures.get(text_hash)
+            if future is not None:
+                return future
+            cached = self.cache.get(self.backend.name, text_hash) if self.cache is not None else None
+            if cached is not None:
+                return completed(cached)
+            future = self._executor.submit(self.call_backend, eligibility_text, text_hash, criteria)
+            self._futures[text_hash] = future
+        # Registered outside the lock: a future that already finished runs the callback right here
+        future.add_done_callback(lambda done: self.finished(text_hash, done))
+        return future
+
+    def finished(self, text_hash, future):
+        with self._lock:
+            self._futures.pop(text_hash, None)
+            if future.exception() is None:
+                self._recent[text_hash] = future.result()
+                while len(self._recent) > self._recent_size:
+                    self._recent.popitem(last=False)
+
+    def extract(self, eligibility_text):
+        """Return the criteria of `eligibility_text`, waiting for an extraction already submitted."""
+        return self.submit(eligibility_text).result()
+
+    def call_backend(self, eligibility_text, text_hash, fallback):
+        for attempt in range(self.max_retries + 1):
+            try:
+                criteria = self.backend.extract(eligibility_text)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print("Criteria extraction failed, using the regex result:", e)
+                    return fallback
+                # Exponential backoff with jitter, e.g. on rate limits
+                time.sleep(min(2 ** attempt, 30) * (0.5 + random.random()))
+        if self.cache is not None:
+            self.cache.set(self.backend.name, text_hash, criteria)
+        return criteria
@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from common.models import UserDocument
+from funding_app.models import Funding
+from profile_app.models import (
+    UserDetails, Citizenship, Visa, ResearchInterest, EducationalBackground, Dissertation,
+    ResearchExperience, Publication, WorkExperience, Skill, TrainingWorkshop,
+    AwardGrantScholarship, VolunteerActivity, ReferenceInfo, TestScore
+)
+from program_app.models import Program
+from ..models import VectorIngestWatermark
+from .chromadb_registry import VECTOR_STORES
+from .collection_versions import CollectionVersions
+from .chromadb_ingest_user_data import DjangoToChromaDBIngest
+from .vector_index_updater import VectorIndexUpdater
+
+
+# Models whose rows feed a user's vector documents, model -> user id field
+USER_SOURCES = [
+    (UserDetails, 'user_id'),
+    (Citizenship, 'user_details__user_id'),
+    (Visa, 'user_details__user_id'),
+    (ResearchInterest, 'user_details__user_id'),
+    (EducationalBackground, 'user_details__user_id'),
+    (Dissertation, 'user_details__user_id'),
+    (ResearchExperience, 'user_details__user_id'),
+    (Publication, 'user_details__user_id'),
+    (WorkExperience, 'user_details__user_id'),
+    (Skill, 'user_details__user_id'),
+    (TrainingWorkshop, 'user_details__user_id'),
+    (AwardGrantScholarship, 'user_details__user_id'),
+    (VolunteerActivity, 'user_details__user_id'),
+    (ReferenceInfo, 'user_details__user_id'),
+    (TestScore, 'user_details__user_id'),
+    (Funding, 'funding_for_faculty_member_id'),
+]
+
+# Full build of a collection, used when it has no watermark yet
+FULL_INGEST_METHODS = {
+    'researcher': 'ingest_researcher_user_documents',
+    'student': 'ingest_student_user_documents',
+    'program': 'ingest_program_documents',
+}
+
+
+def changed_program_ids(since, until):
+    # all_objects includes soft-deleted rows, whose vectors must be removed
+    changed = Program.all_objects.filter(updated_at__gt=since, updated_at__lte=until)
+    program_ids = set(changed.values_list('id', flat=True))
+    department_ids = set(
+        Funding.all_objects.filter(updated_at__gt=since, updated_at__lte=until, funding_for_dept_id__isnull=False)
+        .values_list('funding_for_dept_id', flat=True)
+    )
+    if department_ids:
+        program_ids.update(Program.all_objects.filter(department_id__in=department_ids).values_list('id', flat=True))
+    return program_ids
+
+
+def changed_user_ids(since, until):
+    user_ids = set()
+    for model, user_field in USER_SOURCES:
+        user_ids.update(
+            model.all_objects.filter(updated_at__gt=since, updated_at__lte=until)
+            .values_list(user_field, flat=True)
+        )
+    user_ids.update(
+        UserDocument.all_objects.filter(
+            updated_at__gt=since, updated_at__lte=until, use__in=[UserDocument.RESUME, UserDocument.SOP]
+        ).values_list('user_id', flat=True)
+    )
+    user_ids.discard(None)
+    return user_ids
+
+
+class DeltaIngest:
+    """
+    Re-ingests only the rows of each collection changed since its last successful run.
+
+    Every collection keeps a high-water mark (`VectorIngestWatermark`). A
+    run re-embeds the programs or users with an `updated_at` between the
+    mark and the start of the run, split into batches embedded on
+    `workers` threads, and moves the mark forward once all of them are
+    written. The next run starts VECTOR_INGEST_WATERMARK_OVERLAP_SECONDS
+    before the mark, so rows committed by transactions still open at the
+    previous run are not missed. A collection without a mark gets a full
+    build. Hard deletes do not leave an `updated_at` behind and are only
+    handled by the `VectorIndexUpdate` queue.
+    """
+
+    def __init__(self, collections=None, workers=1, batch_size=None, dry_run=False, stdout=None):
+        self.collections = list(collections or FULL_INGEST_METHODS)
+        self.workers = max(1, workers)
+        self.batch_size = batch_size or settings.VECTOR_INGEST_BATCH_SIZE
+        self.dry_run = dry_run
+        self.log = stdout.write if stdout is not None else print
+
+    @staticmethod
+    def watermark(collection):
+        return VectorIngestWatermark.objects.filter(collection=collection).values_list('watermark', flat=True).first()
+
+    def run(self, since=None):
+        """Ingest every collection; returns {collection: number of changed objects, or None for a full build}."""
+        results = {}
+        for collection in self.collections:
+            if CollectionVersions.is_building(VECTOR_STORES[collection]['collection']):
+                self.log(f"{collection}: a rebuild is in progress, skipped")
+                continue
+            results[collection] = self.ingest(collection, since)
+        return results
+
+    def ingest(self, collection, since=None):
+        until = timezone.now()
+        if since is None:
+            since = self.watermark(collection)
+            if since is not None:
+                since -= timedelta(seconds=settings.VECTOR_INGEST_WATERMARK_OVERLAP_SECONDS)
+
+        if since is None:
+            self.log(f"{collection}: no watermark, full build")
+            if self.dry_run:
+                return None
+            ingestor = DjangoToChromaDBIngest(output_path=VECTOR_STORES[collection]['path'], batch_size=self.batch_size)
+            getattr(ingestor, FULL_INGEST_METHODS[collection])()
+            self.save_watermark(collection, until, None)
+            return None
+
+        object_ids = sorted(changed_program_ids(since, until) if collection == 'program' else changed_user_ids(since, until))
+        self.log(f"{collection}: {len(object_ids)} changed since {since.isoformat()}")
+        if self.dry_run or not object_ids:
+            if not self.dry_run:
+                self.save_watermark(collection, until, 0)
+            return len(object_ids)
+
+        updater = VectorIndexUpdater(batch_size=self.batch_size, stores=[collection], defer_refresh=True)
+        update = updater.update_programs if collection == 'program' else updater.update_users
+        batches = [object_ids[start:start + self.batch_size] for start in range(0, len(object_ids), self.batch_size)]
+
+        def run_batch(batch):
+            try:
+                return update(batch)
+            finally:
+                # Worker threads open their own database connections
+                connections.close_all()
+
+        counts = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for batch_counts in executor.map(run_batch, batches):
+                VectorIndexUpdater.merge_counts(counts, batch_counts)
+        updater.finish()
+        self.log(f"{collection}: {counts.get('upserted', 0)} upserted, {counts.get('deleted', 0)} deleted")
+        self.save_watermark(collection, until, len(object_ids))
+        return len(object_ids)
+
+    @staticmethod
+    def save_watermark(collection, until, rows_processed):
+        VectorIngestWatermark.objects.update_or_create(
+            collection=collection,
+            defaults={'watermark': until, 'rows_processed': rows_processed or 0}
+        )
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model name, SHA-256 of the text).
+
+    Vectors are stored as float32 blobs in a SQLite file shared by every
+    worker and management command, so a rebuild only runs the model on texts
+    that changed since they were last embedded. Hits refresh `used_at`, and
+    the least recently used vectors are evicted once the file holds more than
+    EMBEDDING_CACHE_MAX_ENTRIES.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " used_at REAL NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            # Cache files written before eviction existed
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(embeddings)")]
+            if 'used_at' not in columns:
+                connection.execute("ALTER TABLE embeddings ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+            connection.execute("CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)")
+
+    @classmethod
+    def get_instance(cls, path=None):
+        """Return the shared cache of `path` (EMBEDDING_CACHE_PATH by default), or None if caching is off."""
+        path = path or settings.EMBEDDING_CACHE_PATH
+        if not path:
+            return None
+        cache = cls._instances.get(path)
+        if cache is None:
+            with cls._instances_lock:
+                cache = cls._instances.get(path)
+                if cache is None:
+                    cache = cls(path)
+                    cls._instances[path] = cache
+        return cache
+
+    def connection(self):
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model_name, hashes):
+        found = {}
+        hashes = list(hashes)
+        connection = self.connection()
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = connection.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                [model_name, *chunk]
+            )
+            for text_hash, vector in rows:
+                found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+        if found:
+            now = time.time()
+            with connection:
+                connection.executemany(
+                    "UPDATE embeddings SET used_at = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model_name, text_hash) for text_hash in found]
+                )
+        return found
+
+    def set_many(self, model_name, vectors):
+        now = time.time()
+        with self.connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, used_at) VALUES (?, ?, ?, ?)",
+                [(model_name, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                 for text_hash, vector in vectors.items()]
+            )
+            self.evict(connection)
+
+    @staticmethod
+    def evict(connection):
+        """Delete the least recently used vectors beyond EMBEDDING_CACHE_MAX_ENTRIES."""
+        (count,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - settings.EMBEDDING_CACHE_MAX_ENTRIES
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY used_at LIMIT ?)",
+                (excess,)
+            )
+
+    def encode(self, service, texts, batch_size=None):
+        """
+        Embed `texts` with `service`, running the model only on cache misses.
+
+        Identical texts in one call are encoded once. Returns plain float
+        lists in the order of `texts`.
+        """
+        texts = list(texts)
+        model_name = getattr(service, 'cache_name', None) or service.model_name
+        hashes = [self.text_hash(text) for text in texts]
+        vectors = self.get_many(model_name, set(hashes))
+
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        if missing:
+            encoded = dict(zip(missing, service.encode(list(missing.values()), batch_size=batch_size)))
+            self.set_many(model_name, encoded)
+            vectors.update(encoded)
+
+        logger.debug("embedding cache: %s hits, %s encoded", len(texts) - len(missing), len(missing))
+        return [vectors[text_hash] for text_hash in hashes]
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_service import EmbeddingService, receive_frame, send_frame
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Serves one client connection: each request frame is a JSON list of texts, answered with their vectors."""
+
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(receive_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            try:
+                vectors = np.asarray(self.server.embedding_server.submit(request['texts']).result(), dtype=np.float32)
+            except Exception as e:
+                send_frame(self.request, json.dumps({'error': str(e)}).encode('utf-8'))
+                continue
+            send_frame(self.request, json.dumps({'shape': list(vectors.shape)}).encode('utf-8'))
+            send_frame(self.request, vectors.tobytes())
+
+
+class EmbeddingServer:
+    """
+    Local embedding server with dynamic batching.
+
+    Every client connection gets a thread that only parses requests and
+    waits for their vectors. One batching thread owns the model: it takes
+    the first waiting request, keeps collecting requests for up to
+    `batch_window_ms` (or until `max_batch` texts) and embeds them all in one
+    forward pass, so concurrent small requests from different workers share
+    a batch instead of queueing for the model one by one.
+    """
+
+    def __init__(self, socket_path=None, service=None, batch_window_ms=None, max_batch=None):
+        self.socket_path = socket_path or settings.EMBEDDING_SERVER_SOCKET
+        self.service = service or EmbeddingService.get_instance()
+        self.batch_window = (batch_window_ms if batch_window_ms is not None else settings.EMBEDDING_SERVER_BATCH_WINDOW_MS) / 1000
+        self.max_batch = max_batch or settings.EMBEDDING_SERVER_MAX_BATCH
+        self.requests = queue.Queue()
+
+    def submit(self, texts):
+        future = Future()
+        self.requests.put((list(texts), future))
+        return future
+
+    def next_batch(self):
+        """Block for a request, then gather more until the window closes or the batch is full."""
+        pending = [self.requests.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.batch_window
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+            size += len(pending[-1][0])
+        return pending
+
+    def batch_loop(self):
+        while True:
+            pending = self.next_batch()
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                vectors = self.service.encode(texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for request_texts, future in pending:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+            logger.debug("embedding server: %s texts from %s requests in one batch", len(texts), len(pending))
+
+    def remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Left behind by a server that is no longer running
+            os.remove(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise ValueError(f"An embedding server is already listening on {self.socket_path}")
+
+    def serve_forever(self):
+        self.remove_stale_socket()
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, EmbeddingRequestHandler)
+        server.daemon_threads = True
+        server.embedding_server = self
+        threading.Thread(target=self.batch_loop, daemon=True).start()
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(self.socket_path)
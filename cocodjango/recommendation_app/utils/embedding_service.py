@@ -0,0 +1,208 @@
+import json
+import socket
+import struct
+import threading
+
+import numpy as np
+from django.conf import settings
+
+
+def vectors_name(model_name, dimensions):
+    """Identifies the vectors a model configuration produces, for caches shared between configurations."""
+    return f"{model_name}@{dimensions}" if dimensions else model_name
+
+
+class EmbeddingService:
+    """
+    Process-wide SentenceTransformer embedding service.
+
+    The model is loaded lazily on the first `encode` call and then stays
+    resident for the lifetime of the process, so HTTP views, ingestors and
+    management commands share one copy of the weights.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, model_name=None, batch_size=None, torch_threads=None, dimensions=None):
+        self.model_name = model_name or settings.EMBEDDING_MODEL_NAME
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.torch_threads = settings.EMBEDDING_TORCH_THREADS if torch_threads is None else torch_threads
+        # Matryoshka truncation: keep the first `dimensions` components (renormalized); 0 keeps all
+        self.dimensions = settings.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+
+                    if self.torch_threads:
+                        torch.set_num_threads(self.torch_threads)
+                    self._model = SentenceTransformer(self.model_name, truncate_dim=self.dimensions or None)
+        return self._model
+
+    @property
+    def cache_name(self):
+        return vectors_name(self.model_name, self.dimensions)
+
+    def warm_up(self):
+        """Load the model now instead of on the first request."""
+        return self.model
+
+    def encode(self, texts, batch_size=None):
+        """Embed `texts` in batched forward passes and return plain float lists."""
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return embeddings.tolist()
+
+
+def send_frame(connection, payload):
+    connection.sendall(struct.pack('!I', len(payload)) + payload)
+
+
+def receive_exactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def receive_frame(connection):
+    (size,) = struct.unpack('!I', receive_exactly(connection, 4))
+    return receive_exactly(connection, size)
+
+
+class EmbeddingClient:
+    """
+    Client of the local embedding server (`run_embedding_server`).
+
+    Texts are sent over a Unix socket; the server merges requests from all
+    workers that arrive within a few milliseconds into one forward pass, so
+    request threads never run the tokenizer or the model themselves. Each
+    thread keeps its own connection. If the server cannot be reached the
+    texts are embedded in-process with `EmbeddingService`, which also serves
+    tests and development setups that run no server.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or settings.EMBEDDING_SERVER_SOCKET
+        self.timeout = timeout or settings.EMBEDDING_SERVER_TIMEOUT_SECONDS
+        # The server runs the same configuration, so cached vectors stay interchangeable
+        self.model_name = settings.EMBEDDING_MODEL_NAME
+        self.dimensions = settings.EMBEDDING_DIMENSIONS
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        self._local = threading.local()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @property
+    def cache_name(self):
+        return vectors_name(self.model_name, self.dimensions)
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.socket_path)
+            except OSError:
+                connection.close()
+                raise
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def warm_up(self):
+        """Check the server is reachable; the model itself is loaded by the server."""
+        try:
+            self.connection()
+        except OSError as e:
+            print("embedding server unavailable:", e)
+        return self
+
+    def request(self, texts):
+        connection = self.connection()
+        send_frame(connection, json.dumps({'texts': texts}).encode('utf-8'))
+        header = json.loads(receive_frame(connection))
+        if 'error' in header:
+            raise ValueError(f"Embedding server failed: {header['error']}")
+        return np.frombuffer(receive_frame(connection), dtype=np.float32).reshape(header['shape']).tolist()
+
+    def encode(self, texts, batch_size=None):
+        """Embed `texts` on the server and return plain float lists."""
+        texts = list(texts)
+        if not texts:
+            return []
+        # A kept-alive connection may belong to a server that restarted; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                return self.request(texts)
+            except socket.timeout:
+                # A slow server is not a missing one: loading the model in every worker would only add load
+                self.close()
+                raise
+            except (ConnectionRefusedError, FileNotFoundError) as e:
+                # Nothing listens on the socket: the server is not running
+                self.close()
+                print("embedding server unavailable, embedding in-process:", e)
+                return EmbeddingService.get_instance().encode(texts, batch_size=batch_size)
+            except OSError as e:
+                self.close()
+                if attempt:
+                    raise
+                print("embedding server connection lost, reconnecting:", e)
+
+
+def get_embedding_service():
+    """Return the embedding server client if EMBEDDING_SERVER_SOCKET is set, else the in-process service."""
+    if settings.EMBEDDING_SERVER_SOCKET:
+        return EmbeddingClient.get_instance()
+    return EmbeddingService.get_instance()
+
+
+class SharedEmbeddingFunction:
+    """ChromaDB embedding function backed by the shared embedding service."""
+
+    def __init__(self, service=None):
+        self.service = service
+
+    def __call__(self, input):
+        service = self.service or get_embedding_service()
+        return service.encode(input)
@@ -0,0 +1,193 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import IngestionJob
+
+
+PROGRESS_COUNTERS = ['rows_fetched', 'texts_extracted', 'extraction_errors', 'vectors_written', 'errors']
+
+
+class NullJobProgress:
+    """Progress sink used when an ingestor runs outside of an ingestion job."""
+    resumable = False
+
+    def add(self, stage, **counts):
+        pass
+
+    def resume_point(self, stage):
+        return None, 0, 0
+
+    def save_checkpoint(self, stage, collection_name, last_id, written):
+        pass
+
+    def finish_stage(self, stage):
+        pass
+
+    def counts(self, stage):
+        return dict.fromkeys(PROGRESS_COUNTERS, 0)
+
+
+class IngestionJobProgress:
+    """
+    Records per-stage progress and checkpoints of an `IngestionJob`.
+
+    Counters are kept in memory and written to the job row at every
+    checkpoint (and at most every `flush_interval` seconds otherwise), so
+    polling clients see live progress without a write per document.
+    """
+    resumable = True
+
+    def __init__(self, job, flush_interval=2):
+        self.job = job
+        self.flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+
+    def counts(self, stage):
+        stage_progress = self.job.progress.setdefault(stage, {})
+        for counter in PROGRESS_COUNTERS:
+            stage_progress.setdefault(counter, 0)
+        return stage_progress
+
+    def add(self, stage, **counts):
+        stage_progress = self.counts(stage)
+        for counter, value in counts.items():
+            stage_progress[counter] += value
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def resume_point(self, stage):
+        """Return (shadow collection name, last processed id, vectors written) of `stage`."""
+        checkpoint = self.job.checkpoint.get(stage) or {}
+        return checkpoint.get('collection_name'), checkpoint.get('last_id', 0), checkpoint.get('written', 0)
+
+    def save_checkpoint(self, stage, collection_name, last_id, written):
+        self.job.checkpoint[stage] = {
+            'collection_name': collection_name,
+            'last_id': last_id,
+            'written': written,
+            'done': False,
+        }
+        self.flush()
+
+    def finish_stage(self, stage):
+        self.job.checkpoint.setdefault(stage, {})['done'] = True
+        self.flush()
+
+    def is_done(self, stage):
+        return bool((self.job.checkpoint.get(stage) or {}).get('done'))
+
+    def flush(self):
+        self.job.save(update_fields=['progress', 'checkpoint', 'updated_at'])
+        self._flushed_at = time.monotonic()
+
+
+def enqueue_job(stages=None, user=None):
+    return IngestionJob.objects.create(
+        stages=list(stages or IngestionJob.STAGES),
+        created_by=user if user is not None and user.is_authenticated else None
+    )
+
+
+def is_stale(job):
+    """True if `job` is running but its worker stopped sending heartbeats (crashed or was killed)."""
+    cutoff = timezone.now() - timedelta(seconds=settings.INGESTION_JOB_STALE_SECONDS)
+    return job.status == IngestionJob.RUNNING and job.updated_at < cutoff
+
+
+def can_resume(job):
+    return job.status == IngestionJob.FAILED or is_stale(job)
+
+
+def resume_job(job):
+    """Queue a failed or stale job again; finished stages and checkpoints are kept."""
+    job.status = IngestionJob.QUEUED
+    job.error = ''
+    job.finished_at = None
+    job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to running, or return None.
+
+    A running job whose worker died (no heartbeat for
+    INGESTION_JOB_STALE_SECONDS) is claimed again and resumes from its
+    checkpoints.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.INGESTION_JOB_STALE_SECONDS)
+    with transaction.atomic():
+        job = (IngestionJob.objects.select_for_update(skip_locked=True)
+               .filter(Q(status=IngestionJob.QUEUED) | Q(status=IngestionJob.RUNNING, updated_at__lt=cutoff))
+               .order_by('created_at')
+               .first())
+        if job is None:
+            return None
+        job.status = IngestionJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'updated_at'])
+    return job
+
+
+class JobHeartbeat:
+    """Touches a running job's `updated_at` from a background thread, so slow batches do not look like a dead worker."""
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = interval or settings.INGESTION_JOB_HEARTBEAT_SECONDS
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, name=f'ingestion-job-{job.id}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                IngestionJob.objects.filter(pk=self.job.pk, status=IngestionJob.RUNNING).update(updated_at=timezone.now())
+        finally:
+            # The thread's own database connection
+            connection.close()
+
+
+def run_job(job):
+    # Imported here so the job API does not load the ingestion stack
+    from .chromadb_registry import VECTOR_STORES
+    from .chromadb_ingest_user_data import DjangoToChromaDBIngest
+
+    progress = IngestionJobProgress(job)
+    ingest_methods = {
+        'researcher': 'ingest_researcher_user_documents',
+        'student': 'ingest_student_user_documents',
+        'program': 'ingest_program_documents',
+    }
+    try:
+        with JobHeartbeat(job):
+            for stage in job.stages:
+                if progress.is_done(stage):
+                    continue
+                ingestor = DjangoToChromaDBIngest(output_path=VECTOR_STORES[stage]['path'], job=progress)
+                getattr(ingestor, ingest_methods[stage])()
+                progress.finish_stage(stage)
+    except Exception as e:
+        job.status = IngestionJob.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'progress', 'checkpoint', 'finished_at', 'updated_at'])
+        raise
+
+    job.status = IngestionJob.SUCCEEDED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'checkpoint', 'finished_at', 'updated_at'])
+    return job
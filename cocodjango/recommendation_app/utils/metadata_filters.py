@@ -0,0 +1,133 @@
+import time
+from datetime import datetime
+
+
+def compile_equality_filters(filters, field_mappings):
+    """Compile exact-match filters; list values become a single `$in`."""
+    conditions = []
+    for user_filter, db_field in field_mappings.items():
+        value = filters.get(user_filter)
+        if not value:
+            continue
+        if isinstance(value, list):
+            conditions.append({db_field: {"$in": value}})
+        else:
+            conditions.append({db_field: {"$eq": value}})
+    return conditions
+
+
+def combine_conditions(conditions):
+    """Return a ChromaDB `where` clause matching all `conditions`."""
+    if len(conditions) == 0:
+        return {}
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+COMPARISONS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand,
+}
+
+
+def matches_where(metadata, where):
+    """Evaluate a ChromaDB `where` clause against one metadata dict in Python."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                try:
+                    if not COMPARISONS[operator](value, operand):
+                        return False
+                except TypeError:
+                    # Mismatched types never match, as in ChromaDB
+                    return False
+    return True
+
+
+class ProgramMetadataSchema:
+    """
+    Typed metadata of the program collection.
+
+    Requirement and fee fields are always stored as floats and the deadline
+    as an int timestamp. Missing values use sentinels that satisfy every
+    filter ("no requirement" is below any score, "no deadline" is after any
+    date), so each filter compiles to a single range predicate instead of a
+    range-or-empty-string `$or`.
+    """
+    NO_REQUIREMENT = -1.0
+    # 3000-01-01 UTC; far enough for any deadline and still a valid datetime in every timezone
+    NO_DEADLINE = 32503680000
+
+    # Program fields the student's value must be greater than or equal to
+    MAX_FIELDS = ['IELTS', 'TOEFL', 'GRE', 'DUOLINGO', 'CGPA', 'application_fee']
+    DEADLINE_FIELD = 'application_end_date'
+
+    @staticmethod
+    def to_number(value):
+        if value is None or value == "" or isinstance(value, bool):
+            return ProgramMetadataSchema.NO_REQUIREMENT
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return ProgramMetadataSchema.NO_REQUIREMENT
+
+    @staticmethod
+    def to_timestamp(value):
+        if value is None or value == "":
+            return ProgramMetadataSchema.NO_DEADLINE
+        if isinstance(value, str):
+            try:
+                return int(time.mktime(datetime.strptime(value, "%Y-%m-%d").timetuple()))
+            except ValueError:
+                return ProgramMetadataSchema.NO_DEADLINE
+        return int(value)
+
+    @classmethod
+    def normalize(cls, metadata):
+        """Return a copy of program `metadata` with typed values and sentinels for missing ones."""
+        normalized = dict(metadata)
+        for field in cls.MAX_FIELDS:
+            normalized[field] = cls.to_number(metadata.get(field))
+        normalized[cls.DEADLINE_FIELD] = cls.to_timestamp(metadata.get(cls.DEADLINE_FIELD))
+        return normalized
+
+    @classmethod
+    def display_value(cls, metadata, field):
+        """Return `field` for API responses, with sentinels shown as an empty value."""
+        value = metadata.get(field, "")
+        if field == cls.DEADLINE_FIELD:
+            if value in ("", None, cls.NO_DEADLINE):
+                return ""
+            return datetime.fromtimestamp(value).strftime('%Y-%m-%d')
+        if value == cls.NO_REQUIREMENT:
+            return ""
+        return value
+
+    @classmethod
+    def compile_range_filters(cls, filters):
+        """Compile the student's scores, budget and deadline into one range predicate each."""
+        conditions = []
+        for field in cls.MAX_FIELDS:
+            if filters.get(field):
+                conditions.append({field: {"$lte": float(filters[field])}})
+        if filters.get(cls.DEADLINE_FIELD):
+            conditions.append({cls.DEADLINE_FIELD: {"$gt": cls.to_timestamp(filters[cls.DEADLINE_FIELD])}})
+        return conditions
@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import StudentProgramMatch
+from .chromadb_registry import ChromaDBRegistry
+from .metadata_filters import matches_where
+from .recommendation_cache import RecommendationCache
+
+
+class ProgramMatchStore:
+    """
+    Materialized top-K program matches per student.
+
+    `materialize` stores each student's unfiltered nearest PROGRAM_MATCHES_TOP_K
+    programs. At read time the request's filters are applied to those matches
+    in Python, which answers unfiltered and lightly filtered requests without
+    a vector search. Matches are tagged with the student vector and program
+    collection version they were computed from. The scheduled
+    `materialize_program_matches` run recomputes students whose tag changed;
+    between runs, matches are served as long as the student vector is
+    unchanged and they are at most PROGRAM_MATCHES_MAX_AGE_SECONDS old, so a
+    program edit does not send every student to live search. Filters are
+    always evaluated on the current program metadata and removed programs
+    are skipped; a filter that leaves fewer than top_n of the K matches
+    falls back to live search.
+    """
+
+    @staticmethod
+    def version_tag(embedding):
+        collection_name, generation = ChromaDBRegistry.version('program')
+        return f"{RecommendationCache.embedding_hash(embedding)}:{collection_name}:{generation}"
+
+    @staticmethod
+    def is_servable(version, computed_at, embedding):
+        # Bounded staleness: only the student vector must match, the program collection may have moved on
+        max_age = timedelta(seconds=settings.PROGRAM_MATCHES_MAX_AGE_SECONDS)
+        return (version.split(':')[0] == RecommendationCache.embedding_hash(embedding)
+                and timezone.now() - computed_at <= max_age)
+
+    @classmethod
+    def materialize(cls, embeddings, top_k=None, force=False):
+        """
+        Recompute the matches of {user id: embedding}; returns the number of students updated.
+
+        Students whose stored matches are still current are skipped unless `force`.
+        """
+        top_k = top_k or settings.PROGRAM_MATCHES_TOP_K
+        tags = {user_id: cls.version_tag(embedding) for user_id, embedding in embeddings.items()}
+        if not force:
+            current = set(
+                StudentProgramMatch.objects.filter(user_id__in=tags.keys(), rank=0)
+                .values_list('user_id', 'version')
+            )
+            tags = {user_id: tag for user_id, tag in tags.items() if (user_id, tag) not in current}
+        if not tags:
+            return 0
+
+        user_ids = list(tags.keys())
+        results = ChromaDBRegistry.run(
+            'program',
+            lambda collection: collection.query(
+                query_embeddings=[embeddings[user_id] for user_id in user_ids],
+                n_results=top_k,
+                include=['distances']
+            )
+        )
+        matches = [
+            StudentProgramMatch(
+                user_id=user_id,
+                program_id=int(program_id.split('_')[1]),
+                rank=rank,
+                distance=distance,
+                version=tags[user_id]
+            )
+            for user_id, ids, distances in zip(user_ids, results['ids'], results['distances'])
+            for rank, (program_id, distance) in enumerate(zip(ids, distances))
+        ]
+        with transaction.atomic():
+            StudentProgramMatch.objects.filter(user_id__in=user_ids).delete()
+            StudentProgramMatch.objects.bulk_create(matches, batch_size=1000)
+        return len(user_ids)
+
+    @classmethod
+    def query(cls, user_id, embedding, query_filter, top_n):
+        """
+        Answer a program query from the stored matches, in `collection.query` shape.
+
+        Returns None when the matches are missing or stale, or when the
+        filter is too selective for the stored K matches to fill `top_n`.
+        """
+        matches = list(
+            StudentProgramMatch.objects.filter(user_id=user_id).values_list('program_id', 'distance', 'version', 'computed_at')
+        )
+        if not matches or not cls.is_servable(matches[0][2], matches[0][3], embedding):
+            return None
+
+        records = ChromaDBRegistry.run(
+            'program',
+            lambda collection: collection.get(
+                ids=[f"program_{program_id}" for program_id, _, _, _ in matches],
+                include=['metadatas']
+            )
+        )
+        metadata_by_id = dict(zip(records['ids'], records['metadatas']))
+
+        ids, metadatas, distances = [], [], []
+        for program_id, distance, _, _ in matches:
+            metadata = metadata_by_id.get(f"program_{program_id}")
+            if metadata is None or not matches_where(metadata, query_filter):
+                continue
+            ids.append(f"program_{program_id}")
+            metadatas.append(metadata)
+            distances.append(distance)
+            if len(ids) == top_n:
+                break
+
+        # Unless the K matches cover every program, more programs beyond them could still match
+        if len(ids) < top_n and len(matches) < ChromaDBRegistry.run('program', lambda collection: collection.count()):
+            return None
+        return {'ids': [ids], 'metadatas': [metadatas], 'distances': [distances]}
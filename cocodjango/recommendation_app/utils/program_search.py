@@ -0,0 +1,163 @@
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from funding_app.models import Funding as DepartmentFunding
+from program_app.models import Program
+from ..models import ProgramSearchDocument, ProgramSearchPosting
+from .chromadb_registry import ChromaDBRegistry
+from .embedding_service import get_embedding_service
+
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with', 'will', 'all', 'any',
+}
+
+# mxbai-embed-large-v1 expects this prefix on retrieval queries
+QUERY_PROMPT = "Represent this sentence for searching relevant passages: "
+
+
+def tokenize(text):
+    return [
+        token[:64] for token in re.findall(r"\w+", (text or "").lower())
+        if token not in STOP_WORDS
+    ]
+
+
+class ProgramLexicalIndex:
+    """
+    Inverted BM25 index over program text, stored in the database.
+
+    Each program's title, description, eligibility criteria, application
+    and contact details and the funding of its department are tokenized into
+    `ProgramSearchPosting` rows. `update` re-indexes only the given programs,
+    so the index is kept current by the vector index updater instead of
+    being rebuilt.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    @staticmethod
+    def program_text(program, fundings):
+        parts = [
+            program.title, program.description, program.eligibility_criteria,
+            program.application_process, program.entrance_exam_details,
+            program.interview_process, program.financial_aid_details,
+            program.contact_email, program.contact_phone, program.contact_office_location,
+            program.department.name if program.department else "",
+        ]
+        for funding in fundings:
+            parts += [funding.title_of_funding, funding.description]
+        return " ".join(part for part in parts if part)
+
+    @classmethod
+    def update(cls, program_ids):
+        """Re-index `program_ids`; programs that no longer exist are removed from the index."""
+        program_ids = list(set(program_ids))
+        programs = list(Program.objects.filter(id__in=program_ids).select_related('department'))
+        department_ids = {program.department_id for program in programs if program.department_id}
+        fundings_by_department = {}
+        for funding in DepartmentFunding.objects.filter(funding_for_dept_id__in=department_ids):
+            fundings_by_department.setdefault(funding.funding_for_dept_id, []).append(funding)
+
+        documents, postings = [], []
+        for program in programs:
+            counts = Counter(tokenize(cls.program_text(program, fundings_by_department.get(program.department_id, []))))
+            documents.append(ProgramSearchDocument(program_id=program.id, length=sum(counts.values())))
+            postings += [
+                ProgramSearchPosting(term=term, program_id=program.id, frequency=frequency)
+                for term, frequency in counts.items()
+            ]
+
+        with transaction.atomic():
+            ProgramSearchPosting.objects.filter(program_id__in=program_ids).delete()
+            ProgramSearchDocument.objects.filter(program_id__in=program_ids).delete()
+            ProgramSearchDocument.objects.bulk_create(documents, batch_size=1000)
+            ProgramSearchPosting.objects.bulk_create(postings, batch_size=1000)
+        return len(documents)
+
+    @classmethod
+    def rebuild(cls):
+        program_ids = set(Program.objects.values_list('id', flat=True))
+        indexed_ids = set(ProgramSearchDocument.objects.values_list('program_id', flat=True))
+        return cls.update(program_ids | indexed_ids)
+
+    @classmethod
+    def search(cls, query, limit=50, program_ids=None):
+        """Return [(program_id, score)] ranked by BM25, best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        stats = ProgramSearchDocument.objects.aggregate(total=Count('id'), average_length=Avg('length'))
+        if not stats['total']:
+            return []
+        average_length = stats['average_length'] or 1
+
+        postings = ProgramSearchPosting.objects.filter(term__in=terms)
+        if program_ids is not None:
+            postings = postings.filter(program_id__in=program_ids)
+        document_frequency = dict(
+            ProgramSearchPosting.objects.filter(term__in=terms)
+            .values_list('term').annotate(count=Count('id')).values_list('term', 'count')
+        )
+        postings = list(postings.values_list('term', 'program_id', 'frequency'))
+        lengths = dict(
+            ProgramSearchDocument.objects.filter(program_id__in={program_id for _, program_id, _ in postings})
+            .values_list('program_id', 'length')
+        )
+
+        scores = Counter()
+        for term, program_id, frequency in postings:
+            df = document_frequency.get(term, 0)
+            idf = math.log(1 + (stats['total'] - df + 0.5) / (df + 0.5))
+            length_norm = 1 - cls.B + cls.B * lengths.get(program_id, average_length) / average_length
+            scores[program_id] += idf * frequency * (cls.K1 + 1) / (frequency + cls.K1 * length_norm)
+        return scores.most_common(limit)
+
+
+class ProgramHybridSearch:
+    """
+    Keyword and semantic program search fused with reciprocal rank fusion.
+
+    The query is ranked by the BM25 index and by the `program_documents`
+    vectors independently; each program scores sum(1 / (k + rank)) over the
+    rankings it appears in.
+    """
+
+    def __init__(self, rrf_k=None, candidates=None):
+        self.rrf_k = rrf_k or settings.PROGRAM_SEARCH_RRF_K
+        self.candidates = candidates or settings.PROGRAM_SEARCH_CANDIDATES
+
+    def vector_ranking(self, query):
+        query_embedding = get_embedding_service().encode([QUERY_PROMPT + query])[0]
+        results = ChromaDBRegistry.run(
+            'program',
+            lambda collection: collection.query(
+                query_embeddings=[query_embedding],
+                n_results=self.candidates,
+                include=['distances']
+            )
+        )
+        return [int(embedding_id.split('_')[1]) for embedding_id in results['ids'][0]]
+
+    def search(self, query, limit=20, semantic=True):
+        """Return [(program_id, score)] ranked by fused score, best first."""
+        rankings = [[program_id for program_id, _ in ProgramLexicalIndex.search(query, limit=self.candidates)]]
+        if semantic:
+            try:
+                rankings.append(self.vector_ranking(query))
+            except Exception as e:
+                # Keyword results are still useful while the vector store is unavailable
+                print("Program vector search failed:", e)
+
+        scores = Counter()
+        for ranking in rankings:
+            for rank, program_id in enumerate(ranking, start=1):
+                scores[program_id] += 1.0 / (self.rrf_k + rank)
+        return scores.most_common(limit)
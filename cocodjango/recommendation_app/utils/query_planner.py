@@ -0,0 +1,126 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+from program_app.models import Program
+from .chromadb_registry import ChromaDBRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def ann_search(collection, query_embeddings, top_n, query_filter):
+    return collection.query(
+        query_embeddings=query_embeddings,
+        n_results=top_n,
+        where=query_filter or None
+    )
+
+
+class ProgramQueryPlanner:
+    """
+    Chooses between exact scoring and ANN search for program recommendations.
+
+    Filters that map onto relational columns are evaluated in the database
+    first. When they leave at most RECOMMENDATION_EXACT_SEARCH_MAX_CANDIDATES
+    programs, only those vectors are fetched and scored exactly with NumPy;
+    otherwise the query goes to the HNSW index. Both paths return results in
+    the shape of `collection.query`, and both return every matching program
+    up to `top_n`.
+    """
+    # Filters that can be evaluated on Program and its department -> college -> campus -> organization chain
+    RELATIONAL_FILTERS = {
+        'organization_name': 'department__college__campus__educational_organization__name',
+        'college_name': 'department__college__name',
+        'department_name': 'department__name',
+    }
+
+    def __init__(self, max_candidates=None):
+        self.max_candidates = max_candidates or settings.RECOMMENDATION_EXACT_SEARCH_MAX_CANDIDATES
+
+    def candidate_queryset(self, filters):
+        """Return the programs matching the relational filters, or None if none apply."""
+        programs = Program.objects.all()
+        applied = False
+        for user_filter, lookup in self.RELATIONAL_FILTERS.items():
+            value = filters.get(user_filter)
+            if not value:
+                continue
+            if isinstance(value, list):
+                programs = programs.filter(**{f"{lookup}__in": value})
+            else:
+                programs = programs.filter(**{lookup: value})
+            applied = True
+        if filters.get('application_end_date'):
+            deadline = datetime.strptime(filters['application_end_date'], "%Y-%m-%d").date()
+            programs = programs.filter(application_end_date__gt=deadline)
+            applied = True
+        if filters.get('application_fee'):
+            programs = programs.filter(application_fee__lte=float(filters['application_fee']))
+            applied = True
+        return programs if applied else None
+
+    def selective_candidates(self, filters):
+        """Return the candidate program ids if the filters are selective enough for exact scoring."""
+        programs = self.candidate_queryset(filters)
+        if programs is None:
+            return None
+        # Fetching one id past the limit is enough to tell a selective query apart
+        program_ids = list(programs.values_list('id', flat=True)[:self.max_candidates + 1])
+        if len(program_ids) > self.max_candidates:
+            return None
+        return [f"program_{program_id}" for program_id in program_ids]
+
+    def query(self, user_embedding, top_n, query_filter, filters):
+        return self.query_many([user_embedding], top_n, query_filter, filters)
+
+    def query_many(self, query_embeddings, top_n, query_filter, filters):
+        """Rank programs for several query vectors sharing one filter set, one result row per vector."""
+        candidate_ids = self.selective_candidates(filters)
+        if candidate_ids is not None:
+            logger.debug("query plan: exact scoring over %s candidates", len(candidate_ids))
+            return self.exact_query(query_embeddings, top_n, query_filter, ids=candidate_ids)
+
+        logger.debug("query plan: ANN search")
+        results = ChromaDBRegistry.run(
+            'program',
+            lambda collection: ann_search(collection, query_embeddings, top_n, query_filter)
+        )
+        results = {key: results[key] for key in ('ids', 'metadatas', 'distances')}
+        if query_filter and any(len(row) < top_n for row in results['ids']):
+            # Filtered HNSW search can come back short; score the matching programs exactly instead
+            exact_results = self.exact_query(query_embeddings, top_n, query_filter)
+            for row, ids in enumerate(results['ids']):
+                if len(exact_results['ids'][row]) > len(ids):
+                    for key in results:
+                        results[key][row] = exact_results[key][row]
+        return results
+
+    def exact_query(self, query_embeddings, top_n, query_filter, ids=None):
+        empty = {'ids': [[] for _ in query_embeddings], 'metadatas': [[] for _ in query_embeddings], 'distances': [[] for _ in query_embeddings]}
+        if ids == []:
+            return empty
+
+        records = ChromaDBRegistry.run(
+            'program',
+            lambda collection: collection.get(
+                ids=ids,
+                where=query_filter or None,
+                include=['embeddings', 'metadatas']
+            )
+        )
+        if len(records['ids']) == 0:
+            return empty
+
+        embeddings = np.asarray(records['embeddings'], dtype=np.float32)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # Cosine distance, matching the collections' "hnsw:space": "cosine"
+        norms = np.outer(np.linalg.norm(queries, axis=1), np.linalg.norm(embeddings, axis=1))
+        distances = 1.0 - (queries @ embeddings.T) / np.maximum(norms, 1e-12)
+        orders = np.argsort(distances, axis=1)[:, :top_n]
+        return {
+            'ids': [[records['ids'][i] for i in order] for order in orders],
+            'metadatas': [[records['metadatas'][i] for i in order] for order in orders],
+            'distances': [[float(distances[row, i]) for i in order] for row, order in enumerate(orders)],
+        }
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .chromadb_registry import ChromaDBRegistry
+
+
+class RecommendationCache:
+    """
+    Process-wide LRU cache of recommendation results.
+
+    Entries are keyed by the user, a hash of the user's stored embedding, the
+    normalized filters, top_n, the search type and the version of the target
+    collection. Re-embedding the user or re-ingesting the target collection
+    (full rebuild or incremental update) therefore produces a new key, and
+    the stale entry simply ages out.
+    """
+    _lock = threading.Lock()
+    _entries = OrderedDict()
+
+    @staticmethod
+    def normalize_filters(filters):
+        """Drop empty filters and order keys and list values so equal filter sets compare equal."""
+        normalized = {}
+        for key, value in filters.items():
+            if value is None or value == "" or value == []:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = sorted(str(item) for item in value)
+            else:
+                value = str(value)
+            normalized[key] = value
+        return json.dumps(normalized, sort_keys=True)
+
+    @staticmethod
+    def embedding_hash(embedding):
+        return hashlib.sha1(json.dumps([float(value) for value in embedding]).encode()).hexdigest()
+
+    @classmethod
+    def make_key(cls, user_id, user_embedding, filters, top_n, search_type, target_store):
+        collection_name, generation = ChromaDBRegistry.version(target_store)
+        return (user_id, cls.embedding_hash(user_embedding), cls.normalize_filters(filters), top_n, search_type, collection_name, generation)
+
+    @classmethod
+    def get(cls, key):
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > settings.RECOMMENDATION_CACHE_TTL_SECONDS:
+                del cls._entries[key]
+                return None
+            cls._entries.move_to_end(key)
+            return value
+
+    @classmethod
+    def set(cls, key, value):
+        with cls._lock:
+            cls._entries[key] = (time.monotonic(), value)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > settings.RECOMMENDATION_CACHE_MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        with cls._lock:
+            for key in [key for key in cls._entries if key[0] == user_id]:
+                del cls._entries[key]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
@@ -0,0 +1,174 @@
+import logging
+
+from services.user_data_service import UserDataService
+from .chromadb_ingest_user_data import DjangoToChromaDBIngest
+from .chromadb_registry import ChromaDBRegistry, VECTOR_STORES
+from .chunking import query_parents_many
+from .metadata_filters import ProgramMetadataSchema, compile_equality_filters, combine_conditions
+from .query_planner import ProgramQueryPlanner
+from .program_matches import ProgramMatchStore
+from .recommendation_cache import RecommendationCache
+
+logger = logging.getLogger(__name__)
+
+
+# Exact-match filters of each target collection, user filter -> metadata field
+PROGRAM_FILTER_FIELDS = {
+    'organization_name': 'organization_name',
+    'department_name': 'department_name',
+    'college_name': 'college_name',
+    'country_name': 'country_name',
+    'state_province_name': 'state_province_name',
+    'city': 'city',
+    'funding_available': 'funding_available',
+}
+
+RESEARCHER_FILTER_FIELDS = {
+    'organization_name': 'organization_name',
+    'department_name': 'department_name',
+    'college_name': 'college_name',
+    'city': 'city',
+    'funding_available': 'funding_available',
+    'funding_type': 'funding_type',
+    'funding_opportunity_for': 'funding_opportunity_for',
+}
+
+# search_type -> target store
+SEARCH_TARGETS = {
+    'universities': 'program',
+    'professors': 'researcher',
+}
+
+
+def program_where(filters):
+    # Missing requirements are stored as sentinels that satisfy any range, so
+    # each score, fee and deadline filter is a single range predicate
+    conditions = ProgramMetadataSchema.compile_range_filters(filters)
+    conditions += compile_equality_filters(filters, PROGRAM_FILTER_FIELDS)
+    return combine_conditions(conditions)
+
+
+def researcher_where(filters):
+    return combine_conditions(compile_equality_filters(filters, RESEARCHER_FILTER_FIELDS))
+
+
+def program_result(program_id, metadata, distance):
+    return {
+        'program_id': program_id,
+        'program_title': metadata['program_title'],
+        'organization_name': metadata.get('organization_name', ""),
+        'department_name': metadata.get('department_name', ""),
+        'college_name': metadata.get('college_name', ""),
+        'country_name': metadata.get('country_name', ""),
+        'state_province_name': metadata.get('state_province_name', ""),
+        'city': metadata.get('city', ""),
+        'IELTS': ProgramMetadataSchema.display_value(metadata, 'IELTS'),
+        'TOEFL': ProgramMetadataSchema.display_value(metadata, 'TOEFL'),
+        'DUOLINGO': ProgramMetadataSchema.display_value(metadata, 'DUOLINGO'),
+        'GRE': ProgramMetadataSchema.display_value(metadata, 'GRE'),
+        'CGPA': ProgramMetadataSchema.display_value(metadata, 'CGPA'),
+        'funding_available': metadata.get('funding_available', False),
+        'application_fee': ProgramMetadataSchema.display_value(metadata, 'application_fee'),
+        'application_end_date': ProgramMetadataSchema.display_value(metadata, 'application_end_date'),
+        'distance': distance  # Similarity distance score
+    }
+
+
+def researcher_result(researcher_id, metadata, distance):
+    return {
+        'user_id': researcher_id,
+        'name': metadata.get('name', ""),
+        'type': metadata.get('type', ""),
+        'organization_name': metadata.get('organization_name', ""),
+        'department_name': metadata.get('department_name', ""),
+        'college_name': metadata.get('college_name', ""),
+        'city': metadata.get('city', ""),
+        'funding_available': metadata.get('funding_available', False),
+        'funding_type': metadata.get('funding_type', ""),
+        'funding_opportunity_for': metadata.get('funding_opportunity_for', ""),
+        'distance': distance  # Similarity distance score
+    }
+
+
+def format_results(search_type, results, row=0):
+    build_result = program_result if search_type == 'universities' else researcher_result
+    return [
+        build_result(result_id, metadata, distance)
+        for result_id, metadata, distance in zip(results['ids'][row], results['metadatas'][row], results['distances'][row])
+    ]
+
+
+def get_student_record(user):
+    """
+    Return the stored vector record of student `user`.
+
+    A student who registered after the last ingest has no vector yet; their
+    document is built and embedded on the spot and upserted into the active
+    student collection, so the first request already gets recommendations.
+    """
+    embedding_id = f"{user.id}"
+    fetch = lambda collection: collection.get(embedding_id, include=['embeddings', 'documents', 'metadatas'])
+    record = ChromaDBRegistry.run('student', fetch)
+    if record['ids']:
+        return record
+
+    flat_user = UserDataService(user.id).get_flat_user_data()
+    if not flat_user['user_main']:
+        raise ValueError(f"User {user.id} has no profile data to recommend from.")
+    logger.info("embedding student %s on demand", user.id)
+    ingestor = DjangoToChromaDBIngest(output_path=VECTOR_STORES['student']['path'])
+    student_record = ingestor.build_student_record(flat_user)
+    ChromaDBRegistry.run('student', lambda collection: ingestor.write_batches(collection, [student_record]))
+    return ChromaDBRegistry.run('student', fetch)
+
+
+def get_user_embeddings(user_ids):
+    """Return {user id: embedding} of the students in `user_ids` that have a vector, in one `get`."""
+    records = ChromaDBRegistry.run(
+        'student',
+        lambda collection: collection.get(ids=[str(user_id) for user_id in user_ids], include=['embeddings'])
+    )
+    return {int(record_id): embedding for record_id, embedding in zip(records['ids'], records['embeddings'])}
+
+
+def batch_recommend(user_ids, search_type, filters_by_user, top_n=10):
+    """
+    Recommendations for many students at once.
+
+    All student vectors are read with one `get`, students are grouped by
+    their normalized filters and each group is answered with one
+    multi-vector query. Cached results are reused per student. Returns
+    {user id: recommendations}; students without a vector map to None.
+    """
+    store = SEARCH_TARGETS[search_type]
+    embeddings = get_user_embeddings(user_ids)
+    recommendations = {user_id: None for user_id in user_ids}
+
+    groups = {}
+    for user_id, embedding in embeddings.items():
+        filters = filters_by_user.get(user_id, {})
+        cache_key = RecommendationCache.make_key(user_id, embedding, filters, top_n, search_type, store)
+        cached = RecommendationCache.get(cache_key)
+        if cached is None and search_type == 'universities':
+            materialized = ProgramMatchStore.query(user_id, embedding, program_where(filters), top_n)
+            cached = format_results(search_type, materialized) if materialized is not None else None
+        if cached is not None:
+            recommendations[user_id] = cached
+            continue
+        group = groups.setdefault(RecommendationCache.normalize_filters(filters), {'filters': filters, 'users': []})
+        group['users'].append((user_id, embedding, cache_key))
+
+    for group in groups.values():
+        filters = group['filters']
+        query_embeddings = [embedding for _, embedding, _ in group['users']]
+        if search_type == 'universities':
+            results = ProgramQueryPlanner().query_many(query_embeddings, top_n, program_where(filters), filters)
+        else:
+            results = ChromaDBRegistry.run(
+                store,
+                lambda collection: query_parents_many(collection, query_embeddings, top_n, where=researcher_where(filters))
+            )
+        for row, (user_id, _, cache_key) in enumerate(group['users']):
+            recommendations[user_id] = format_results(search_type, results, row)
+            RecommendationCache.set(cache_key, recommendations[user_id])
+    return recommendations
@@ -0,0 +1,182 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import ResearcherStudentMatch
+from .chromadb_registry import ChromaDBRegistry
+from .chunking import query_parents_many
+from .recommendation_cache import RecommendationCache
+
+logger = logging.getLogger(__name__)
+
+# Student id of the row stored for a researcher no student matches, so the
+# empty result is current like any other and not recomputed on every view
+NO_MATCHES = 0
+
+
+def get_researcher_embeddings(user_ids):
+    """Return {user id: profile embedding} of the researchers in `user_ids` that have a vector, in one `get`."""
+    records = ChromaDBRegistry.run(
+        'researcher',
+        lambda collection: collection.get(ids=[str(user_id) for user_id in user_ids], include=['embeddings'])
+    )
+    return {int(record_id): embedding for record_id, embedding in zip(records['ids'], records['embeddings'])}
+
+
+def student_result(student_id, metadata, distance):
+    first_name = metadata.get('first_name', "")
+    last_name = metadata.get('last_name', "")
+    return {
+        'user_id': student_id,
+        'name': f"{first_name} {last_name}".strip(),
+        'distance': distance  # Similarity distance score
+    }
+
+
+class StudentMatchStore:
+    """
+    Materialized top-K student matches per researcher, the reverse of `recommend_researchers`.
+
+    `materialize` ranks the students' passage vectors against each
+    researcher's profile vector (aggregated per student like the forward
+    direction) and stores the best STUDENT_MATCHES_TOP_K, tagged with the
+    researcher vector and the student collection version they were computed
+    from; the scheduled `materialize_student_matches` run recomputes the
+    researchers whose tag changed. `matches` pages through the stored rows,
+    so a dashboard view costs two small reads. Student edits between runs
+    do not invalidate them; when the researcher's own vector changed or the
+    rows are older than STUDENT_MATCHES_MAX_AGE_SECONDS they are still
+    served while a background refresh runs. A researcher without any rows
+    gets an empty page while the first computation runs in the background.
+    Refreshes run on a bounded pool, at most one per researcher.
+    """
+    _refreshing = set()
+    _refreshing_lock = threading.Lock()
+    _executor = None
+
+    @staticmethod
+    def version_tag(embedding):
+        collection_name, generation = ChromaDBRegistry.version('student')
+        return f"{RecommendationCache.embedding_hash(embedding)}:{collection_name}:{generation}"
+
+    @staticmethod
+    def needs_refresh(version, computed_at, embedding):
+        max_age = timedelta(seconds=settings.STUDENT_MATCHES_MAX_AGE_SECONDS)
+        return (version.split(':')[0] != RecommendationCache.embedding_hash(embedding)
+                or timezone.now() - computed_at > max_age)
+
+    @classmethod
+    def executor(cls):
+        if cls._executor is None:
+            with cls._refreshing_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=settings.STUDENT_MATCHES_REFRESH_WORKERS,
+                        thread_name_prefix='student-matches'
+                    )
+        return cls._executor
+
+    @classmethod
+    def refresh_in_background(cls, researcher_id, embedding):
+        """Queue a recomputation of the matches of `researcher_id`, unless one is already queued or running."""
+        with cls._refreshing_lock:
+            if researcher_id in cls._refreshing:
+                return
+            cls._refreshing.add(researcher_id)
+
+        def refresh():
+            try:
+                cls.materialize({researcher_id: embedding}, force=True)
+            except Exception:
+                logger.exception("failed to refresh the student matches of researcher %s", researcher_id)
+            finally:
+                with cls._refreshing_lock:
+                    cls._refreshing.discard(researcher_id)
+                # The pool thread's own database connection
+                connection.close()
+
+        cls.executor().submit(refresh)
+
+    @classmethod
+    def materialize(cls, embeddings, top_k=None, force=False):
+        """
+        Recompute the matches of {researcher id: embedding}; returns the number of researchers updated.
+
+        Researchers whose stored matches are still current are skipped unless `force`.
+        """
+        top_k = top_k or settings.STUDENT_MATCHES_TOP_K
+        tags = {user_id: cls.version_tag(embedding) for user_id, embedding in embeddings.items()}
+        if not force:
+            current = set(
+                ResearcherStudentMatch.objects.filter(researcher_id__in=tags.keys(), rank=0)
+                .values_list('researcher_id', 'version')
+            )
+            tags = {user_id: tag for user_id, tag in tags.items() if (user_id, tag) not in current}
+        if not tags:
+            return 0
+
+        user_ids = list(tags.keys())
+        results = ChromaDBRegistry.run(
+            'student',
+            lambda collection: query_parents_many(collection, [embeddings[user_id] for user_id in user_ids], top_k)
+        )
+        matches = [
+            ResearcherStudentMatch(
+                researcher_id=user_id,
+                student_id=int(student_id),
+                rank=rank,
+                distance=distance,
+                version=tags[user_id]
+            )
+            for user_id, ids, distances in zip(user_ids, results['ids'], results['distances'])
+            for rank, (student_id, distance) in enumerate(zip(ids, distances))
+        ]
+        matched = {match.researcher_id for match in matches}
+        matches += [
+            ResearcherStudentMatch(researcher_id=user_id, student_id=NO_MATCHES, rank=0, distance=0.0, version=tags[user_id])
+            for user_id in user_ids if user_id not in matched
+        ]
+        with transaction.atomic():
+            ResearcherStudentMatch.objects.filter(researcher_id__in=user_ids).delete()
+            ResearcherStudentMatch.objects.bulk_create(matches, batch_size=1000)
+        return len(user_ids)
+
+    @classmethod
+    def matches(cls, researcher_id, top_n=10, offset=0):
+        """
+        Return one page of the best-fit students of `researcher_id`.
+
+        Raises ValueError if the researcher has no vector yet.
+        """
+        embedding = get_researcher_embeddings([researcher_id]).get(researcher_id)
+        if embedding is None:
+            raise ValueError(f"User {researcher_id} has no researcher profile to match students against.")
+
+        stored = ResearcherStudentMatch.objects.filter(researcher_id=researcher_id)
+        latest = stored.filter(rank=0).values_list('version', 'computed_at').first()
+        if latest is None:
+            # Never computed: serve an empty page rather than an ANN search inside the request
+            cls.refresh_in_background(researcher_id, embedding)
+            return []
+        if cls.needs_refresh(latest[0], latest[1], embedding):
+            cls.refresh_in_background(researcher_id, embedding)
+
+        matches = list(stored.exclude(student_id=NO_MATCHES).values_list('student_id', 'distance')[offset:offset + top_n])
+        if not matches:
+            return []
+        records = ChromaDBRegistry.run(
+            'student',
+            lambda collection: collection.get(ids=[str(student_id) for student_id, _ in matches], include=['metadatas'])
+        )
+        metadata_by_id = dict(zip(records['ids'], records['metadatas']))
+        return [
+            student_result(student_id, metadata_by_id[str(student_id)], distance)
+            for student_id, distance in matches
+            # Students removed since the matches were computed are skipped
+            if str(student_id) in metadata_by_id
+        ]
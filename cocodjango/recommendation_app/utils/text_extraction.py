@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .text_loader_from_file import TextLoader
+
+
+def extract_text(file_path, timeout):
+    """Pool worker entry point: extract one file, giving up after `timeout` seconds."""
+    def on_timeout(signum, frame):
+        raise TimeoutError(f"extracting {file_path} took longer than {timeout}s")
+
+    # Tasks run on the worker's main thread, so an alarm can interrupt a stuck PDF parse or OCR run
+    previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.alarm(timeout)
+    try:
+        return TextLoader.get_text_from_file(file_path) or ""
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+class TextExtractionPool:
+    """
+    Resume and SOP text extraction in a bounded pool of worker processes.
+
+    Ingest submits the files of the next batch while the current batch is
+    embedded, so PDF parsing and OCR run on every core ahead of the model
+    instead of serially inside the ingest loop. Each file gets
+    TEXT_EXTRACTION_TIMEOUT_SECONDS; `result` raises on failure or timeout
+    and the caller skips the file. Workers are spawned rather than forked,
+    so they never inherit the parent's database connections or torch state.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, workers=None, timeout=None):
+        self.workers = workers or settings.TEXT_EXTRACTION_WORKERS or os.cpu_count() or 1
+        self.timeout = timeout or settings.TEXT_EXTRACTION_TIMEOUT_SECONDS
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def submit(self, file_path):
+        """Start extracting `file_path` in the background."""
+        with self._lock:
+            if file_path not in self._futures:
+                self._futures[file_path] = self.executor().submit(extract_text, file_path, self.timeout)
+
+    def result(self, file_path):
+        """Return the text of `file_path`, submitting it first if needed; raises if extraction fails or times out."""
+        self.submit(file_path)
+        with self._lock:
+            future = self._futures.pop(file_path)
+        try:
+            # The worker enforces the timeout itself; this only guards against a worker that stopped responding
+            return future.result(timeout=self.timeout + 30)
+        except FutureTimeoutError:
+            raise TimeoutError(f"extracting {file_path} took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker crashed (e.g. on a malformed file); start a fresh pool for the remaining files
+            self.shutdown()
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._futures.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
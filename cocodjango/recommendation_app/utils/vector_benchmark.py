@@ -0,0 +1,16 @@
+import numpy as np
+
+from .chromadb_registry import ChromaDBRegistry
+
+
+def load_vectors(store, limit=None, page_size=1000):
+    """Return up to `limit` vectors of `store`'s active collection as a float32 matrix, read page by page."""
+    collection = ChromaDBRegistry.get_collection(store)
+    vectors, offset = [], 0
+    while limit is None or len(vectors) < limit:
+        page = collection.get(limit=page_size, offset=offset, include=['embeddings'])
+        if not page['ids']:
+            break
+        vectors += list(page['embeddings'])
+        offset += len(page['ids'])
+    return np.asarray(vectors[:limit], dtype=np.float32)
@@ -0,0 +1,194 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from program_app.models import Program
+from profile_app.models import UserDetails
+from services.user_data_service import UserDataService
+from services.researcher_data_service import ResearcherDataService
+from ..models import VectorIndexUpdate
+from .chromadb_registry import ChromaDBRegistry, VECTOR_STORES
+from .collection_versions import CollectionVersions
+from .program_search import ProgramLexicalIndex
+from .chunking import delete_parents
+from .chromadb_ingest_user_data import DjangoToChromaDBIngest, RESEARCH_ROLES
+from .vector_index_updates import mark_dirty
+
+logger = logging.getLogger(__name__)
+
+class VectorIndexUpdater:
+    """
+    Applies queued `VectorIndexUpdate` entries to the vector stores.
+
+    Only the marked programs and users are rebuilt: existing objects are
+    re-embedded and upserted, deleted or soft-deleted ones are removed from
+    their collections. Entries are processed once they have been quiet for
+    the debounce window, so a burst of saves costs one re-embedding. An
+    object whose record cannot be built is logged and retried after
+    VECTOR_INDEX_RETRY_SECONDS; the rest of its batch is still applied.
+
+    `stores` limits the collections written. With `defer_refresh` the
+    collection generation is only bumped by `finish`, once per store
+    instead of once per call.
+    """
+
+    TARGET_STORES = {
+        VectorIndexUpdate.PROGRAM: ['program'],
+        VectorIndexUpdate.USER: ['researcher', 'student'],
+    }
+
+    def __init__(self, debounce_seconds=None, batch_size=None, stores=None, defer_refresh=False):
+        self.debounce_seconds = settings.VECTOR_INDEX_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        self.stores = set(stores or VECTOR_STORES)
+        self.ingestors = {
+            store: DjangoToChromaDBIngest(output_path=config['path'], batch_size=batch_size)
+            for store, config in VECTOR_STORES.items()
+        }
+        self.defer_refresh = defer_refresh
+        self.touched_stores = set()
+        self._touched_lock = threading.Lock()
+
+    def pending_updates(self, limit=500):
+        cutoff = timezone.now() - timedelta(seconds=self.debounce_seconds)
+        updates = VectorIndexUpdate.objects.filter(marked_at__lte=cutoff)
+        # Changes made while a collection is rebuilt wait for the new version,
+        # otherwise they would be written to the one about to be replaced
+        for target, stores in self.TARGET_STORES.items():
+            if any(CollectionVersions.is_building(VECTOR_STORES[store]['collection']) for store in stores):
+                updates = updates.exclude(target=target)
+        return list(updates.order_by('marked_at')[:limit])
+
+    def process_pending(self, limit=500):
+        updates = self.pending_updates(limit)
+        program_ids = [update.object_id for update in updates if update.target == VectorIndexUpdate.PROGRAM]
+        user_ids = [update.object_id for update in updates if update.target == VectorIndexUpdate.USER]
+
+        counts = {'upserted': 0, 'deleted': 0}
+        failed = set()
+        if program_ids:
+            self.merge_counts(counts, self.update_programs(program_ids, failed))
+        if user_ids:
+            self.merge_counts(counts, self.update_users(user_ids, failed))
+
+        # Keep entries that were marked again while we were processing them
+        retry_at = timezone.now() + timedelta(seconds=settings.VECTOR_INDEX_RETRY_SECONDS)
+        for update in updates:
+            entry = VectorIndexUpdate.objects.filter(id=update.id, marked_at=update.marked_at)
+            if (update.target, update.object_id) in failed:
+                # Back off instead of retrying the failing object on every poll
+                entry.update(marked_at=retry_at)
+            else:
+                entry.delete()
+        counts['processed'] = len(updates) - len(failed)
+        counts['failed'] = len(failed)
+        return counts
+
+    @staticmethod
+    def merge_counts(counts, other):
+        for key, value in other.items():
+            counts[key] = counts.get(key, 0) + value
+
+    @staticmethod
+    def record_failure(failed, target, object_id):
+        """Log an object whose record could not be built; without a `failed` set it goes back on the queue."""
+        logger.exception("could not build the vector record of %s %s", target, object_id)
+        if failed is None:
+            mark_dirty(target, [object_id])
+        else:
+            failed.add((target, object_id))
+
+    def update_programs(self, program_ids, failed=None):
+        ingestor = self.ingestors['program']
+        programs = list(Program.objects.filter(id__in=program_ids))
+        live_ids = {program.id for program in programs}
+        removed_ids = [f"program_{program_id}" for program_id in program_ids if program_id not in live_ids]
+
+        records = []
+        for program in programs:
+            try:
+                records.append(ingestor.build_program_record(program))
+            except Exception:
+                self.record_failure(failed, VectorIndexUpdate.PROGRAM, program.id)
+        # Keep the keyword index in step with the vectors
+        ProgramLexicalIndex.update(program_ids)
+        return self.apply('program', records, removed_ids)
+
+    def update_users(self, user_ids, failed=None):
+        details = UserDetails.objects.filter(user_id__in=user_ids).values('user_id', 'user_type')
+        user_types = {row['user_id']: row['user_type'] for row in details}
+        # Only build the records of the stores this updater writes
+        student_ids = set()
+        if 'student' in self.stores:
+            student_ids = set(
+                User.objects.filter(id__in=user_types.keys(), groups__name='Student').values_list('id', flat=True)
+            )
+
+        researchers = {}
+        if 'researcher' in self.stores:
+            researchers = ResearcherDataService.for_users(
+                [user_id for user_id, user_type in user_types.items() if user_type in RESEARCH_ROLES]
+            )
+
+        researcher_records, student_records = [], []
+        removed = {'researcher': [], 'student': []}
+        for user_id in user_ids:
+            try:
+                researcher_record, student_record = self.build_user_records(user_id, researchers, student_ids)
+            except Exception:
+                self.record_failure(failed, VectorIndexUpdate.USER, user_id)
+                continue
+            if researcher_record is not None:
+                researcher_records.append(researcher_record)
+            else:
+                removed['researcher'].append(str(user_id))
+            if student_record is not None:
+                student_records.append(student_record)
+            else:
+                removed['student'].append(str(user_id))
+
+        counts = self.apply('researcher', researcher_records, removed['researcher'])
+        self.merge_counts(counts, self.apply('student', student_records, removed['student']))
+        return counts
+
+    def build_user_records(self, user_id, researchers, student_ids):
+        """Return the researcher and student records of a user, None where the user is not (or no longer) one."""
+        researcher_record = student_record = None
+        if user_id in researchers:
+            flat_user = researchers[user_id].get_flat_user_data()
+            if flat_user['user_main']:
+                researcher_record = self.ingestors['researcher'].build_researcher_record(flat_user)
+        if user_id in student_ids:
+            flat_user = UserDataService(user_id).get_flat_user_data()
+            if flat_user['user_main']:
+                student_record = self.ingestors['student'].build_student_record(flat_user)
+        return researcher_record, student_record
+
+    def apply(self, store, records, removed_ids):
+        if store not in self.stores:
+            return {'upserted': 0, 'deleted': 0}
+        ingestor = self.ingestors[store]
+        upserted = ChromaDBRegistry.run(store, lambda collection: ingestor.write_batches(collection, records))
+        if removed_ids:
+            ChromaDBRegistry.run(store, lambda collection: delete_parents(collection, removed_ids))
+        if self.defer_refresh:
+            with self._touched_lock:
+                self.touched_stores.add(store)
+        else:
+            self.refresh(store)
+        return {'upserted': upserted, 'deleted': len(removed_ids)}
+
+    @staticmethod
+    def refresh(store):
+        # Cached recommendations against this store are stale now
+        CollectionVersions.bump_generation(VECTOR_STORES[store]['collection'])
+
+    def finish(self):
+        """Refresh the stores written since the last call when refreshes are deferred."""
+        with self._touched_lock:
+            stores, self.touched_stores = self.touched_stores, set()
+        for store in stores:
+            self.refresh(store)
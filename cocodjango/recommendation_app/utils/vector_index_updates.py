@@ -0,0 +1,25 @@
+from django.utils import timezone
+
+from ..models import VectorIndexUpdate
+
+
+def mark_dirty(target, object_ids):
+    """Queue `object_ids` for re-indexing; repeated marks only move the debounce window."""
+    now = timezone.now()
+    VectorIndexUpdate.objects.bulk_create(
+        [
+            VectorIndexUpdate(target=target, object_id=object_id, marked_at=now)
+            for object_id in set(object_ids) if object_id is not None
+        ],
+        update_conflicts=True,
+        update_fields=['marked_at'],
+        unique_fields=['target', 'object_id'],
+    )
+
+
+def mark_programs_dirty(program_ids):
+    mark_dirty(VectorIndexUpdate.PROGRAM, program_ids)
+
+
+def mark_users_dirty(user_ids):
+    mark_dirty(VectorIndexUpdate.USER, user_ids)
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+QUANTIZATION_MODES = ['none', 'int8', 'binary']
+
+
+def truncate(vectors, dimensions):
+    """Matryoshka truncation: keep the first `dimensions` components and renormalize."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions:
+        vectors = vectors[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors, mode):
+    """Return (codes, scales) of float `vectors`; scales is None for binary codes."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == 'binary':
+        return np.packbits(vectors > 0, axis=1), None
+    # Symmetric per-vector int8 scaling
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def approximate_scores(codes, scales, queries, mode):
+    """Similarity of every query to every coded vector; higher is closer."""
+    queries = np.asarray(queries, dtype=np.float32)
+    if mode == 'binary':
+        query_codes = np.packbits(queries > 0, axis=1)
+        # Negative Hamming distance via a per-byte popcount table, signed so the negation cannot wrap
+        popcount = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int32)
+        return -np.stack([popcount[np.bitwise_xor(codes, query_code)].sum(axis=1) for query_code in query_codes])
+    return (queries @ codes.T.astype(np.float32)) * scales[None, :]
+
+
+def code_bytes(dimensions, mode):
+    if mode == 'binary':
+        return (dimensions + 7) // 8
+    if mode == 'int8':
+        return dimensions + 4
+    return dimensions * 4
+
@@ -0,0 +1,571 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import chromadb
+import numpy as np
+from django.conf import settings
+
+from .metadata_filters import COMPARISONS
+from .vector_quantization import approximate_scores, quantize
+
+
+class VectorStore(ABC):
+    """
+    A vector collection: the part of the ChromaDB `Collection` API the app uses.
+
+    `get` and `query` take and return the same arguments and result dicts as
+    ChromaDB, so ingest and recommendation code is written once against this
+    interface and each collection picks its backend (VECTOR_STORE_BACKENDS).
+    A backend missing one of the abstract methods fails when it is created.
+    """
+    name = None
+
+    @abstractmethod
+    def count(self):
+        pass
+
+    @abstractmethod
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        pass
+
+    def peek(self, limit=10):
+        return self.get(limit=limit, include=['embeddings', 'documents', 'metadatas'])
+
+    @abstractmethod
+    def query(self, query_embeddings=None, n_results=10, where=None, include=None, query_texts=None):
+        pass
+
+    @abstractmethod
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        pass
+
+    @abstractmethod
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        pass
+
+    @abstractmethod
+    def delete(self, ids=None, where=None):
+        pass
+
+
+def chroma_arguments(**kwargs):
+    # Leave out unset arguments so ChromaDB applies its own defaults (e.g. `include`)
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+class ChromaVectorStore(VectorStore):
+    """`VectorStore` backed by a ChromaDB collection and its HNSW index."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.metadata = collection.metadata
+
+    def count(self):
+        return self.collection.count()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        return self.collection.get(ids, **chroma_arguments(where=where, limit=limit, offset=offset, include=include))
+
+    def peek(self, limit=10):
+        return self.collection.peek(limit=limit)
+
+    def query(self, query_embeddings=None, n_results=10, where=None, include=None, query_texts=None):
+        return self.collection.query(**chroma_arguments(
+            query_embeddings=query_embeddings,
+            query_texts=query_texts,
+            n_results=n_results,
+            where=where,
+            include=include
+        ))
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.add(**chroma_arguments(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas))
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.upsert(**chroma_arguments(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas))
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(**chroma_arguments(ids=ids, where=where))
+
+
+class ChromaVectorStoreClient:
+    def __init__(self, path):
+        self.client = chromadb.PersistentClient(path=path)
+
+    def get_collection(self, name, embedding_function=None):
+        return ChromaVectorStore(self.client.get_collection(name=name, embedding_function=embedding_function))
+
+    def create_collection(self, name, metadata=None, embedding_function=None):
+        return ChromaVectorStore(self.client.create_collection(name=name, metadata=metadata, embedding_function=embedding_function))
+
+    def delete_collection(self, name):
+        self.client.delete_collection(name=name)
+
+    def list_collections(self):
+        return [ChromaVectorStore(collection) for collection in self.client.list_collections()]
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+NUMERIC_COMPARISONS = {
+    '$eq': np.equal,
+    '$ne': np.not_equal,
+    '$gt': np.greater,
+    '$gte': np.greater_equal,
+    '$lt': np.less,
+    '$lte': np.less_equal,
+}
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class NumpySegment:
+    """One immutable write of a `NumpyVectorStore`: vectors, their codes if quantized, ids and metadatas, documents read on demand."""
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.vectors = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        self.codes = self.load_optional(f"{name}.codes.npy")
+        self.scales = self.load_optional(f"{name}.scales.npy")
+        with open(os.path.join(directory, f"{name}.json")) as records_file:
+            records = json.load(records_file)
+        self.ids = records['ids']
+        self.metadatas = records['metadatas']
+        self._documents = None
+
+    def load_optional(self, filename):
+        path = os.path.join(self.directory, filename)
+        return np.load(path, mmap_mode='r') if os.path.exists(path) else None
+
+    @property
+    def documents(self):
+        if self._documents is None:
+            with open(os.path.join(self.directory, f"{self.name}.documents.json")) as documents_file:
+                self._documents = json.load(documents_file)
+        return self._documents
+
+
+class NumpySnapshot:
+    """The live rows of a `NumpyVectorStore` at one state, with column-wise metadata for filtering."""
+
+    def __init__(self, segments, deleted):
+        self.segments = segments
+        self.ids, self.metadatas, segment_of, row_of = [], [], [], []
+        for segment_index, segment in enumerate(segments):
+            dead = set(deleted.get(segment.name, []))
+            for row, record_id in enumerate(segment.ids):
+                if row in dead:
+                    continue
+                self.ids.append(record_id)
+                self.metadatas.append(segment.metadatas[row])
+                segment_of.append(segment_index)
+                row_of.append(row)
+        self.segment_of = np.asarray(segment_of, dtype=np.int32)
+        self.row_of = np.asarray(row_of, dtype=np.int64)
+        self.position = {record_id: position for position, record_id in enumerate(self.ids)}
+        self.dimensions = segments[0].vectors.shape[1] if segments else 0
+        self._columns = {}
+
+    def column(self, field):
+        column = self._columns.get(field)
+        if column is None:
+            values = [(metadata or {}).get(field) for metadata in self.metadatas]
+            present = [value for value in values if value is not None]
+            if present and all(is_number(value) for value in present):
+                column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self._columns[field] = column
+        return column
+
+    def compare(self, field, operator, operand):
+        column = self.column(field)
+        if column.dtype != object:
+            if operator in NUMERIC_COMPARISONS and is_number(operand):
+                with np.errstate(invalid='ignore'):
+                    return NUMERIC_COMPARISONS[operator](column, operand)
+            if operator in ('$in', '$nin') and all(is_number(value) for value in operand):
+                found = np.isin(column, operand)
+                return found if operator == '$in' else ~found
+            values = [None if np.isnan(value) else value for value in column.tolist()]
+        else:
+            values = column.tolist()
+        if operator in ('$in', '$nin'):
+            operand_set = set(operand)
+            found = np.fromiter((value in operand_set for value in values), dtype=bool, count=len(values))
+            return found if operator == '$in' else ~found
+
+        # Other comparisons row by row, with the semantics of `matches_where`
+        def matches(value):
+            try:
+                return bool(COMPARISONS[operator](value, operand))
+            except TypeError:
+                return False
+        return np.fromiter((matches(value) for value in values), dtype=bool, count=len(values))
+
+    def mask(self, where):
+        """Boolean mask of the rows matching a ChromaDB `where` clause."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in (where or {}).items():
+            if key == '$and':
+                for clause in condition:
+                    mask &= self.mask(clause)
+            elif key == '$or':
+                mask &= np.logical_or.reduce([self.mask(clause) for clause in condition]) if condition else False
+            else:
+                if not isinstance(condition, dict):
+                    condition = {'$eq': condition}
+                for operator, operand in condition.items():
+                    mask &= self.compare(key, operator, operand)
+        return mask
+
+    def by_segment(self, positions):
+        """Yield (segment, indices into `positions`, segment rows) for each segment holding some of `positions`."""
+        segment_of = self.segment_of[positions]
+        for segment_index, segment in enumerate(self.segments):
+            selected = np.flatnonzero(segment_of == segment_index)
+            if len(selected):
+                yield segment, selected, self.row_of[positions[selected]]
+
+    def scores(self, queries, positions):
+        """Cosine similarity of each normalized query to the rows at `positions`."""
+        scores = np.empty((len(queries), len(positions)), dtype=np.float32)
+        for segment, selected, rows in self.by_segment(positions):
+            # A full scan reads the memory-mapped segment in place instead of copying it
+            matrix = segment.vectors if len(rows) == len(segment.vectors) else segment.vectors[rows]
+            scores[:, selected] = queries @ matrix.T
+        return scores
+
+    def approximate_scores(self, queries, positions, mode):
+        """Similarity of each normalized query to the rows at `positions` from their codes alone."""
+        scores = np.empty((len(queries), len(positions)), dtype=np.float32)
+        for segment, selected, rows in self.by_segment(positions):
+            if len(rows) == len(segment.ids):
+                codes, scales = segment.codes, segment.scales
+            else:
+                codes = segment.codes[rows]
+                scales = segment.scales[rows] if segment.scales is not None else None
+            scores[:, selected] = approximate_scores(codes, scales, queries, mode)
+        return scores
+
+    def records(self, positions, include):
+        records = {
+            'ids': [self.ids[position] for position in positions],
+            'embeddings': None,
+            'documents': None,
+            'metadatas': None,
+        }
+        if 'embeddings' in include:
+            records['embeddings'] = [
+                np.asarray(self.segments[self.segment_of[position]].vectors[self.row_of[position]], dtype=np.float32)
+                for position in positions
+            ]
+        if 'documents' in include:
+            records['documents'] = [
+                self.segments[self.segment_of[position]].documents[self.row_of[position]]
+                for position in positions
+            ]
+        if 'metadatas' in include:
+            records['metadatas'] = [self.metadatas[position] for position in positions]
+        return records
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact cosine search over memory-mapped float32 matrices.
+
+    Meant for collections below a few hundred thousand vectors, where a
+    brute-force matrix product with `argpartition` is faster than HNSW and
+    returns exact neighbours. Every write appends an immutable segment
+    (normalized vectors as .npy, ids and metadatas as .json) and atomically
+    replaces state.json, which lists the segments and their deleted rows;
+    segments of similar size are merged, so a collection holds O(log n) of
+    them. Segments are memory-mapped read-only, so all gunicorn workers share
+    one page-cached copy. Metadata is kept column-wise for vectorized `where`
+    filtering. Writers serialize on a file lock and readers reload when
+    state.json changes.
+
+    A collection created with "numpy:quantization" metadata ('int8' or
+    'binary') also writes int8 or sign-bit codes of each segment. Queries scan
+    the codes and re-score the best n_results * VECTOR_RESCORE_FACTOR
+    candidates with their float rows, so the float matrices stay on disk and
+    only the candidates' pages are read. Codes are written with their segment,
+    so an upsert codes only the ids it wrote.
+    """
+
+    def __init__(self, directory, embedding_function=None):
+        self.directory = directory
+        self.name = os.path.basename(directory)
+        self.embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._segments = {}
+        self._state_key = None
+        self._snapshot = None
+        self.metadata = self.read_state().get('metadata', {})
+        self.quantization = self.metadata.get('numpy:quantization', 'none')
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def read_state(self):
+        with open(self.path('state.json')) as state_file:
+            return json.load(state_file)
+
+    def write_state(self, state):
+        staging = self.path(f"state.json.{os.getpid()}.tmp")
+        with open(staging, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(staging, self.path('state.json'))
+
+    def load(self, state):
+        segments = []
+        for name in state['segments']:
+            segment = self._segments.get(name)
+            if segment is None:
+                segment = NumpySegment(self.directory, name)
+            segments.append(segment)
+        self._segments = {segment.name: segment for segment in segments}
+        return NumpySnapshot(segments, state['deleted'])
+
+    def snapshot(self):
+        """Return the snapshot of the current state, reloading it if another process wrote since."""
+        for attempt in range(3):
+            stat = os.stat(self.path('state.json'))
+            state_key = (stat.st_ino, stat.st_mtime_ns)
+            if state_key == self._state_key:
+                return self._snapshot
+            with self._lock:
+                try:
+                    self._snapshot = self.load(self.read_state())
+                    self._state_key = state_key
+                    return self._snapshot
+                except FileNotFoundError:
+                    # A concurrent merge removed a segment between reading state.json and loading it
+                    continue
+        raise ValueError(f"Collection {self.name} changed while it was being loaded")
+
+    @contextmanager
+    def write_lock(self):
+        """Hold the collection's file lock; yields the current state and snapshot."""
+        with self._lock, open(self.path('.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self.read_state()
+                yield state, self.load(state)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def count(self):
+        return len(self.snapshot().ids)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        include = ['metadatas', 'documents'] if include is None else include
+        snapshot = self.snapshot()
+        if ids is None:
+            positions = np.arange(len(snapshot.ids))
+        else:
+            ids = [ids] if isinstance(ids, str) else ids
+            positions = np.asarray([snapshot.position[record_id] for record_id in dict.fromkeys(ids) if record_id in snapshot.position], dtype=np.int64)
+        if where:
+            positions = positions[snapshot.mask(where)[positions]]
+        offset = offset or 0
+        positions = positions[offset:offset + limit] if limit is not None else positions[offset:]
+        return {**snapshot.records(positions.tolist(), include), 'distances': None, 'included': include}
+
+    def query(self, query_embeddings=None, n_results=10, where=None, include=None, query_texts=None):
+        include = ['metadatas', 'documents', 'distances'] if include is None else include
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        snapshot = self.snapshot()
+        queries = normalize_rows(query_embeddings)
+        positions = np.flatnonzero(snapshot.mask(where)) if where else np.arange(len(snapshot.ids))
+
+        results = {'ids': [], 'embeddings': [], 'documents': [], 'metadatas': [], 'distances': []}
+        k = min(n_results, len(positions))
+        scores = candidates = None
+        if k and self.quantization != 'none':
+            n_candidates = min(k * settings.VECTOR_RESCORE_FACTOR, len(positions))
+            approximate = snapshot.approximate_scores(queries, positions, self.quantization)
+            candidates = np.argpartition(-approximate, n_candidates - 1, axis=1)[:, :n_candidates]
+        elif k:
+            scores = snapshot.scores(queries, positions)
+        for row in range(len(queries)):
+            order, row_positions, row_scores = [], positions, None
+            if k:
+                if candidates is not None:
+                    # Re-score with float vectors, reading only the candidates' rows
+                    row_positions = positions[candidates[row]]
+                    row_scores = snapshot.scores(queries[row:row + 1], row_positions)[0]
+                else:
+                    row_scores = scores[row]
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                order = top[np.argsort(-row_scores[top])]
+            records = snapshot.records(row_positions[order].tolist() if k else [], include)
+            for key in ('ids', 'embeddings', 'documents', 'metadatas'):
+                results[key].append(records[key])
+            results['distances'].append([float(1.0 - row_scores[i]) for i in order])
+        for key in ('embeddings', 'documents', 'metadatas', 'distances'):
+            if key not in include:
+                results[key] = None
+        return {**results, 'included': include}
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        # Like ChromaDB, ids that already exist are left unchanged
+        self.write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.write(ids, embeddings, documents, metadatas, replace=True)
+
+    def delete(self, ids=None, where=None):
+        with self.write_lock() as (state, snapshot):
+            positions = np.arange(len(snapshot.ids))
+            if ids is not None:
+                positions = np.asarray([snapshot.position[record_id] for record_id in ids if record_id in snapshot.position], dtype=np.int64)
+            if where:
+                positions = positions[snapshot.mask(where)[positions]]
+            self.mark_deleted(state, snapshot, positions)
+            self.write_state(state)
+
+    def mark_deleted(self, state, snapshot, positions):
+        for position in positions:
+            segment = snapshot.segments[snapshot.segment_of[position]]
+            state['deleted'].setdefault(segment.name, []).append(int(snapshot.row_of[position]))
+
+    def write(self, ids, embeddings, documents, metadatas, replace):
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        vectors = normalize_rows(embeddings)
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+
+        with self.write_lock() as (state, snapshot):
+            if snapshot.dimensions and vectors.shape[1] != snapshot.dimensions:
+                raise ValueError(f"{self.name} holds {snapshot.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+            # The last occurrence of an id within one call wins
+            latest = {record_id: row for row, record_id in enumerate(ids)}
+            if replace:
+                self.mark_deleted(state, snapshot, [snapshot.position[record_id] for record_id in latest if record_id in snapshot.position])
+            else:
+                latest = {record_id: row for record_id, row in latest.items() if record_id not in snapshot.position}
+            if latest:
+                rows = list(latest.values())
+                name = self.write_segment(list(latest), vectors[rows], [documents[row] for row in rows], [metadatas[row] for row in rows])
+                state['segments'].append(name)
+                state['sizes'][name] = len(rows)
+            removed = self.merge_segments(state)
+            self.write_state(state)
+        for name in removed:
+            self.remove_segment(name)
+
+    def write_segment(self, ids, vectors, documents, metadatas):
+        name = f"segment_{uuid.uuid4().hex}"
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        np.save(self.path(f"{name}.npy"), vectors)
+        if self.quantization != 'none':
+            codes, scales = quantize(vectors, self.quantization)
+            np.save(self.path(f"{name}.codes.npy"), codes)
+            if scales is not None:
+                np.save(self.path(f"{name}.scales.npy"), scales)
+        with open(self.path(f"{name}.json"), 'w') as records_file:
+            json.dump({'ids': ids, 'metadatas': metadatas}, records_file)
+        with open(self.path(f"{name}.documents.json"), 'w') as documents_file:
+            json.dump(documents, documents_file)
+        return name
+
+    def remove_segment(self, name):
+        # Readers that already mapped the segment keep their open mapping
+        for suffix in ('.npy', '.codes.npy', '.scales.npy', '.json', '.documents.json'):
+            try:
+                os.remove(self.path(f"{name}{suffix}"))
+            except FileNotFoundError:
+                pass
+
+    def merge_segments(self, state):
+        """Merge the newest segments while the last is at least half the size of the one before it; returns the removed names."""
+        removed = []
+
+        def live(name):
+            return state['sizes'][name] - len(state['deleted'].get(name, []))
+
+        while len(state['segments']) >= 2:
+            previous, last = state['segments'][-2], state['segments'][-1]
+            if live(last) * 2 < live(previous):
+                break
+            ids, vectors, documents, metadatas = [], [], [], []
+            for name in (previous, last):
+                segment = NumpySegment(self.directory, name)
+                dead = set(state['deleted'].get(name, []))
+                rows = [row for row in range(len(segment.ids)) if row not in dead]
+                ids += [segment.ids[row] for row in rows]
+                vectors.append(np.asarray(segment.vectors[rows], dtype=np.float32))
+                documents += [segment.documents[row] for row in rows]
+                metadatas += [segment.metadatas[row] for row in rows]
+            merged = self.write_segment(ids, np.concatenate(vectors), documents, metadatas)
+            state['segments'][-2:] = [merged]
+            state['sizes'][merged] = len(ids)
+            for name in (previous, last):
+                state['sizes'].pop(name, None)
+                state['deleted'].pop(name, None)
+                removed.append(name)
+        return removed
+
+
+class NumpyVectorStoreClient:
+    """Collections of `NumpyVectorStore`, one directory each under `<path>/numpy`."""
+
+    def __init__(self, path):
+        self.path = os.path.join(path, 'numpy')
+        os.makedirs(self.path, exist_ok=True)
+
+    def collection_directory(self, name):
+        return os.path.join(self.path, name)
+
+    def get_collection(self, name, embedding_function=None):
+        directory = self.collection_directory(name)
+        if not os.path.exists(os.path.join(directory, 'state.json')):
+            raise ValueError(f"Collection {name} does not exist.")
+        return NumpyVectorStore(directory, embedding_function)
+
+    def create_collection(self, name, metadata=None, embedding_function=None):
+        directory = self.collection_directory(name)
+        if os.path.exists(directory):
+            raise ValueError(f"Collection {name} already exists.")
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'state.json'), 'w') as state_file:
+            json.dump({'segments': [], 'sizes': {}, 'deleted': {}, 'metadata': metadata or {}}, state_file)
+        return NumpyVectorStore(directory, embedding_function)
+
+    def delete_collection(self, name):
+        directory = self.collection_directory(name)
+        if not os.path.exists(directory):
+            raise ValueError(f"Collection {name} does not exist.")
+        shutil.rmtree(directory)
+
+    def list_collections(self):
+        return [
+            self.get_collection(name) for name in sorted(os.listdir(self.path))
+            if os.path.exists(os.path.join(self.collection_directory(name), 'state.json'))
+        ]
+
+
+# Backend name -> client class, selected per store with VECTOR_STORE_BACKENDS
+VECTOR_STORE_CLIENTS = {
+    'chroma': ChromaVectorStoreClient,
+    'numpy': NumpyVectorStoreClient,
+}
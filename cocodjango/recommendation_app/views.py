@@ -1,14 +1,34 @@
+import logging
+
 from django.http import JsonResponse
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 # from .user_data_service import UserDataService
 from .utils.chromadb_ingest_user_data import DjangoToChromaDBIngest
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-from django.shortcuts import render
-from django.http import JsonResponse
+from .utils.chromadb_registry import ChromaDBRegistry, VECTOR_STORES
+from .utils.recommendation_cache import RecommendationCache
+from .utils.query_planner import ProgramQueryPlanner
+from .utils.program_matches import ProgramMatchStore
+from .utils.student_matches import StudentMatchStore
+from .utils.chromadb_ingest_user_data import RESEARCH_ROLES
+from .utils.program_search import ProgramHybridSearch
+from .utils.chunking import query_parents
+from program_app.models import Program
+from program_app.serializers import ProgramSerializer
+from .utils.recommendation_service import (
+    program_where,
+    researcher_where,
+    format_results,
+    batch_recommend,
+    get_student_record,
+    SEARCH_TARGETS
+)
+from django.shortcuts import render, get_object_or_404
 from rest_framework.response import Response
 from rest_framework import status
-from .models import  Funding
+from .models import  Funding, IngestionJob
+from .serializers import IngestionJobSerializer
+from .utils.ingestion_jobs import enqueue_job, resume_job, can_resume
 from college_app.models import College
 from django.conf import settings
 import chromadb
@@ -20,7 +40,9 @@ from services.user_data_service import UserDataService
 from services.faculty_data_service import FacultyDataService
 from services.college_data_service import CollegeDataService
 from django.contrib.auth.decorators import login_required
+from profile_app.models import UserDetails
 from utils import (
+    get_user_info_data,
     delete_uploaded_files,
     upload_file,
     log_request,
@@ -29,261 +51,204 @@ from utils import (
 from django.utils.translation import gettext_lazy
 from django.utils.translation import gettext_lazy as _
 
+logger = logging.getLogger(__name__)
 
 class EmbedUserDataView(APIView):
-    
-    def get(self, request):
-        model_name = "mixedbread-ai/mxbai-embed-large-v1"
-        researcher_user_output_path = "chromadb_data/researcher_users_details_mxbai_embed_cosine"
-        student_user_output_path = "chromadb_data/student_users_details_mxbai_embed_cosine"
-        # faculty_output_path = "chromadb_data/faculty_funding_details_mxbai_embed_cosine"
-        college_output_path = "chromadb_data/college_details_mxbai_embed_cosine"
-        dept_output_path = "chromadb_data/dept_details_mxbai_embed_cosine"
-        program_output_path = "chromadb_data/program_details_mxbai_embed_cosine"
-
-        embedding_function = SentenceTransformerEmbeddingFunction(model_name=model_name)
-        researcher_user_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=researcher_user_output_path)
-        student_user_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=student_user_output_path)
-        # faculty_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=faculty_output_path)
-        # college_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=college_output_path)
-        # dept_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=dept_output_path)
-        program_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=program_output_path)
-        
+    # Queues a full rebuild: staff only, like the job endpoints
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
         try: 
-            researcher_user_ingestor.ingest_researcher_user_documents()
-            student_user_ingestor.ingest_student_user_documents()
-            # faculty_ingestor.ingest_faculty_documents()
-            # college_ingestor.ingest_college_documents()
-            # dept_ingestor.ingest_dept_documents()
-            program_ingestor.ingest_program_documents()
-            return JsonResponse({'status': 'success', 'message': 'User data embedding done.'})
+            # Ingestion runs in the run_ingestion_worker process; poll the job for progress
+            job = enqueue_job(user=request.user)
+            return JsonResponse({
+                'status': 'success',
+                'message': 'User data embedding queued.',
+                'data': IngestionJobSerializer(job).data
+            }, status=202)
         except Exception as e:
             print(str(e))
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
-# def get_user_list(request):
-#     users = list(User.objects.values('id', 'name'))
-#     return JsonResponse({'users': users})
+class IngestionJobView(APIView):
+    # Rebuilds are expensive and jobs expose progress of every collection: staff only
+    permission_classes = [IsAdminUser]
 
-def recommend_programs(user, top_n=10, filters={}):
-    client_student = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/student_users_details_mxbai_embed_cosine'))
-    client_program = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/program_details_mxbai_embed_cosine'))
-    
-    student_user_collection = client_student.get_collection(name="student_user_documents")
-    program_collection = client_program.get_collection(name="program_documents")
+    def get(self, request, pk=None):
+        response_data = get_response_template()
 
-    # Retrieve the embedding for the student user
-    embedding_id = f"{user.id}"
-    user_embedding_record = student_user_collection.get(embedding_id, include=['embeddings', 'documents', 'metadatas'])
-    user_embedding = user_embedding_record['embeddings'][0]
+        if pk:
+            job = get_object_or_404(IngestionJob, pk=pk)
+            response_data.update({
+                'status': 'success',
+                'data': IngestionJobSerializer(job).data,
+                'message': _('Ingestion job retrieved successfully.')
+            })
+            return Response(response_data, status=status.HTTP_200_OK)
 
-    # Build the query filter based on the student's scores and additional filters
-    query_filter = {"$and": []}
-    
-    # Academic filters based on test scores and CGPA
-    if filters.get('CGPA'):
-    # if cgpa is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"CGPA": {"$lte": float(filters['CGPA'])}},  # Program requires less than or equal to student's CGPA
-                {"CGPA": ""}  # Program doesn't have CGPA requirement
-            ]
-        })
-    
-    if filters.get('IELTS'):
-    # if ielts_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"IELTS": {"$lte": float(filters['IELTS'])}},
-                {"IELTS": ""}
-            ]
-        })
-    
-    if filters.get('TOEFL'):
-    # if toefl_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"TOEFL": {"$lte": float(filters['TOEFL'])}},
-                {"TOEFL": ""}
-            ]
-        })
-    
-    if filters.get('GRE'):
-    # if gre_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"GRE": {"$lte": float(filters['GRE'])}},
-                {"GRE": ""}
-            ]
+        try:
+            offset = int(request.GET.get('offset', 0))
+            limit = int(request.GET.get('limit', 50))
+        except ValueError:
+            offset, limit = -1, -1
+        if offset < 0 or limit < 1:
+            response_data.update({
+                'status': 'error',
+                'message': _('offset must not be negative and limit must be positive.'),
+                'error_code': 'VALIDATION_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, 200)
+        jobs = IngestionJob.objects.order_by('-created_at')[offset:offset + limit]
+        response_data.update({
+            'status': 'success',
+            'data': IngestionJobSerializer(jobs, many=True).data,
+            'message': _('Ingestion jobs retrieved successfully.')
         })
-    
-   
-    if filters.get('DUOLINGO'):
-    # if gre_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"DUOLINGO": {"$lte": float(filters['DUOLINGO'])}},
-                {"DUOLINGO": ""}
-            ]
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        response_data = get_response_template()
+        serializer = IngestionJobSerializer(data=request.data)
+        if not serializer.is_valid():
+            response_data.update({
+                'status': 'error',
+                'message': _('Invalid ingestion job.'),
+                'error_code': 'VALIDATION_ERROR',
+                'details': serializer.errors
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        job = enqueue_job(stages=serializer.validated_data.get('stages'), user=request.user)
+        response_data.update({
+            'status': 'success',
+            'data': IngestionJobSerializer(job).data,
+            'message': _('Ingestion job queued.')
         })
-    if filters.get('application_fee'):
-    # if gre_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"application_fee": {"$lte": float(filters['application_fee'])}},
-                {"application_fee": ""}
-            ]
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+
+class IngestionJobResumeView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, pk):
+        response_data = get_response_template()
+        job = get_object_or_404(IngestionJob, pk=pk)
+        if not can_resume(job):
+            response_data.update({
+                'status': 'error',
+                'message': _('Only failed ingestion jobs, or running jobs whose worker stopped, can be resumed.'),
+                'error_code': 'INVALID_STATE',
+            })
+            return Response(response_data, status=status.HTTP_409_CONFLICT)
+
+        resume_job(job)
+        response_data.update({
+            'status': 'success',
+            'data': IngestionJobSerializer(job).data,
+            'message': _('Ingestion job queued for resume.')
         })
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+
+class ProgramSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        response_data = get_response_template()
+        query = request.GET.get('q', '').strip()
+        try:
+            limit = int(request.GET.get('limit', 20))
+        except ValueError:
+            limit = -1
+        if not 0 < limit <= settings.PROGRAM_SEARCH_CANDIDATES:
+            response_data.update({
+                'status': 'error',
+                'message': _('limit must be between 1 and %(max)s.') % {'max': settings.PROGRAM_SEARCH_CANDIDATES},
+                'error_code': 'VALIDATION_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        # 'keyword' skips the vector ranking, e.g. for exact title or contact lookups
+        semantic = request.GET.get('mode', 'hybrid') != 'keyword'
+        if not query:
+            response_data.update({
+                'status': 'error',
+                'message': _('A search query is required.'),
+                'error_code': 'VALIDATION_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
 
-    if filters.get('application_end_date'):
-        date_string = filters['application_end_date']
-        timestamp = int(time.mktime(datetime.strptime(date_string, "%Y-%m-%d").timetuple()))
-    # if gre_score is not None: 
-        query_filter["$and"].append({
-            "$or": [
-                {"application_end_date": {"$gt": timestamp}},
-                {"application_end_date": ""}
-            ]
+        ranked = ProgramHybridSearch().search(query, limit=limit, semantic=semantic)
+        programs = Program.objects.in_bulk([program_id for program_id, _ in ranked])
+        results = []
+        for program_id, score in ranked:
+            # Vectors of a just-deleted program may outlive it until the next index update
+            if program_id not in programs:
+                continue
+            program_data = ProgramSerializer(programs[program_id]).data
+            program_data['search_score'] = score
+            results.append(program_data)
+
+        response_data.update({
+            'status': 'success',
+            'data': results,
+            'message': _('Program search results retrieved successfully.')
         })
-    
-    # Additional filters based on user preferences
-    filter_mappings = {
-        'organization_name': 'organization_name',
-        'department_name': 'department_name',
-        'college_name': 'college_name',
-        'country_name': 'country_name',
-        'state_province_name': 'state_province_name',
-        'city': 'city',
-        "funding_available":"funding_available",
-        # "application_fee": "application_fee",
-        # "application_end_date": "application_end_date"
-
-    }
-    
-    # Add exact match filters
-    for user_filter, db_field in filter_mappings.items():
-        if filters.get(user_filter):
-            if isinstance(filters[user_filter], list):
-                # Handle multiple values for a filter using $or
-                query_filter["$and"].append({
-                    "$or": [{db_field:   {"$eq": value}} for value in filters[user_filter]]
-                })
-            else:
-                # Handle single value filters
-                query_filter["$and"].append({db_field:  {"$eq": filters[user_filter]}})
-    
-    
-    # Handle funding type filters if present
-    # if filters.get('funding_type'):
-    #     funding_conditions = []
-    #     for funding_type in filters['funding_type']:
-    #         funding_conditions.append({"funding_type": {"$eq": funding_type}})
-    #     if funding_conditions:
-    #         query_filter["$and"].append({"$or": funding_conditions})
-    
-    # Handle funding opportunity filters if present
-    # if filters.get('funding_opportunity_for'):
-    #     opportunity_conditions = []
-    #     for opportunity in filters['funding_opportunity_for']:
-    #         opportunity_conditions.append({"funding_opportunity_for": {"$eq": opportunity}})
-    #     if opportunity_conditions:
-    #         query_filter["$and"].append({"$or": opportunity_conditions})
-    
- 
-    
-    # If no filters are provided, remove the '$and' key
-    if len(query_filter['$and']) == 0:
-        query_filter = {}
-    elif len(query_filter['$and']) == 1:
-        query_filter = query_filter['$and'][0]
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+# def get_user_list(request):
+#     users = list(User.objects.values('id', 'name'))
+#     return JsonResponse({'users': users})
+
+def recommend_programs(user, top_n=10, filters={}):
+    # Retrieve the embedding for the student user, embedding a new student on demand
+    user_embedding_record = get_student_record(user)
+    user_embedding = user_embedding_record['embeddings'][0]
+
+    # Same profile, filters and index contents as a recent request: reuse its results
+    cache_key = RecommendationCache.make_key(user.id, user_embedding, filters, top_n, 'universities', 'program')
+    recommended_programs = RecommendationCache.get(cache_key)
+    if recommended_programs is not None:
+        return user, user_embedding_record['documents'][0], recommended_programs
+
+    # Build the query filter based on the student's scores and additional filters
+    query_filter = program_where(filters)
 
     print("query_filter: ")
     print(query_filter)
 
-    # Query the vector database with the student's embedding and filters
-    results = program_collection.query(
-        query_embeddings=[user_embedding],
-        n_results=top_n,
-        where=query_filter
-    )
-
-    recommended_programs = []
+    # Serve from the student's precomputed matches when they are current and the
+    # filters leave enough of them; otherwise query the vector database. Selective
+    # filters are resolved in the database and scored exactly instead of via ANN
+    results = ProgramMatchStore.query(user.id, user_embedding, query_filter, top_n)
+    if results is None:
+        results = ProgramQueryPlanner().query(user_embedding, top_n, query_filter, filters)
 
     # Process the results and structure the recommended programs
-    for idx, program_id in enumerate(results['ids'][0]):
-        program_info = {
-            'program_id': program_id,
-            'program_title': results['metadatas'][0][idx]['program_title'],
-            'organization_name': results['metadatas'][0][idx].get('organization_name', ""),
-            'department_name': results['metadatas'][0][idx].get('department_name', ""),
-            'college_name': results['metadatas'][0][idx].get('college_name', ""),
-            'country_name': results['metadatas'][0][idx].get('country_name', ""),
-            'state_province_name': results['metadatas'][0][idx].get('state_province_name', ""),
-            'city': results['metadatas'][0][idx].get('city', ""),
-            'IELTS': results['metadatas'][0][idx].get('IELTS', ""),
-            'TOEFL': results['metadatas'][0][idx].get('TOEFL', ""),
-            'DUOLINGO': results['metadatas'][0][idx].get('GRE', ""),
-            'GRE': results['metadatas'][0][idx].get('TOEFL', ""),
-            'CGPA': results['metadatas'][0][idx].get('CGPA', ""),
-            'funding_available': results['metadatas'][0][idx].get('funding_available', False),
-            'application_fee': results['metadatas'][0][idx].get('application_fee', ""),
-            'application_end_date': datetime.fromtimestamp(results['metadatas'][0][idx].get('application_end_date', "")).strftime('%Y-%m-%d'),
-            'distance': results['distances'][0][idx]  # Similarity distance score
-        }
-        recommended_programs.append(program_info)
+    recommended_programs = format_results('universities', results)
     print("recommended_programs: ", recommended_programs)
+    RecommendationCache.set(cache_key, recommended_programs)
     
     return user, user_embedding_record['documents'][0], recommended_programs
 
 def recommend_researchers(user, top_n=10, filters={}):
-    # Initialize the clients for accessing vector database collections
-    client_student = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/student_users_details_mxbai_embed_cosine'))
-    client_researcher = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/researcher_users_details_mxbai_embed_cosine'))
-
-    # Load the student and researcher collections
-    student_user_collection = client_student.get_collection(name="student_user_documents")
-    researcher_collection = client_researcher.get_collection(name="researcher_user_documents")
-
-    # Retrieve the embedding for the student user
-    embedding_id = f"{user.id}"
-    user_embedding_record = student_user_collection.get(embedding_id, include=['embeddings', 'documents', 'metadatas'])
+    # Retrieve the embedding for the student user, embedding a new student on demand
+    user_embedding_record = get_student_record(user)
     user_embedding = user_embedding_record['embeddings'][0]
 
+    # Same profile, filters and index contents as a recent request: reuse its results
+    cache_key = RecommendationCache.make_key(user.id, user_embedding, filters, top_n, 'professors', 'researcher')
+    recommended_researchers = RecommendationCache.get(cache_key)
+    if recommended_researchers is not None:
+        return user, user_embedding_record['documents'][0], recommended_researchers
+
     # print("researcher record: ")
     # print(researcher_collection) 
 
     # Build the query filter based on user-defined criteria
-    query_filter = {"$and": []}
- 
-    # Add filters for specific fields if provided
-    filter_mappings = {
-        'organization_name': 'organization_name',
-        'department_name': 'department_name',
-        'college_name': 'college_name',
-        'city': 'city',
-        'funding_available': 'funding_available',
-        'funding_type': 'funding_type',
-        'funding_opportunity_for': 'funding_opportunity_for',
-    }
-
-    # Apply filters based on provided fields in filters dictionary
-    for user_filter, db_field in filter_mappings.items():
-        if filters.get(user_filter):
-            if isinstance(filters[user_filter], list):
-                # Handle multiple values for a filter using $or
-                query_filter["$and"].append({
-                    "$or": [{db_field: {"$eq": value}} for value in filters[user_filter]]
-                })
-            else:
-                # Handle single value filters
-                query_filter["$and"].append({db_field: {"$eq": filters[user_filter]}})
-
-    # Remove '$and' if no filters are added to it
-    if len(query_filter['$and']) == 0:
-        query_filter = {}
-    elif len(query_filter['$and']) == 1:
-        query_filter = query_filter['$and'][0]
+    query_filter = researcher_where(filters)
 
     print("filter query: ", query_filter)
     # result1 = researcher_collection.query(
@@ -294,34 +259,19 @@ def recommend_researchers(user, top_n=10, filters={}):
     # print(result1)
     # Query the researcher collection using student's embedding and filters
     print("querying...")
-    results = researcher_collection.query(
-        query_embeddings=[user_embedding],
-        n_results=top_n,
-        where=query_filter
-    ) 
+    # Researchers are stored as one vector per passage; rank them by their best-matching passage
+    results = ChromaDBRegistry.run(
+        'researcher',
+        lambda collection: query_parents(collection, user_embedding, top_n, where=query_filter)
+    )
 
     # print("results: , ", results) 
  
-    recommended_researchers = []
-
     # Process and structure the recommendations based on the query results
-    for idx, researcher_id in enumerate(results['ids'][0]):
-        researcher_info = {
-            'user_id': researcher_id,
-            'name': results['metadatas'][0][idx].get('name', ""),
-            'type': results['metadatas'][0][idx].get('type', ""),
-            'organization_name': results['metadatas'][0][idx].get('organization_name', ""),
-            'department_name': results['metadatas'][0][idx].get('department_name', ""),
-            'college_name': results['metadatas'][0][idx].get('college_name', ""),
-            'city': results['metadatas'][0][idx].get('city', ""),
-            'funding_available': results['metadatas'][0][idx].get('funding_available', False),
-            'funding_type': results['metadatas'][0][idx].get('funding_type', ""),
-            'funding_opportunity_for': results['metadatas'][0][idx].get('funding_opportunity_for', ""),
-            'distance': results['distances'][0][idx]  # Similarity distance score
-        }
-        recommended_researchers.append(researcher_info)
+    recommended_researchers = format_results('professors', results)
 
     print("recommended_researchers: ", recommended_researchers)
+    RecommendationCache.set(cache_key, recommended_researchers)
 
     return user, user_embedding_record['documents'][0], recommended_researchers
 
@@ -393,6 +343,134 @@ def recommend_researchers(user, top_n=10, filters={}):
     
 #     return recommended_unis
 
+class BatchRecommendationView(APIView):
+    """Recommendations for many students in one request, e.g. for advisor dashboards."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        response_data = get_response_template()
+        # Advisors and organization admins only; students must not see each other's matches
+        if not request.user.has_perm('recommendation_app.view_student_recommendations'):
+            response_data.update({
+                'status': 'error',
+                'message': _('You are not allowed to request recommendations for other users.'),
+                'error_code': 'PERMISSION_DENIED',
+            })
+            return Response(response_data, status=status.HTTP_403_FORBIDDEN)
+
+        search_type = request.data.get('search_type', 'professors')
+        try:
+            top_n = int(request.data.get('top_n', 10))
+        except (TypeError, ValueError):
+            top_n = -1
+        if not 0 < top_n <= settings.RECOMMENDATION_BATCH_MAX_TOP_N:
+            response_data.update({
+                'status': 'error',
+                'message': _('top_n must be between 1 and %(max)s.') % {'max': settings.RECOMMENDATION_BATCH_MAX_TOP_N},
+                'error_code': 'VALIDATION_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        # 'filters' applies to every student; 'user_filters' overrides it per student id
+        filters = request.data.get('filters') or {}
+        user_filters = request.data.get('user_filters') or {}
+        try:
+            user_ids = [int(user_id) for user_id in request.data.get('user_ids', [])]
+        except (TypeError, ValueError):
+            user_ids = []
+
+        if search_type not in SEARCH_TARGETS or not user_ids or len(user_ids) > settings.RECOMMENDATION_BATCH_MAX_USERS:
+            response_data.update({
+                'status': 'error',
+                'message': _('Provide between 1 and %(max)s user_ids and a valid search_type.') % {'max': settings.RECOMMENDATION_BATCH_MAX_USERS},
+                'error_code': 'VALIDATION_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        # Organization admins and advisors only see students of their own organization
+        if not request.user.is_superuser:
+            organization_id = UserDetails.objects.filter(user=request.user).values_list('organization_id', flat=True).first()
+            if not organization_id:
+                response_data.update({
+                    'status': 'error',
+                    'message': _('You are not allowed to request recommendations for these users.'),
+                    'error_code': 'PERMISSION_DENIED',
+                })
+                return Response(response_data, status=status.HTTP_403_FORBIDDEN)
+            user_ids = list(
+                UserDetails.objects.filter(user_id__in=user_ids, organization_id=organization_id).values_list('user_id', flat=True)
+            )
+
+        filters_by_user = {
+            user_id: {**filters, **user_filters.get(str(user_id), {})}
+            for user_id in user_ids
+        }
+        try:
+            recommendations = batch_recommend(user_ids, search_type, filters_by_user, top_n=top_n)
+        except Exception:
+            logger.exception("batch recommendation failed")
+            response_data.update({
+                'status': 'error',
+                'message': gettext_lazy('An error occurred while processing the request'),
+                'error_code': 'INTERNAL_SERVER_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        response_data.update({
+            'status': 'success',
+            'message': 'Recommendations retrieved successfully.',
+            # Students without an embedding yet map to null
+            'data': {str(user_id): results for user_id, results in recommendations.items()},
+        })
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class ResearcherStudentMatchesView(APIView):
+    """Best-fit students for the requesting researcher, served from precomputed matches."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        response_data = get_response_template()
+        try:
+            top_n = int(request.GET.get('top_n', 10))
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            top_n, offset = -1, -1
+        if not 0 < top_n <= settings.STUDENT_MATCHES_TOP_K or offset < 0:
+            response_data.update({
+                'status': 'error',
+                'message': _('top_n must be between 1 and %(max)s and offset must not be negative.') % {'max': settings.STUDENT_MATCHES_TOP_K},
+                'error_code': 'VALIDATION_ERROR',
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        if not UserDetails.objects.filter(user=request.user, user_type__in=RESEARCH_ROLES).exists():
+            response_data.update({
+                'status': 'error',
+                'message': _('Only researchers can see matching students.'),
+                'error_code': 'PERMISSION_DENIED',
+            })
+            return Response(response_data, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            students = StudentMatchStore.matches(request.user.id, top_n=top_n, offset=offset)
+        except Exception as e:
+            print(str(e))
+            response_data.update({
+                'status': 'error',
+                'message': gettext_lazy('Validation error occurred.'),
+                'error_code': 'VALIDATION_ERROR',
+                'details': str(e)
+            })
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        response_data.update({
+            'status': 'success',
+            'message': 'Matching students retrieved successfully.',
+            'data': {'students': students},
+        })
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
 class RecommendUniversitiesView(APIView):
     permission_classes = [IsAuthenticated]
 
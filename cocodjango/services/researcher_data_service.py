@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from django.forms.models import model_to_dict
 from django.shortcuts import get_object_or_404
 from profile_app.models import (
@@ -17,12 +18,13 @@ from funding_app.serializers import FundingSerializer
 
 
 class ResearcherDataService:
-    def __init__(self, user, user_type=None):
+    def __init__(self, user, user_type=None, user_details=None):
         self.user = user
         self.user_type = user_type  # Add this line
         try:
-            self.user_details = get_object_or_404(UserDetails, user=user)
-            user_data = get_object_or_404(User, id=user)
+            # `user_details` is passed in by `for_users` with its related rows already loaded
+            self.user_details = user_details or get_object_or_404(UserDetails, user=user)
+            user_data = self.user_details.user
             user_data_main = {
                 'user_id': user_data.id,
                 'username': user_data.username,
@@ -30,7 +32,7 @@ class ResearcherDataService:
                 'last_name': user_data.last_name,
                 'email': user_data.email,
                 'date_joined': user_data.date_joined,
-               'groups': list(user_data.groups.values_list('name', flat=True))
+               'groups': [group.name for group in user_data.groups.all()]
 
             }
             self.user_data = [user_data_main]
@@ -38,6 +40,53 @@ class ResearcherDataService:
             self.user_details = None
             self.user_data = None
 
+    @staticmethod
+    def prefetch_lookups():
+        """Related rows read by `get_user_data`, loaded for many users at once by `for_users`."""
+        return [
+            'user__groups',
+            'custom_groups',
+            'citizenships__state_province',
+            'visas__state_province',
+            'research_interests__research_interests_option',
+            'academic_histories',
+            'dissertations',
+            'research_experiences',
+            'publications',
+            'work_experiences',
+            'skills__skill_option',
+            'training_workshops',
+            'awards_grants_scholarships',
+            'test_score__user_document__document',
+            'volunteer_activities',
+            'references',
+            Prefetch(
+                'user__userdocument_set',
+                queryset=UserDocument.objects.filter(use__in=[UserDocument.RESUME, UserDocument.SOP]).select_related('document')
+            ),
+            Prefetch(
+                'user__funding_for_faculty_member',
+                queryset=Funding.objects.select_related(
+                    'funding_for_edu_org', 'funding_for_college', 'funding_for_dept',
+                    'funding_doc', 'created_by', 'updated_by'
+                ).prefetch_related('benefits')
+            ),
+        ]
+
+    @classmethod
+    def for_users(cls, user_ids, user_type=None):
+        """
+        Return {user id: service} for `user_ids`, loading all their profile rows in a
+        constant number of queries instead of ~20 per user. Users without
+        details are left out.
+        """
+        user_details = (
+            UserDetails.objects.filter(user_id__in=user_ids)
+            .select_related('user', 'user__extendeduser', 'current_state_province', 'permanent_state_province')
+            .prefetch_related(*cls.prefetch_lookups())
+        )
+        return {details.user_id: cls(details.user_id, user_type, user_details=details) for details in user_details}
+
             
           
     def get_ethnicity_informations(self):
@@ -62,10 +111,10 @@ class ResearcherDataService:
     
     def get_funding_data(self):
         """Fetch all fundings related to the department"""
-        if not  self.user_details.department:
+        if not  self.user_details.department_id:
             return []
         # print(self.program.department)
-        funding_data = Funding.objects.filter(funding_for_faculty_member=self.user_details.user)
+        funding_data = self.user_details.user.funding_for_faculty_member.all()
         print("funding data:", funding_data)
         return FundingSerializer(funding_data, many=True ).data
 
@@ -79,31 +128,28 @@ class ResearcherDataService:
     def get_citizenship_informations(self):
         if not self.user_details:
             return []
-        citizenships = Citizenship.objects.filter(
-            user_details=self.user_details)
+        citizenships = self.user_details.citizenships.all()
         serializer = CitizenshipSerializer(citizenships, many=True)
         return serializer.data
 
     def get_visa_informations(self):
         if not self.user_details:
             return []
-        visas = Visa.objects.filter(user_details=self.user_details)
+        visas = self.user_details.visas.all()
         serializer = VisaSerializer(visas, many=True)
         return serializer.data
 
     def get_research_interests(self):
         if not self.user_details:
             return []
-        research_interests = ResearchInterest.objects.filter(
-            user_details=self.user_details)
+        research_interests = self.user_details.research_interests.all()
         serializer = ResearchInterestSerializer(research_interests, many=True)
         return serializer.data
 
     def get_educational_backgrounds(self):
         if not self.user_details:
             return []
-        educational_backgrounds = EducationalBackground.objects.filter(
-            user_details=self.user_details)
+        educational_backgrounds = self.user_details.academic_histories.all()
         serializer = EducationalBackgroundSerializer(
             educational_backgrounds, many=True)
         return serializer.data
@@ -111,82 +157,84 @@ class ResearcherDataService:
     def get_dissertations(self):
         if not self.user_details:
             return []
-        dissertation = Dissertation.objects.filter(user_details=self.user_details)
+        dissertation = self.user_details.dissertations.all()
         serializer = DissertationSerializer(dissertation, many=True)
         return serializer.data
 
     def get_research_experiences(self):
         if not self.user_details:
             return []
-        research_experience = ResearchExperience.objects.filter(user_details=self.user_details)
+        research_experience = self.user_details.research_experiences.all()
         serializer = ResearchExperienceSerializer(research_experience, many=True)
         return serializer.data
 
     def get_publications(self):
         if not self.user_details:
             return []
-        publications = Publication.objects.filter(user_details=self.user_details)
+        publications = self.user_details.publications.all()
         serializer = PublicationSerializer(publications, many=True)
         return serializer.data
 
     def get_work_experiences(self):
         if not self.user_details:
             return []
-        work_experiences = WorkExperience.objects.filter(user_details=self.user_details)
+        work_experiences = self.user_details.work_experiences.all()
         serializer = WorkExperienceSerializer(work_experiences, many=True)
         return serializer.data
 
     def get_skills(self):
         if not self.user_details:
             return []
-        skills = Skill.objects.filter(user_details=self.user_details)
+        skills = self.user_details.skills.all()
         serializer = SkillSerializer(skills, many=True)
         return serializer.data
 
     def get_training_workshops(self):
         if not self.user_details:
             return []
-        training_workshops = TrainingWorkshop.objects.filter(user_details=self.user_details)
+        training_workshops = self.user_details.training_workshops.all()
         serializer = TrainingWorkshopSerializer(training_workshops, many=True)
         return serializer.data
 
     def get_awards_grants_scholarships(self):
         if not self.user_details:
             return []
-        award_grant_scholarship = AwardGrantScholarship.objects.filter(user_details=self.user_details)
+        award_grant_scholarship = self.user_details.awards_grants_scholarships.all()
         serializer = AwardGrantScholarshipSerializer(award_grant_scholarship, many=True)
         return serializer.data
 
     def get_test_scores(self):
         if not self.user_details:
             return []
-        test_score = TestScore.objects.filter(user_details=self.user_details)
+        test_score = self.user_details.test_score.all()
         serializer = TestScoreSerializer(test_score, many=True)
         return serializer.data
 
     def get_volunteer_activities(self):
         if not self.user_details:
             return []
-        volunteer_activities = VolunteerActivity.objects.filter(user_details=self.user_details)
+        volunteer_activities = self.user_details.volunteer_activities.all()
         serializer = VolunteerActivitySerializer(volunteer_activities, many=True)
         return serializer.data
 
     def get_references(self):
         if not self.user_details:
             return []
-        reference = ReferenceInfo.objects.filter(user_details=self.user_details)
+        reference = self.user_details.references.all()
         serializer = ReferenceInfoSerializer(reference, many=True)
         return serializer.data
     
+    def get_latest_document(self, use):
+        # Read through the related manager so documents prefetched by `for_users` are reused
+        documents = [document for document in self.user_details.user.userdocument_set.all() if document.use == use]
+        return max(documents, key=lambda document: document.created_at) if documents else None
+
     def get_resume(self):
         if not self.user_details:
             pass
         else:
-            resume_query = UserDocument.objects.filter(
-                user=self.user, use=UserDocument.RESUME
-            )
-            if resume_query.exists():
-                latest_resume = resume_query.latest('created_at')
+            latest_resume = self.get_latest_document(UserDocument.RESUME)
+            if latest_resume is not None:
                 if latest_resume.document.file_name:
                     response_data = {
                         'file_name': latest_resume.document.file_name,
@@ -199,11 +247,8 @@ class ResearcherDataService:
         if not self.user_details:
             pass
         else:
-            sop_query = UserDocument.objects.filter(
-                user=self.user, use=UserDocument.SOP
-            )
-            if sop_query.exists():
-                latest_sop = sop_query.latest('created_at')
+            latest_sop = self.get_latest_document(UserDocument.SOP)
+            if latest_sop is not None:
                 if latest_sop.document.file_name:
                     response_data = {
                         'file_name': latest_sop.document.file_name,